@@ -7,20 +7,75 @@ import sqlite3
 import hashlib
 import json
 import os
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 from reportlab.lib.pagesizes import letter
 from reportlab.pdfgen import canvas
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import re
+from order_status import (ORDER_STATUSES, OPEN_STATUSES, InvalidTransitionError,
+                          next_statuses, transition_orders)
+from production_planner import ProductionPlanner
+from delivery_dispatch import DeliveryDispatcher, normalize_address, parse_coordinates
+from delivery_slots import (DEFAULT_SLOT_CAPACITY, MAX_ORDER_QUANTITY, SlotUnavailableError, create_slot_tables,
+                            ensure_slots, format_slot, get_available_slots, record_slot_booking, reserve_slot)
+from order_items import (Cart, CartFullError, OrderLine, OutOfStockError, create_order_items_table, describe_items,
+                         get_order_items, insert_order_lines, take_stock)
+from thumbnails import ThumbnailCache
+from sales_charts import CHART_RANGES, CHART_REPORTS, ChartCache
+from order_archive import (ARCHIVE_AFTER_DAYS, ARCHIVE_TIME, archive_orders, get_archived_order_details,
+                           get_archived_orders)
+from backup import BACKUP_TIME, BackupWorker, create_snapshot, list_snapshots
+from catalog import ALL, FACETS, IN_STOCK, CatalogIndex
+from pricing import (MIN_REDEEM_POINTS, PROMOTION_KINDS, LoyaltyError, PriceBook, add_promotion,
+                     create_pricing_tables, describe_promotion, describe_quote, get_loyalty_points,
+                     get_promotions, quote_order_lines, redeem_points, set_promotion_active)
+from notifications import (DIGEST_TIME, Notifier, build_staff_digest, create_notification_tables,
+                           digest_recipients, digest_sent, record_digest)
+from audit_log import AuditLog
+from report_engine import PRECOMPUTE_TIME, ReportEngine, create_report_tables, precompute_closed_months
+from customer_orders import CustomerOrders
+from money import create_money_columns, to_cents
+from order_dates import create_order_date_columns, order_date_fields
+from order_columns import OrderColumns, create_order_column_tables
+from lead_times import STAGES, TOTAL, create_lead_time_index, format_duration, slowest
+from incoming_queue import INCOMING_SHOWN, IncomingQueue
+from scheduler import OPTIMIZE_EVERY, Job, Scheduler, create_scheduler_tables, job_stats, optimize_database
+from sla_watchdog import LEVEL_MESSAGES, OVERDUE, SlaWatchdog, create_sla_tables, record_sla_alert
+from inventory_ledger import (MOVEMENT_KINDS, SNAPSHOT_TIME, InventoryError, balances_as_of,
+                              create_inventory_ledger_tables, get_movements, record_movement, take_snapshots)
+from stock_alerts import StockAlertWatch, create_stock_alert_tables, get_stock_alerts
 
 class Database:
     def __init__(self):
         self.conn = sqlite3.connect('bakery.db')
+        
+        # Callbacks notified with the ids of orders created or changed
+        self.order_listeners = []
+        # Bumped on every order change; cached reports are keyed on it
+        self.data_version = 0
+        
+        # Every write is recorded here, tagged with the logged-in username
+        self.audit_log = AuditLog("admin")
+        self.actor = None
+        
         self.create_tables()
         self.insert_sample_data()
+        
+        # Tells listeners when an item crosses its low-stock level; writers call check()
+        self.stock_watch = StockAlertWatch(self.conn)
+        
+        # Cakes held in memory with facet bitmaps; refreshed after every write to cakes
+        self.catalog = CatalogIndex(self.conn)
+        
+        # Promotions compiled per cake for checkout quotes; recompiled when cakes change
+        self.price_book = PriceBook(self.conn, sync=self.catalog.sync)
+        self.catalog.add_listener(self.price_book.on_cakes_changed)
+        
+        # Custom reports, aggregated per month in worker processes
+        self.report_engine = ReportEngine(self.conn)
+        
+        # Memory-mapped column files of every order for whole-history scans
+        self.order_columns = OrderColumns(self.conn)
     
     def create_tables(self):
         cursor = self.conn.cursor()
@@ -113,6 +168,60 @@ class Database:
             )
         ''')
         
+        # Stock movements ledger; inventory.quantity is its running balance
+        create_inventory_ledger_tables(cursor)
+        
+        # Items below their minimum stock, kept by triggers on inventory and cakes
+        create_stock_alert_tables(cursor)
+        
+        # Delivery locations table (offline geocoding, entered by staff)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS delivery_locations (
+                address_key TEXT PRIMARY KEY,
+                address TEXT NOT NULL,
+                latitude REAL NOT NULL,
+                longitude REAL NOT NULL,
+                updated_at TEXT NOT NULL
+            )
+        ''')
+        
+        # Delivery slot inventory and bookings
+        create_slot_tables(cursor)
+        
+        # Order line items (one row per cake in an order)
+        create_order_items_table(cursor)
+        
+        # Promotions and loyalty balances
+        create_pricing_tables(cursor)
+        
+        # Integer-cents copies of prices and totals
+        create_money_columns(cursor)
+        
+        # Indexed order_day / epoch columns beside the ISO timestamps
+        create_order_date_columns(cursor)
+        
+        # Status history by order, for lead-time analytics
+        create_lead_time_index(cursor)
+        
+        # Staff digest runs
+        create_notification_tables(cursor)
+        
+        # Cached monthly report aggregates, invalidated by triggers on orders
+        create_report_tables(cursor)
+        
+        # Orders changed since the column files were exported
+        create_order_column_tables(cursor)
+        
+        # Background job schedule, claims and timings
+        create_scheduler_tables(cursor)
+        create_sla_tables(cursor)
+        
+        # Indexes
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_status ON orders (status)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_order_date ON orders (order_date)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_customer ON orders (customer_id, order_date)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_delivery ON orders (delivery_type, delivery_date)")
+        
         self.conn.commit()
     
     def insert_sample_data(self):
@@ -179,21 +288,63 @@ class Database:
         )
         return cursor.fetchone()
     
+    def audit(self, action, entity, entity_id, **data):
+        self.audit_log.record(action, entity, entity_id, actor=self.actor, **data)
+    
+    def add_user(self, username, password, role, name, email, phone=""):
+        cursor = self.conn.cursor()
+        cursor.execute(
+            "INSERT INTO users (username, password, role, name, email, phone) VALUES (?, ?, ?, ?, ?, ?)",
+            (username, self.hash_password(password), role, name, email, phone)
+        )
+        self.conn.commit()
+        self.audit("user.create", "user", cursor.lastrowid, username=username, role=role, name=name, email=email)
+        return cursor.lastrowid
+    
+    def add_staff_member(self, username, password, name, email, position):
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(
+                "INSERT INTO users (username, password, role, name, email) VALUES (?, ?, 'staff', ?, ?)",
+                (username, self.hash_password(password), name, email)
+            )
+            user_id = cursor.lastrowid
+            cursor.execute(
+                "INSERT INTO staff (user_id, position, hire_date) VALUES (?, ?, ?)",
+                (user_id, position, datetime.datetime.now().isoformat())
+            )
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        self.audit("user.create", "user", user_id, username=username, role="staff", name=name, email=email,
+                   position=position)
+        return user_id
+    
     def get_cakes(self, category=None, search_term=None):
+        return self.catalog.filter({"category": category, "availability": IN_STOCK}, search_term)
+    
+    def add_cake(self, name, flavor, size, price, stock, description, category):
         cursor = self.conn.cursor()
-        query = "SELECT * FROM cakes WHERE stock > 0"
-        params = []
-        
-        if category and category != "all":
-            query += " AND category = ?"
-            params.append(category)
-        
-        if search_term:
-            query += " AND (name LIKE ? OR flavor LIKE ? OR description LIKE ?)"
-            params.extend([f"%{search_term}%", f"%{search_term}%", f"%{search_term}%"])
-        
-        cursor.execute(query, params)
-        return cursor.fetchall()
+        cursor.execute(
+            "INSERT INTO cakes (name, flavor, size, price, price_cents, stock, description, category) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (name, flavor, size, price, to_cents(price), stock, description, category)
+        )
+        self.conn.commit()
+        self.catalog.refresh([cursor.lastrowid])
+        self.audit("cake.create", "cake", cursor.lastrowid, name=name, flavor=flavor, size=size, price=price,
+                   stock=stock, category=category)
+        self.stock_watch.check()
+    
+    def delete_cake(self, cake_id):
+        cake = self.get_cake_by_id(cake_id)
+        cursor = self.conn.cursor()
+        cursor.execute("DELETE FROM cakes WHERE id = ?", (cake_id,))
+        self.conn.commit()
+        self.catalog.refresh([cake_id])
+        self.audit("cake.delete", "cake", cake_id, before=cake)
+        self.stock_watch.check()
     
     def get_cake_by_id(self, cake_id):
         cursor = self.conn.cursor()
@@ -204,32 +355,116 @@ class Database:
         cursor = self.conn.cursor()
         cursor.execute("UPDATE cakes SET stock = stock - ? WHERE id = ?", (quantity, cake_id))
         self.conn.commit()
+        self.catalog.refresh([cake_id])
+        self.audit("cake.stock", "cake", cake_id, delta=-quantity)
+        self.stock_watch.check()
     
     def create_order(self, customer_id, customer_name, cake_id, quantity, total_price, status, 
-                    special_instructions, delivery_type, delivery_date, address, phone, email):
-        cursor = self.conn.cursor()
-        order_date = datetime.datetime.now().isoformat()
-        
-        cursor.execute(
-            """INSERT INTO orders 
-            (customer_id, customer_name, cake_id, quantity, total_price, status, order_date, 
-            special_instructions, delivery_type, delivery_date, address, phone, email) 
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-            (customer_id, customer_name, cake_id, quantity, total_price, status, order_date,
-             special_instructions, delivery_type, delivery_date, address, phone, email)
-        )
-        
-        order_id = cursor.lastrowid
-        
-        # Add initial status to history
-        cursor.execute(
-            "INSERT INTO order_status_history (order_id, status, changed_at) VALUES (?, ?, ?)",
-            (order_id, status, order_date)
+                    special_instructions, delivery_type, delivery_date, address, phone, email,
+                    slot_id=None, lines=None, points=0):
+        # Single-cake order; stock is still updated separately by the caller.
+        # lines are the priced lines from quote_order_lines; without them, the list price
+        if lines is None:
+            cake = self.get_cake_by_id(cake_id)
+            lines = [OrderLine(cake_id, quantity, cake[4] if cake else total_price / quantity)]
+        
+        return self.create_cart_order(
+            customer_id, customer_name, lines, total_price, status,
+            special_instructions, delivery_type, delivery_date, address, phone, email,
+            slot_id=slot_id, update_stock=False, points=points
         )
+    
+    def create_cart_order(self, customer_id, customer_name, lines, total_price, status,
+                          special_instructions, delivery_type, delivery_date, address, phone, email,
+                          slot_id=None, update_stock=True, points=0):
+        # The whole cart is one order: one orders row, one history row, one commit.
+        # orders.cake_id/quantity keep the first cake and the total for older screens.
+        # points are loyalty points spent on the order; raises LoyaltyError if the balance is short.
+        cursor = self.conn.cursor()
+        order_date, order_day, order_ts = order_date_fields()
+        total_quantity = sum(line.quantity for line in lines)
         
-        self.conn.commit()
+        try:
+            # The slot is taken in the same transaction as the order; raises SlotUnavailableError when full
+            if slot_id is not None:
+                delivery_date = reserve_slot(cursor, slot_id, total_quantity)
+            
+            cursor.execute(
+                """INSERT INTO orders 
+                (customer_id, customer_name, cake_id, quantity, total_price, total_cents, status, order_date, 
+                order_day, order_ts, special_instructions, delivery_type, delivery_date, address, phone, email) 
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (customer_id, customer_name, lines[0].cake_id, total_quantity, total_price, to_cents(total_price),
+                 status, order_date, order_day, order_ts, special_instructions, delivery_type, delivery_date,
+                 address, phone, email)
+            )
+            
+            order_id = cursor.lastrowid
+            insert_order_lines(cursor, order_id, lines)
+            
+            if slot_id is not None:
+                record_slot_booking(cursor, order_id, slot_id, total_quantity)
+            
+            if points:
+                redeem_points(cursor, order_id, customer_id, points)
+            
+            # Raises OutOfStockError if another order took the last cakes first
+            if update_stock:
+                take_stock(cursor, lines)
+            
+            # Add initial status to history
+            cursor.execute(
+                "INSERT INTO order_status_history (order_id, status, changed_at) VALUES (?, ?, ?)",
+                (order_id, status, order_date)
+            )
+            
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        
+        self.audit("order.create", "order", order_id, customer_id=customer_id, total_price=total_price,
+                   status=status, lines=[tuple(line) for line in lines], slot_id=slot_id, points=points)
+        if update_stock:
+            self.catalog.refresh([line.cake_id for line in lines])
+            for line in lines:
+                self.audit("cake.stock", "cake", line.cake_id, delta=-line.quantity, order_id=order_id)
+            self.stock_watch.check()
+        self.notify_order_listeners([order_id])
         return order_id
     
+    def get_loyalty_points(self, customer_id):
+        return get_loyalty_points(self.conn, customer_id)
+    
+    def get_promotions(self):
+        return get_promotions(self.conn)
+    
+    def add_promotion(self, name, kind, value, category=None, cake_id=None, min_quantity=1,
+                      free_quantity=0, starts_on=None, ends_on=None):
+        promotion_id = add_promotion(self.conn, name, kind, value, category, cake_id, min_quantity,
+                                     free_quantity, starts_on, ends_on)
+        self.price_book.load()
+        self.audit("promotion.create", "promotion", promotion_id, name=name, kind=kind, value=value,
+                   category=category, cake_id=cake_id, min_quantity=min_quantity,
+                   free_quantity=free_quantity, starts_on=starts_on, ends_on=ends_on)
+        return promotion_id
+    
+    def end_promotion(self, promotion_id):
+        set_promotion_active(self.conn, promotion_id, False)
+        self.price_book.load()
+        self.audit("promotion.end", "promotion", promotion_id)
+    
+    def add_order_listener(self, callback):
+        self.order_listeners.append(callback)
+    
+    def notify_order_listeners(self, order_ids):
+        self.data_version += 1
+        for callback in self.order_listeners:
+            callback(order_ids)
+    
+    def get_order_items(self, order_ids):
+        return get_order_items(self.conn, order_ids)
+    
     def get_orders(self, user_id=None, user_role=None, status=None):
         cursor = self.conn.cursor()
         
@@ -250,17 +485,37 @@ class Database:
         return cursor.fetchall()
     
     def update_order_status(self, order_id, new_status, notes=None):
-        cursor = self.conn.cursor()
-        changed_at = datetime.datetime.now().isoformat()
-        
-        cursor.execute("UPDATE orders SET status = ? WHERE id = ?", (new_status, order_id))
-        
-        cursor.execute(
-            "INSERT INTO order_status_history (order_id, status, changed_at, notes) VALUES (?, ?, ?, ?)",
-            (order_id, new_status, changed_at, notes)
-        )
-        
-        self.conn.commit()
+        # Raises InvalidTransitionError if the order cannot move to new_status
+        moved, _ = transition_orders(self.conn, [order_id], new_status, notes)
+        self.audit_status_changes(moved, new_status, notes)
+        self.notify_order_listeners([order_id])
+    
+    def bulk_update_order_status(self, order_ids, new_status, notes=None):
+        # One transaction for the whole batch; invalid orders are skipped and returned
+        moved, rejected = transition_orders(self.conn, order_ids, new_status, notes, skip_invalid=True)
+        if moved:
+            self.audit_status_changes(moved, new_status, notes)
+            self.notify_order_listeners([order_id for order_id, _ in moved])
+        return moved, rejected
+    
+    def audit_status_changes(self, moved, new_status, notes):
+        for order_id, previous in moved:
+            self.audit("order.status", "order", order_id, previous=previous, status=new_status, notes=notes)
+    
+    def archive_orders(self, older_than_days=ARCHIVE_AFTER_DAYS):
+        # Moves old closed orders to the yearly archive files; returns how many moved
+        archived = archive_orders(self.conn, older_than_days)
+        if archived:
+            for order_id in archived:
+                self.audit("order.archive", "order", order_id)
+            self.notify_order_listeners(archived)
+        return len(archived)
+    
+    def get_archived_orders(self, customer_id):
+        return get_archived_orders(self.conn, customer_id)
+    
+    def get_archived_order_details(self, order_id):
+        return get_archived_order_details(self.conn, order_id)
     
     def get_order_history(self, order_id):
         cursor = self.conn.cursor()
@@ -270,19 +525,67 @@ class Database:
         )
         return cursor.fetchall()
     
-    def get_inventory(self):
+    def get_delivery_orders(self, day):
+        # Open delivery orders due on the given date
         cursor = self.conn.cursor()
-        cursor.execute("SELECT * FROM inventory ORDER BY category, item_name")
+        next_day = day + datetime.timedelta(days=1)
+        placeholders = ",".join("?" * len(OPEN_STATUSES))
+        cursor.execute(
+            f"""SELECT id, customer_name, delivery_date, address FROM orders
+            WHERE delivery_type = 'delivery' AND delivery_date >= ? AND delivery_date < ?
+            AND status IN ({placeholders})""",
+            (day.isoformat(), next_day.isoformat(), *OPEN_STATUSES)
+        )
         return cursor.fetchall()
     
-    def update_inventory(self, item_id, quantity):
+    def get_delivery_locations(self, address_keys):
+        cursor = self.conn.cursor()
+        address_keys = list(set(address_keys))
+        locations = {}
+        for start in range(0, len(address_keys), 500):
+            chunk = address_keys[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            cursor.execute(
+                f"SELECT address_key, latitude, longitude FROM delivery_locations WHERE address_key IN ({placeholders})",
+                chunk
+            )
+            for address_key, latitude, longitude in cursor.fetchall():
+                locations[address_key] = (latitude, longitude)
+        return locations
+    
+    def set_delivery_location(self, address, latitude, longitude):
         cursor = self.conn.cursor()
-        last_updated = datetime.datetime.now().isoformat()
         cursor.execute(
-            "UPDATE inventory SET quantity = ?, last_updated = ? WHERE id = ?",
-            (quantity, last_updated, item_id)
+            "INSERT OR REPLACE INTO delivery_locations (address_key, address, latitude, longitude, updated_at) VALUES (?, ?, ?, ?, ?)",
+            (normalize_address(address), address, latitude, longitude, datetime.datetime.now().isoformat())
         )
         self.conn.commit()
+        self.audit("delivery_location.set", "delivery_location", normalize_address(address),
+                   latitude=latitude, longitude=longitude)
+    
+    def get_available_slots(self, quantity=1):
+        ensure_slots(self.conn)
+        return get_available_slots(self.conn, quantity)
+    
+    def get_inventory(self):
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT * FROM inventory ORDER BY category, item_name")
+        return cursor.fetchall()
+    
+    def record_inventory_movement(self, item_id, kind, amount, note=None):
+        # Stock only changes by a delta appended to the ledger, so staff recording
+        # at the same time never overwrite each other; returns the new quantity
+        quantity = record_movement(self.conn, item_id, kind, amount, actor=self.actor, note=note)
+        self.audit("inventory.move", "inventory", item_id, kind=kind, amount=amount, quantity=quantity, note=note)
+        self.stock_watch.check()
+        return quantity
+    
+    def get_inventory_movements(self, item_id, limit=100):
+        return get_movements(self.conn, item_id, limit)
+    
+    def get_inventory_as_of(self, as_of):
+        # item_id -> quantity at the given ISO timestamp
+        return balances_as_of(self.conn, as_of)
     
     def add_inventory_item(self, item_name, category, quantity, unit, min_stock_level):
         cursor = self.conn.cursor()
@@ -292,29 +595,48 @@ class Database:
             (item_name, category, quantity, unit, min_stock_level, last_updated)
         )
         self.conn.commit()
+        self.audit("inventory.create", "inventory", cursor.lastrowid, item_name=item_name, category=category,
+                   quantity=quantity, unit=unit, min_stock_level=min_stock_level)
+        self.stock_watch.check()
     
-    def get_low_stock_items(self):
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT * FROM inventory WHERE quantity <= min_stock_level")
-        return cursor.fetchall()
+    def get_stock_alerts(self):
+        # Inventory items and cakes at or below their minimum, read from the trigger-kept alerts
+        return get_stock_alerts(self.conn)
     
+    def add_stock_listener(self, callback):
+        self.stock_watch.add_listener(callback)
+    
+    # Date-range reports take inclusive YYYY-MM-DD days and filter on the indexed order_day
     def get_sales_report(self, start_date, end_date):
         cursor = self.conn.cursor()
         cursor.execute(
             """SELECT 
                 COUNT(*) as total_orders,
-                SUM(total_price) as total_revenue,
-                AVG(total_price) as avg_order_value,
+                SUM(total_cents) / 100.0 as total_revenue,
+                AVG(total_cents) / 100.0 as avg_order_value,
                 status,
                 COUNT(CASE WHEN delivery_type = 'delivery' THEN 1 END) as delivery_orders,
                 COUNT(CASE WHEN delivery_type = 'pickup' THEN 1 END) as pickup_orders
             FROM orders 
-            WHERE order_date BETWEEN ? AND ?
+            WHERE order_day BETWEEN ? AND ?
             GROUP BY status""",
             (start_date, end_date)
         )
         return cursor.fetchall()
     
+    def get_daily_revenue(self, start_date, end_date):
+        # Orders and revenue per day
+        cursor = self.conn.cursor()
+        cursor.execute(
+            """SELECT order_day, COUNT(*), SUM(total_cents) / 100.0
+            FROM orders
+            WHERE order_day BETWEEN ? AND ? AND status != 'cancelled'
+            GROUP BY order_day
+            ORDER BY order_day""",
+            (start_date, end_date)
+        )
+        return cursor.fetchall()
+    
     def get_popular_items(self, start_date, end_date):
         cursor = self.conn.cursor()
         cursor.execute(
@@ -322,46 +644,20 @@ class Database:
                 c.name, 
                 c.flavor, 
                 c.category,
-                COUNT(o.id) as order_count,
-                SUM(o.quantity) as total_quantity,
-                SUM(o.total_price) as total_revenue
+                COUNT(DISTINCT i.order_id) as order_count,
+                SUM(i.quantity) as total_quantity,
+                SUM(i.quantity * i.unit_price_cents) / 100.0 as total_revenue
             FROM orders o
-            JOIN cakes c ON o.cake_id = c.id
-            WHERE o.order_date BETWEEN ? AND ?
-            GROUP BY o.cake_id
+            JOIN order_items i ON i.order_id = o.id
+            JOIN cakes c ON i.cake_id = c.id
+            WHERE o.order_day BETWEEN ? AND ?
+            GROUP BY i.cake_id
             ORDER BY total_revenue DESC
             LIMIT 10""",
             (start_date, end_date)
         )
         return cursor.fetchall()
 
-class EmailService:
-    def __init__(self, smtp_server, smtp_port, username, password):
-        self.smtp_server = smtp_server
-        self.smtp_port = smtp_port
-        self.username = username
-        self.password = password
-    
-    def send_email(self, to_email, subject, body):
-        try:
-            msg = MIMEMultipart()
-            msg['From'] = self.username
-            msg['To'] = to_email
-            msg['Subject'] = subject
-            
-            msg.attach(MIMEText(body, 'plain'))
-            
-            server = smtplib.SMTP(self.smtp_server, self.smtp_port)
-            server.starttls()
-            server.login(self.username, self.password)
-            text = msg.as_string()
-            server.sendmail(self.username, to_email, text)
-            server.quit()
-            return True
-        except Exception as e:
-            print(f"Error sending email: {e}")
-            return False
-
 class SweetDreamsApp:
     def __init__(self, root):
         self.root = root
@@ -372,13 +668,15 @@ class SweetDreamsApp:
         # Initialize database
         self.db = Database()
         
-        # Email service (configure with your SMTP settings)
-        self.email_service = EmailService(
+        # Email notifications (configure with your SMTP settings); one background
+        # sender, one SMTP connection, status changes coalesced per customer
+        self.notifier = Notifier(
             smtp_server="smtp.gmail.com",
             smtp_port=587,
             username="your_email@gmail.com",
             password="your_app_password"
         )
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         
         # Current user state
         self.current_user = None
@@ -386,8 +684,38 @@ class SweetDreamsApp:
         self.current_role = None
         self.current_user_name = None
         
-        # Image cache
-        self.image_cache = {}
+        # Shopping cart for the logged-in customer; it is booked into one slot, so
+        # it holds no more cakes than a slot takes
+        self.cart = Cart(limit=DEFAULT_SLOT_CAPACITY)
+        
+        # Cake photo thumbnails, decoded off the main thread
+        self.image_cache = ThumbnailCache(root)
+        
+        # Kitchen production plan, kept current from order changes
+        self.production_planner = ProductionPlanner(self.db)
+        self.production_planner.load()
+        self.db.add_order_listener(self.production_planner.on_orders_changed)
+        
+        # Pending orders by when work on them has to start
+        self.incoming_queue = IncomingQueue(self.db)
+        self.incoming_queue.load()
+        self.db.add_order_listener(self.incoming_queue.on_orders_changed)
+        
+        # The logged-in customer's orders, loaded once per login
+        self.customer_orders = CustomerOrders(self.db)
+        self.db.add_order_listener(self.customer_orders.on_orders_changed)
+        
+        # Low-stock counts refresh only when an item crosses its minimum
+        self.db.add_stock_listener(self.on_stock_alerts_changed)
+        
+        # Delivery route planning
+        self.delivery_dispatcher = DeliveryDispatcher(self.db)
+        
+        # Rendered analytics charts
+        self.chart_cache = ChartCache(root)
+        
+        # Online backups of bakery.db, taken on a background thread
+        self.backup_worker = BackupWorker()
         
         # Create the main container
         self.main_container = tk.Frame(root, bg="white", relief=tk.RAISED, bd=2)
@@ -404,28 +732,122 @@ class SweetDreamsApp:
         self.admin_tab = ttk.Frame(self.tab_control)
         self.staff_tab = ttk.Frame(self.tab_control)
         self.customer_tab = ttk.Frame(self.tab_control)
+        self.analytics_tab = ttk.Frame(self.tab_control)
         
         self.tab_control.add(self.login_tab, text="Login")
         self.tab_control.add(self.admin_tab, text="Admin Dashboard", state="hidden")
         self.tab_control.add(self.staff_tab, text="Staff Dashboard", state="hidden")
         self.tab_control.add(self.customer_tab, text="Customer Portal", state="hidden")
+        self.tab_control.add(self.analytics_tab, text="Analytics", state="hidden")
         
         self.tab_control.pack(expand=1, fill="both")
         
         # Create login form
         self.create_login_form()
         
-        # Create admin dashboard
-        self.create_admin_dashboard()
-        
-        # Create staff dashboard
-        self.create_staff_dashboard()
-        
-        # Create customer dashboard
-        self.create_customer_dashboard()
+        # Dashboards are built the first time they are shown, then kept for later logins
+        self.tab_builders = {
+            str(self.admin_tab): self.create_admin_dashboard,
+            str(self.staff_tab): self.create_staff_dashboard,
+            str(self.customer_tab): self.create_customer_dashboard,
+            str(self.analytics_tab): self.create_analytics_dashboard,
+        }
+        self.tab_control.bind("<<NotebookTabChanged>>", self.on_tab_changed)
         
         # Show login tab by default
         self.tab_control.select(self.login_tab)
+        
+        # Nightly digest, backups, report precomputation and upkeep, off the Tk thread
+        self.scheduler = Scheduler(self.scheduled_jobs())
+        self.scheduler.start()
+        
+        # Open orders about to miss their delivery time, raised on the staff
+        # dashboard and emailed to staff by timers rather than by polling
+        self.sla_watchdog = SlaWatchdog(self.db, root, self.on_sla_alerts)
+        self.sla_watchdog.load()
+        self.db.add_order_listener(self.sla_watchdog.on_orders_changed)
+    
+    def build_tab(self, tab):
+        builder = self.tab_builders.pop(str(tab), None)
+        if builder:
+            builder()
+    
+    def tab_built(self, tab):
+        # Views shared between roles skip refreshing dashboards nobody has opened
+        return str(tab) not in self.tab_builders
+    
+    def on_tab_changed(self, event):
+        tab = self.tab_control.select()
+        self.build_tab(tab)
+        # Refresh the chart whenever analytics is opened; unchanged data comes straight from the cache
+        if tab == str(self.analytics_tab):
+            self.show_chart()
+    
+    def on_close(self):
+        # Coalesced status emails still waiting out their window go now, and
+        # audit records still in the writer's batch reach the file
+        self.scheduler.stop()
+        self.sla_watchdog.close()
+        self.notifier.close()
+        self.db.audit_log.close()
+        self.db.report_engine.close()
+        self.root.destroy()
+    
+    def scheduled_jobs(self):
+        # Each runs on a scheduler thread with its own connection; a run missed
+        # while the app was closed happens once at the next start
+        return [
+            Job("staff_digest", self.run_staff_digest, at=DIGEST_TIME),
+            Job("backup", lambda conn: create_snapshot()["id"], at=BACKUP_TIME),
+            Job("report_precompute", self.run_report_precompute, at=PRECOMPUTE_TIME),
+            Job("archive_orders", self.run_archive_orders, at=ARCHIVE_TIME),
+            Job("inventory_snapshot", lambda conn: f"{take_snapshots(conn)} items snapshotted", at=SNAPSHOT_TIME),
+            Job("optimize", optimize_database, every=OPTIMIZE_EVERY),
+        ]
+    
+    def run_staff_digest(self, conn):
+        # The digest belongs to the day whose DIGEST_TIME this run is for, so a
+        # run missed overnight and caught up at startup sends yesterday's
+        now = datetime.datetime.now()
+        day = now.date() if now.time() >= DIGEST_TIME else now.date() - datetime.timedelta(days=1)
+        if digest_sent(conn, day):
+            return "already sent"
+        fields = build_staff_digest(conn, day)
+        recipients = digest_recipients(conn)
+        for name, email in recipients:
+            self.notifier.send(email, "staff_digest", name=name, **fields)
+        record_digest(conn, day, len(recipients))
+        return f"{len(recipients)} recipients"
+    
+    def on_stock_alerts_changed(self):
+        if self.tab_built(self.admin_tab):
+            self.update_stats_display()
+        self.update_inventory_display()
+    
+    def on_sla_alerts(self, raised):
+        # Each order and level is emailed once, even if the app restarts
+        recipients = digest_recipients(self.db.conn) if raised else []
+        for alert in raised:
+            if not record_sla_alert(self.db.conn, alert):
+                continue
+            headline, message = LEVEL_MESSAGES[alert.level]
+            for name, email in recipients:
+                self.notifier.send(email, "sla_alert", name=name, order_id=alert.order_id,
+                                   headline=headline, message=message, customer=alert.customer_name,
+                                   status=alert.status, due=alert.due.strftime('%Y-%m-%d %H:%M'))
+        self.render_sla_alerts()
+    
+    def run_report_precompute(self, conn):
+        report = precompute_closed_months(conn)
+        return f"{report.computed} months computed, {report.cached} cached"
+    
+    def run_archive_orders(self, conn):
+        # Only closed orders move, so the open-order views need no update; the
+        # customer's order cache sees the commit through data_version
+        archived = archive_orders(conn)
+        for order_id in archived:
+            self.db.audit_log.record("order.archive", "order", order_id, actor="scheduler")
+        return f"{len(archived)} orders archived"
     
     def create_header(self):
         header_frame = tk.Frame(self.main_container, bg="white")
@@ -652,24 +1074,11 @@ class SweetDreamsApp:
         self.cake_search_entry.pack(side=tk.LEFT, padx=5)
         self.cake_search_entry.bind("<KeyRelease>", self.filter_cakes)
         
-        tk.Label(
-            search_frame,
-            text="Category:",
-            font=("Arial", 10),
-            bg="white"
-        ).pack(side=tk.LEFT, padx=(20, 5))
-        
-        self.category_var = tk.StringVar(value="all")
-        category_combo = ttk.Combobox(
-            search_frame,
-            textvariable=self.category_var,
-            values=["all", "birthday", "wedding", "anniversary", "celebration", "regular"],
-            state="readonly",
-            width=15,
-            font=("Arial", 10)
+        # Admins can also list cakes that are out of stock
+        self.admin_facets = self.create_facet_filters(
+            search_frame, self.cake_search_entry, self.filter_cakes,
+            list(FACETS), defaults={"availability": IN_STOCK}
         )
-        category_combo.pack(side=tk.LEFT)
-        category_combo.bind("<<ComboboxSelected>>", self.filter_cakes)
         
         add_cake_btn = tk.Button(
             cake_frame,
@@ -712,6 +1121,31 @@ class SweetDreamsApp:
         self.staff_list_frame = tk.Frame(staff_frame, bg="white")
         self.staff_list_frame.pack(fill=tk.X)
         
+        # Promotions
+        promotions_frame = tk.LabelFrame(
+            scrollable_frame,
+            text="🏷️ Promotions",
+            font=("Arial", 14, "bold"),
+            bg="white",
+            padx=20,
+            pady=20
+        )
+        promotions_frame.pack(fill=tk.X, padx=20, pady=10)
+        
+        add_promotion_btn = tk.Button(
+            promotions_frame,
+            text="Add Promotion",
+            command=self.show_add_promotion_modal,
+            bg="#4ecdc4",
+            fg="white",
+            font=("Arial", 10, "bold"),
+            relief=tk.FLAT
+        )
+        add_promotion_btn.pack(pady=(0, 10))
+        
+        self.promotions_list_frame = tk.Frame(promotions_frame, bg="white")
+        self.promotions_list_frame.pack(fill=tk.X)
+        
         # Inventory Management
         inventory_frame = tk.LabelFrame(
             scrollable_frame,
@@ -851,6 +1285,17 @@ class SweetDreamsApp:
         )
         custom_btn.pack(side=tk.LEFT, padx=5)
         
+        lead_time_btn = tk.Button(
+            report_btn_frame,
+            text="Lead Times",
+            command=self.generate_lead_time_report,
+            bg="#4ecdc4",
+            fg="white",
+            font=("Arial", 10, "bold"),
+            relief=tk.FLAT
+        )
+        lead_time_btn.pack(side=tk.LEFT, padx=5)
+        
         export_btn = tk.Button(
             report_btn_frame,
             text="Export PDF",
@@ -871,6 +1316,91 @@ class SweetDreamsApp:
         )
         self.report_display.pack(anchor=tk.W)
         
+        # Backups
+        backup_frame = tk.LabelFrame(
+            scrollable_frame,
+            text="💾 Backups",
+            font=("Arial", 14, "bold"),
+            bg="white",
+            padx=20,
+            pady=20
+        )
+        backup_frame.pack(fill=tk.X, padx=20, pady=10)
+        
+        self.backup_btn = tk.Button(
+            backup_frame,
+            text="Backup Now",
+            command=self.start_backup,
+            bg="#667eea",
+            fg="white",
+            font=("Arial", 10, "bold"),
+            relief=tk.FLAT
+        )
+        self.backup_btn.pack(side=tk.LEFT)
+        
+        snapshots = list_snapshots()
+        self.backup_status = tk.Label(
+            backup_frame,
+            text=f"Last backup: {snapshots[-1]['created_at'].split('.')[0]}" if snapshots else "No backups yet",
+            font=("Arial", 10),
+            bg="white"
+        )
+        self.backup_status.pack(side=tk.LEFT, padx=10)
+        
+        # Audit Log
+        audit_frame = tk.LabelFrame(
+            scrollable_frame,
+            text="🔎 Audit Log",
+            font=("Arial", 14, "bold"),
+            bg="white",
+            padx=20,
+            pady=20
+        )
+        audit_frame.pack(fill=tk.X, padx=20, pady=10)
+        
+        self.audit_entity_var = tk.StringVar(value="order")
+        ttk.Combobox(
+            audit_frame,
+            textvariable=self.audit_entity_var,
+            values=["order", "cake", "inventory", "promotion", "user", "delivery_location"],
+            state="readonly",
+            width=16
+        ).pack(side=tk.LEFT)
+        
+        audit_id_entry = tk.Entry(audit_frame, font=("Arial", 10), width=20)
+        audit_id_entry.pack(side=tk.LEFT, padx=10)
+        
+        tk.Button(
+            audit_frame,
+            text="Look Up",
+            command=lambda: self.show_audit_history(self.audit_entity_var.get(), audit_id_entry.get().strip()),
+            bg="#667eea",
+            fg="white",
+            font=("Arial", 10, "bold"),
+            relief=tk.FLAT
+        ).pack(side=tk.LEFT)
+        
+        # Scheduled Jobs
+        jobs_frame = tk.LabelFrame(
+            scrollable_frame,
+            text="⏱ Scheduled Jobs",
+            font=("Arial", 14, "bold"),
+            bg="white",
+            padx=20,
+            pady=20
+        )
+        jobs_frame.pack(fill=tk.X, padx=20, pady=10)
+        
+        tk.Button(
+            jobs_frame,
+            text="View Jobs",
+            command=self.show_scheduled_jobs,
+            bg="#667eea",
+            fg="white",
+            font=("Arial", 10, "bold"),
+            relief=tk.FLAT
+        ).pack(side=tk.LEFT)
+        
         # All Orders
         orders_frame = tk.LabelFrame(
             scrollable_frame,
@@ -905,6 +1435,17 @@ class SweetDreamsApp:
         status_combo.pack(side=tk.LEFT, padx=5)
         status_combo.bind("<<ComboboxSelected>>", self.filter_orders)
         
+        archive_btn = tk.Button(
+            order_filter_frame,
+            text="Archive Old Orders",
+            command=self.archive_old_orders,
+            bg="#999",
+            fg="white",
+            font=("Arial", 10, "bold"),
+            relief=tk.FLAT
+        )
+        archive_btn.pack(side=tk.RIGHT)
+        
         # Create a treeview for orders
         columns = ("order_id", "customer", "cake", "quantity", "status", "total", "order_date")
         self.orders_tree = ttk.Treeview(
@@ -967,6 +1508,20 @@ class SweetDreamsApp:
         )
         title_label.pack(pady=(20, 10))
         
+        # Orders at Risk
+        sla_frame = tk.LabelFrame(
+            scrollable_frame,
+            text="⚠️ Orders at Risk",
+            font=("Arial", 14, "bold"),
+            bg="white",
+            padx=20,
+            pady=20
+        )
+        sla_frame.pack(fill=tk.X, padx=20, pady=10)
+        
+        self.sla_alerts_frame = tk.Frame(sla_frame, bg="white")
+        self.sla_alerts_frame.pack(fill=tk.X)
+        
         # Incoming Orders
         incoming_frame = tk.LabelFrame(
             scrollable_frame,
@@ -995,26 +1550,164 @@ class SweetDreamsApp:
         self.order_mgmt_frame = tk.Frame(order_mgmt_frame, bg="white")
         self.order_mgmt_frame.pack(fill=tk.X)
         
-        # Walk-in Order
-        walkin_frame = tk.LabelFrame(
+        # Production Plan
+        production_frame = tk.LabelFrame(
             scrollable_frame,
-            text="📝 Record Walk-in Order",
+            text="🧁 Production Plan",
             font=("Arial", 14, "bold"),
             bg="white",
             padx=20,
             pady=20
         )
-        walkin_frame.pack(fill=tk.X, padx=20, pady=10)
+        production_frame.pack(fill=tk.X, padx=20, pady=10)
         
-        walkin_btn = tk.Button(
-            walkin_frame,
-            text="New Walk-in Order",
-            command=self.show_walkin_order_modal,
-            bg="#4ecdc4",
-            fg="white",
-            font=("Arial", 10, "bold"),
-            relief=tk.FLAT
-        )
+        plan_filter_frame = tk.Frame(production_frame, bg="white")
+        plan_filter_frame.pack(fill=tk.X, pady=(0, 10))
+        
+        tk.Label(
+            plan_filter_frame,
+            text="Bake day:",
+            font=("Arial", 10),
+            bg="white"
+        ).pack(side=tk.LEFT)
+        
+        self.plan_day_var = tk.StringVar(value=datetime.date.today().isoformat())
+        self.plan_day_combo = ttk.Combobox(
+            plan_filter_frame,
+            textvariable=self.plan_day_var,
+            state="readonly",
+            width=12,
+            font=("Arial", 10)
+        )
+        self.plan_day_combo.pack(side=tk.LEFT, padx=5)
+        self.plan_day_combo.bind("<<ComboboxSelected>>", lambda e: self.render_production_plan())
+        
+        columns = ("start", "end", "oven", "cake", "size", "quantity", "orders")
+        self.production_tree = ttk.Treeview(
+            production_frame,
+            columns=columns,
+            show="headings",
+            height=6
+        )
+        
+        self.production_tree.heading("start", text="Start")
+        self.production_tree.heading("end", text="End")
+        self.production_tree.heading("oven", text="Oven")
+        self.production_tree.heading("cake", text="Cake")
+        self.production_tree.heading("size", text="Size")
+        self.production_tree.heading("quantity", text="Qty")
+        self.production_tree.heading("orders", text="Orders")
+        
+        self.production_tree.column("start", width=60)
+        self.production_tree.column("end", width=60)
+        self.production_tree.column("oven", width=50)
+        self.production_tree.column("cake", width=150)
+        self.production_tree.column("size", width=70)
+        self.production_tree.column("quantity", width=50)
+        self.production_tree.column("orders", width=200)
+        
+        self.production_tree.tag_configure("late", foreground="#ff6b6b")
+        self.production_tree.pack(fill=tk.X)
+        
+        # Delivery Routes
+        delivery_frame = tk.LabelFrame(
+            scrollable_frame,
+            text="🚚 Delivery Routes",
+            font=("Arial", 14, "bold"),
+            bg="white",
+            padx=20,
+            pady=20
+        )
+        delivery_frame.pack(fill=tk.X, padx=20, pady=10)
+        
+        route_btn_frame = tk.Frame(delivery_frame, bg="white")
+        route_btn_frame.pack(fill=tk.X, pady=(0, 10))
+        
+        tk.Label(
+            route_btn_frame,
+            text="Delivery day:",
+            font=("Arial", 10),
+            bg="white"
+        ).pack(side=tk.LEFT)
+        
+        self.route_day_entry = tk.Entry(
+            route_btn_frame,
+            font=("Arial", 10),
+            width=12
+        )
+        self.route_day_entry.pack(side=tk.LEFT, padx=5)
+        self.route_day_entry.insert(0, datetime.date.today().isoformat())
+        
+        plan_routes_btn = tk.Button(
+            route_btn_frame,
+            text="Plan Routes",
+            command=self.render_delivery_routes,
+            bg="#667eea",
+            fg="white",
+            font=("Arial", 10, "bold"),
+            relief=tk.FLAT
+        )
+        plan_routes_btn.pack(side=tk.LEFT, padx=5)
+        
+        set_location_btn = tk.Button(
+            route_btn_frame,
+            text="Set Coordinates",
+            command=self.show_delivery_location_modal,
+            bg="#feca57",
+            fg="white",
+            font=("Arial", 10, "bold"),
+            relief=tk.FLAT
+        )
+        set_location_btn.pack(side=tk.LEFT, padx=5)
+        
+        columns = ("eta", "due", "order", "customer", "address", "distance")
+        self.route_tree = ttk.Treeview(
+            delivery_frame,
+            columns=columns,
+            show="tree headings",
+            height=8
+        )
+        
+        self.route_tree.heading("#0", text="Route")
+        self.route_tree.heading("eta", text="ETA")
+        self.route_tree.heading("due", text="Due")
+        self.route_tree.heading("order", text="Order")
+        self.route_tree.heading("customer", text="Customer")
+        self.route_tree.heading("address", text="Address")
+        self.route_tree.heading("distance", text="Km")
+        
+        self.route_tree.column("#0", width=160)
+        self.route_tree.column("eta", width=60)
+        self.route_tree.column("due", width=60)
+        self.route_tree.column("order", width=60)
+        self.route_tree.column("customer", width=120)
+        self.route_tree.column("address", width=200)
+        self.route_tree.column("distance", width=60)
+        
+        self.route_tree.tag_configure("late", foreground="#ff6b6b")
+        self.route_tree.tag_configure("unlocated", foreground="#999999")
+        self.route_tree.pack(fill=tk.X)
+        
+        # Walk-in Order
+        walkin_frame = tk.LabelFrame(
+            scrollable_frame,
+            text="📝 Record Walk-in Order",
+            font=("Arial", 14, "bold"),
+            bg="white",
+            padx=20,
+            pady=20
+        )
+        walkin_frame.pack(fill=tk.X, padx=20, pady=10)
+        
+        walkin_btn = tk.Button(
+            walkin_frame,
+            text="New Walk-in Order",
+            command=self.show_walkin_order_modal,
+            bg="#4ecdc4",
+            fg="white",
+            font=("Arial", 10, "bold"),
+            relief=tk.FLAT
+        )
         walkin_btn.pack()
         
         # Inventory Status
@@ -1132,28 +1825,29 @@ class SweetDreamsApp:
         self.customer_search_entry.pack(side=tk.LEFT, padx=5)
         self.customer_search_entry.bind("<KeyRelease>", self.filter_customer_cakes)
         
-        tk.Label(
-            search_frame,
-            text="Category:",
-            font=("Arial", 10),
-            bg="white"
-        ).pack(side=tk.LEFT, padx=(20, 5))
-        
-        self.customer_category_var = tk.StringVar(value="all")
-        category_combo = ttk.Combobox(
-            search_frame,
-            textvariable=self.customer_category_var,
-            values=["all", "birthday", "wedding", "anniversary", "celebration", "regular"],
-            state="readonly",
-            width=15,
-            font=("Arial", 10)
+        # Customers only ever see cakes in stock
+        self.customer_facets = self.create_facet_filters(
+            search_frame, self.customer_search_entry, self.filter_customer_cakes,
+            ["category", "flavor", "size", "price_band"], fixed={"availability": IN_STOCK}
         )
-        category_combo.pack(side=tk.LEFT)
-        category_combo.bind("<<ComboboxSelected>>", self.filter_customer_cakes)
         
         self.customer_cakes_frame = tk.Frame(cakes_frame, bg="white")
         self.customer_cakes_frame.pack(fill=tk.X)
         
+        # Cart
+        cart_frame = tk.LabelFrame(
+            scrollable_frame,
+            text="🧺 My Cart",
+            font=("Arial", 14, "bold"),
+            bg="white",
+            padx=20,
+            pady=20
+        )
+        cart_frame.pack(fill=tk.X, padx=20, pady=10)
+        
+        self.cart_frame = tk.Frame(cart_frame, bg="white")
+        self.cart_frame.pack(fill=tk.X)
+        
         # My Orders
         orders_frame = tk.LabelFrame(
             scrollable_frame,
@@ -1200,6 +1894,20 @@ class SweetDreamsApp:
         self.history_tree.column("status", width=100)
         self.history_tree.column("total", width=80)
         
+        self.history_tree.tag_configure("archived", foreground="#888")
+        
+        # Archived orders are only read when asked for
+        self.archived_history_btn = tk.Button(
+            history_frame,
+            text="Show Archived Orders",
+            command=self.load_archived_history,
+            bg="#999",
+            fg="white",
+            font=("Arial", 10, "bold"),
+            relief=tk.FLAT
+        )
+        self.archived_history_btn.pack(side=tk.BOTTOM, anchor=tk.E, pady=(10, 0))
+        
         # Add scrollbar to treeview
         tree_scroll = ttk.Scrollbar(history_frame, orient="vertical", command=self.history_tree.yview)
         self.history_tree.configure(yscrollcommand=tree_scroll.set)
@@ -1210,6 +1918,91 @@ class SweetDreamsApp:
         # Bind double-click event
         self.history_tree.bind("<Double-1>", self.show_customer_order_details)
     
+    def create_analytics_dashboard(self):
+        # Title
+        tk.Label(
+            self.analytics_tab,
+            text="Sales Analytics",
+            font=("Arial", 18, "bold"),
+            fg="#333",
+            bg="white"
+        ).pack(fill=tk.X, pady=(20, 10))
+        
+        controls_frame = tk.Frame(self.analytics_tab, bg="white")
+        controls_frame.pack(fill=tk.X, padx=20, pady=(0, 10))
+        
+        self.chart_report_var = tk.StringVar(value="revenue")
+        for report, title in CHART_REPORTS.items():
+            tk.Radiobutton(
+                controls_frame,
+                text=title,
+                value=report,
+                variable=self.chart_report_var,
+                command=self.show_chart,
+                indicatoron=False,
+                bg="#f8f9fa",
+                selectcolor="#667eea",
+                font=("Arial", 10, "bold"),
+                padx=10,
+                pady=5
+            ).pack(side=tk.LEFT, padx=(0, 5))
+        
+        self.chart_range_var = tk.StringVar(value="Last 30 days")
+        range_combo = ttk.Combobox(
+            controls_frame,
+            textvariable=self.chart_range_var,
+            values=list(CHART_RANGES),
+            state="readonly",
+            width=15,
+            font=("Arial", 10)
+        )
+        range_combo.pack(side=tk.RIGHT)
+        range_combo.bind("<<ComboboxSelected>>", lambda e: self.show_chart())
+        
+        self.chart_label = tk.Label(
+            self.analytics_tab,
+            text="Select a chart...",
+            font=("Arial", 11),
+            bg="white"
+        )
+        self.chart_label.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
+    
+    def chart_key(self, report):
+        end = datetime.date.today()
+        start = end - datetime.timedelta(days=CHART_RANGES[self.chart_range_var.get()] - 1)
+        return (report, start.isoformat(), end.isoformat(), self.db.data_version)
+    
+    def load_chart_data(self, report, start, end):
+        # Aggregates only; start and end are inclusive days. Revenue and status
+        # scan the column files; top cakes needs the line items, so it stays in SQL
+        if report == "revenue":
+            rows = self.db.order_columns.daily_revenue(start, end)
+        elif report == "status":
+            rows = self.db.order_columns.status_totals(start, end)
+        else:
+            rows = self.db.get_popular_items(start, end)
+        return {"start": start, "end": end, "rows": rows}
+    
+    def show_chart(self):
+        report = self.chart_report_var.get()
+        key = self.chart_key(report)
+        
+        def apply(image):
+            # Ignore charts that finish after the selection moved on
+            if self.chart_key(self.chart_report_var.get()) == key:
+                self.chart_label.config(image=image, text="")
+                self.chart_label.image = image
+        
+        self.chart_label.config(image="", text="Rendering chart...")
+        self.chart_label.image = None
+        self.chart_cache.request(key, lambda: self.load_chart_data(*key[:3]), apply)
+        
+        # Render the other charts for this range in the background so switching is instant
+        for other in CHART_REPORTS:
+            if other != report:
+                other_key = self.chart_key(other)
+                self.chart_cache.request(other_key, lambda k=other_key: self.load_chart_data(*k[:3]), lambda image: None)
+    
     def login(self):
         username = self.username_entry.get()
         password = self.password_entry.get()
@@ -1228,6 +2021,7 @@ class SweetDreamsApp:
             self.current_user_id = user_data[0]
             self.current_user_name = user_data[1]
             self.current_role = user_type
+            self.db.actor = username
             
             # Show user info
             self.user_label.config(text=f"{username} ({user_type})")
@@ -1237,15 +2031,19 @@ class SweetDreamsApp:
             self.tab_control.tab(1, state="normal" if user_type == "admin" else "hidden")
             self.tab_control.tab(2, state="normal" if user_type == "staff" else "hidden")
             self.tab_control.tab(3, state="normal" if user_type == "customer" else "hidden")
+            self.tab_control.tab(4, state="normal" if user_type == "admin" else "hidden")
             
-            # Navigate to appropriate dashboard
+            # Navigate to appropriate dashboard, building it on first use
             if user_type == "admin":
+                self.build_tab(self.admin_tab)
                 self.tab_control.select(self.admin_tab)
                 self.initialize_admin_dashboard()
             elif user_type == "staff":
+                self.build_tab(self.staff_tab)
                 self.tab_control.select(self.staff_tab)
                 self.initialize_staff_dashboard()
             elif user_type == "customer":
+                self.build_tab(self.customer_tab)
                 self.tab_control.select(self.customer_tab)
                 self.initialize_customer_dashboard()
             
@@ -1260,12 +2058,16 @@ class SweetDreamsApp:
         self.current_user_id = None
         self.current_user_name = None
         self.current_role = None
+        self.db.actor = None
+        self.cart.clear()
+        self.customer_orders.clear()
         self.user_info_frame.pack_forget()
         
         # Hide all tabs except login
         self.tab_control.tab(1, state="hidden")
         self.tab_control.tab(2, state="hidden")
         self.tab_control.tab(3, state="hidden")
+        self.tab_control.tab(4, state="hidden")
         
         # Show login tab
         self.tab_control.select(self.login_tab)
@@ -1274,16 +2076,20 @@ class SweetDreamsApp:
         self.render_admin_cakes()
         self.render_all_orders()
         self.render_staff_list()
+        self.render_promotions()
         self.update_stats_display()
     
     def initialize_staff_dashboard(self):
+        self.render_sla_alerts()
         self.render_incoming_orders()
         self.render_order_management()
+        self.render_production_plan()
         self.update_inventory_display()
     
     def initialize_customer_dashboard(self):
-        self.welcome_label.config(text=f"Welcome, {self.current_user_name}! Browse our delicious cakes and place your order.")
+        self.customer_orders.load(self.current_user_id)
         self.render_customer_cakes()
+        self.render_cart()
         self.render_customer_orders()
         self.render_order_history()
     
@@ -1292,10 +2098,9 @@ class SweetDreamsApp:
         for widget in self.admin_cake_frame.winfo_children():
             widget.destroy()
         
-        # Get cakes from database
-        category = self.category_var.get() if self.category_var.get() != "all" else None
+        # Get cakes from the catalog index
         search_term = self.cake_search_entry.get() if self.cake_search_entry.get() else None
-        cakes = self.db.get_cakes(category, search_term)
+        cakes = self.db.catalog.filter(self.facet_selection(self.admin_facets), search_term)
         
         if not cakes:
             no_cakes_label = tk.Label(
@@ -1328,6 +2133,7 @@ class SweetDreamsApp:
                 bg="white"
             )
             emoji_label.pack(pady=(0, 10))
+            self.show_cake_image(emoji_label, cake)
             
             # Cake info
             tk.Label(
@@ -1405,6 +2211,9 @@ class SweetDreamsApp:
             self.admin_cake_frame.columnconfigure(i, weight=1)
     
     def render_all_orders(self):
+        if not self.tab_built(self.admin_tab):
+            return
+        
         # Clear existing items
         for item in self.orders_tree.get_children():
             self.orders_tree.delete(item)
@@ -1413,13 +2222,16 @@ class SweetDreamsApp:
         status = self.order_status_var.get() if self.order_status_var.get() != "all" else None
         orders = self.db.get_orders(status=status)
         
+        # Cart orders list every cake, so read the line items for the whole page at once
+        order_items = self.db.get_order_items([order[0] for order in orders])
+        
         # Add orders to treeview
         for order in orders:
-            status_text = order[5].capitalize()  # status
+            status_text = order[6].capitalize()  # status
             self.orders_tree.insert("", "end", values=(
                 f"#{order[0]}",  # id
                 order[2],  # customer_name
-                self.get_cake_name(order[3]),  # cake_id -> name
+                describe_items(order_items.get(order[0], [])),
                 order[4],  # quantity
                 status_text,
                 f"${order[5]:.2f}",  # total_price
@@ -1449,15 +2261,194 @@ class SweetDreamsApp:
                 justify=tk.LEFT
             ).pack(anchor=tk.W, pady=5)
     
+    def render_promotions(self):
+        # Clear existing widgets
+        for widget in self.promotions_list_frame.winfo_children():
+            widget.destroy()
+        
+        promotions = self.db.get_promotions()
+        if not promotions:
+            tk.Label(
+                self.promotions_list_frame,
+                text="No active promotions.",
+                font=("Arial", 11),
+                bg="white"
+            ).pack(anchor=tk.W, pady=5)
+            return
+        
+        for promotion in promotions:
+            row = tk.Frame(self.promotions_list_frame, bg="white")
+            row.pack(fill=tk.X, pady=2)
+            
+            scope = promotion.category or "all cakes"
+            if promotion.cake_id is not None:
+                scope = self.get_cake_name(promotion.cake_id)
+            dates = f", until {promotion.ends_on}" if promotion.ends_on else ""
+            tk.Label(
+                row,
+                text=f"• {promotion.name}: {describe_promotion(promotion)} on {scope}{dates}",
+                font=("Arial", 11),
+                bg="white"
+            ).pack(side=tk.LEFT)
+            
+            tk.Button(
+                row,
+                text="End",
+                command=lambda p=promotion: self.end_promotion(p),
+                bg="#ff6b6b",
+                fg="white",
+                font=("Arial", 9, "bold"),
+                relief=tk.FLAT
+            ).pack(side=tk.RIGHT)
+    
+    def end_promotion(self, promotion):
+        if messagebox.askyesno("Confirm", f"End the promotion '{promotion.name}'?"):
+            self.db.end_promotion(promotion.id)
+            self.render_promotions()
+    
+    def show_add_promotion_modal(self):
+        modal = tk.Toplevel(self.root)
+        modal.title("Add Promotion")
+        modal.geometry("400x600")
+        modal.configure(bg="white")
+        modal.resizable(False, False)
+        modal.transient(self.root)
+        modal.grab_set()
+        
+        # Center the modal
+        modal.update_idletasks()
+        x = self.root.winfo_x() + (self.root.winfo_width() - modal.winfo_width()) // 2
+        y = self.root.winfo_y() + (self.root.winfo_height() - modal.winfo_height()) // 2
+        modal.geometry(f"+{x}+{y}")
+        
+        tk.Label(
+            modal,
+            text="Add Promotion",
+            font=("Arial", 16, "bold"),
+            bg="white"
+        ).pack(pady=(20, 10))
+        
+        entries = {}
+        fields = [
+            ("name", "Name:"),
+            ("value", "Discount (% or $):"),
+            ("min_quantity", "Minimum / Buy Quantity:"),
+            ("free_quantity", "Free Quantity (buy-N deals):"),
+            ("ends_on", "Ends On (YYYY-MM-DD, optional):"),
+        ]
+        
+        # Kind
+        tk.Label(
+            modal,
+            text="Kind:",
+            font=("Arial", 12),
+            bg="white"
+        ).pack(anchor=tk.W, padx=20, pady=(5, 5))
+        
+        kind_var = tk.StringVar(value="percent")
+        ttk.Combobox(
+            modal,
+            textvariable=kind_var,
+            values=list(PROMOTION_KINDS),
+            state="readonly",
+            font=("Arial", 12)
+        ).pack(fill=tk.X, padx=20, pady=(0, 10))
+        
+        # Category the rule applies to
+        tk.Label(
+            modal,
+            text="Category:",
+            font=("Arial", 12),
+            bg="white"
+        ).pack(anchor=tk.W, padx=20, pady=(5, 5))
+        
+        category_var = tk.StringVar(value=ALL)
+        ttk.Combobox(
+            modal,
+            textvariable=category_var,
+            values=[ALL] + self.db.catalog.values("category"),
+            state="readonly",
+            font=("Arial", 12)
+        ).pack(fill=tk.X, padx=20, pady=(0, 10))
+        
+        for key, label in fields:
+            tk.Label(
+                modal,
+                text=label,
+                font=("Arial", 12),
+                bg="white"
+            ).pack(anchor=tk.W, padx=20, pady=(5, 5))
+            
+            entries[key] = tk.Entry(
+                modal,
+                font=("Arial", 12),
+                relief=tk.SOLID,
+                bd=1
+            )
+            entries[key].pack(fill=tk.X, padx=20, pady=(0, 10))
+        
+        entries["min_quantity"].insert(0, "1")
+        entries["free_quantity"].insert(0, "0")
+        
+        tk.Button(
+            modal,
+            text="Add Promotion",
+            command=lambda: self.add_promotion(
+                entries["name"].get(),
+                kind_var.get(),
+                entries["value"].get(),
+                category_var.get(),
+                entries["min_quantity"].get(),
+                entries["free_quantity"].get(),
+                entries["ends_on"].get(),
+                modal
+            ),
+            bg="#4ecdc4",
+            fg="white",
+            font=("Arial", 12, "bold"),
+            relief=tk.FLAT,
+            padx=20,
+            pady=10
+        ).pack(pady=(10, 20))
+    
+    def add_promotion(self, name, kind, value, category, min_quantity, free_quantity, ends_on, modal):
+        if not name:
+            messagebox.showerror("Error", "Please give the promotion a name.")
+            return
+        
+        try:
+            value_val = float(value or 0)
+            min_qty_val = int(min_quantity or 1)
+            free_qty_val = int(free_quantity or 0)
+            if ends_on:
+                datetime.date.fromisoformat(ends_on)
+            self.db.add_promotion(
+                name, kind, value_val,
+                category=None if category == ALL else category,
+                min_quantity=min_qty_val,
+                free_quantity=free_qty_val,
+                ends_on=ends_on or None
+            )
+        except ValueError as e:
+            messagebox.showerror("Error", f"Invalid promotion: {e}")
+            return
+        
+        modal.destroy()
+        self.render_promotions()
+        messagebox.showinfo("Success", "Promotion added successfully!")
+    
     def render_incoming_orders(self):
+        if not self.tab_built(self.staff_tab):
+            return
+        
         # Clear existing widgets
         for widget in self.incoming_orders_frame.winfo_children():
             widget.destroy()
         
-        # Get pending orders from database
-        orders = self.db.get_orders(status="pending")
+        # Pending orders that have to be started soonest come first
+        upcoming = self.incoming_queue.upcoming(INCOMING_SHOWN)
         
-        if not orders:
+        if not upcoming:
             tk.Label(
                 self.incoming_orders_frame,
                 text="No pending orders at the moment.",
@@ -1466,8 +2457,11 @@ class SweetDreamsApp:
             ).pack(pady=10)
             return
         
+        now = datetime.datetime.now()
+        order_items = self.db.get_order_items([order[0] for _, _, order in upcoming])
+        
         # Display pending orders
-        for order in orders:
+        for start_by, due, order in upcoming:
             order_frame = tk.Frame(
                 self.incoming_orders_frame,
                 bg="#f8f9fa",
@@ -1487,7 +2481,7 @@ class SweetDreamsApp:
             
             tk.Label(
                 order_frame,
-                text=f"Cake: {self.get_cake_name(order[3])}",  # cake_id -> name
+                text=f"Cakes: {describe_items(order_items.get(order[0], []))}",
                 font=("Arial", 10),
                 bg="#f8f9fa"
             ).pack(anchor=tk.W)
@@ -1513,6 +2507,15 @@ class SweetDreamsApp:
                 bg="#f8f9fa"
             ).pack(anchor=tk.W)
             
+            if due:
+                tk.Label(
+                    order_frame,
+                    text=f"Due: {due.strftime('%Y-%m-%d %H:%M')} - start by {start_by.strftime('%Y-%m-%d %H:%M')}",
+                    font=("Arial", 10, "bold"),
+                    fg="#ff6b6b" if start_by <= now else "#2d3436",
+                    bg="#f8f9fa"
+                ).pack(anchor=tk.W)
+            
             btn_frame = tk.Frame(order_frame, bg="#f8f9fa")
             btn_frame.pack(fill=tk.X, pady=(10, 0))
             
@@ -1539,15 +2542,60 @@ class SweetDreamsApp:
                 padx=10
             )
             decline_btn.pack(side=tk.LEFT)
+        
+        hidden = len(self.incoming_queue) - len(upcoming)
+        if hidden > 0:
+            tk.Label(
+                self.incoming_orders_frame,
+                text=f"+ {hidden} more pending orders due later",
+                font=("Arial", 10, "italic"),
+                bg="white"
+            ).pack(pady=5)
+    
+    def render_sla_alerts(self):
+        if not self.tab_built(self.staff_tab):
+            return
+        
+        # Clear existing widgets
+        for widget in self.sla_alerts_frame.winfo_children():
+            widget.destroy()
+        
+        alerts = self.sla_watchdog.active()
+        
+        if not alerts:
+            tk.Label(
+                self.sla_alerts_frame,
+                text="No orders at risk.",
+                font=("Arial", 11),
+                bg="white"
+            ).pack(pady=10)
+            return
+        
+        for alert in alerts:
+            headline, _ = LEVEL_MESSAGES[alert.level]
+            tk.Label(
+                self.sla_alerts_frame,
+                text=f"{headline}: Order #{alert.order_id} - {alert.customer_name} - "
+                     f"{alert.status}, due {alert.due.strftime('%Y-%m-%d %H:%M')}",
+                font=("Arial", 11, "bold"),
+                fg="#ff6b6b" if alert.level == OVERDUE else "#e67e22",
+                bg="white"
+            ).pack(anchor=tk.W, pady=2)
     
     def render_order_management(self):
+        if not self.tab_built(self.staff_tab):
+            return
+        
         # Clear existing widgets
         for widget in self.order_mgmt_frame.winfo_children():
             widget.destroy()
         
         # Get active orders (not completed or cancelled) from database
         orders = self.db.get_orders()
-        active_orders = [order for order in orders if order[5] not in ["completed", "cancelled"]]
+        active_orders = [order for order in orders if order[6] in OPEN_STATUSES]
+        
+        # Selection state for bulk actions, keyed by order id
+        self.order_mgmt_selection = {}
         
         if not active_orders:
             tk.Label(
@@ -1558,6 +2606,60 @@ class SweetDreamsApp:
             ).pack(pady=10)
             return
         
+        # Bulk actions
+        bulk_frame = tk.Frame(self.order_mgmt_frame, bg="white")
+        bulk_frame.pack(fill=tk.X, pady=(0, 10))
+        
+        select_all_var = tk.BooleanVar(value=False)
+        
+        def toggle_select_all():
+            for var, _ in self.order_mgmt_selection.values():
+                var.set(select_all_var.get())
+        
+        tk.Checkbutton(
+            bulk_frame,
+            text="Select All",
+            variable=select_all_var,
+            command=toggle_select_all,
+            font=("Arial", 10),
+            bg="white"
+        ).pack(side=tk.LEFT)
+        
+        bulk_status_var = tk.StringVar(value="preparing")
+        bulk_status_combo = ttk.Combobox(
+            bulk_frame,
+            textvariable=bulk_status_var,
+            values=ORDER_STATUSES[1:],
+            state="readonly",
+            width=15,
+            font=("Arial", 10)
+        )
+        bulk_status_combo.pack(side=tk.LEFT, padx=(10, 0))
+        
+        apply_btn = tk.Button(
+            bulk_frame,
+            text="Apply to Selected",
+            command=lambda: self.apply_bulk_status(bulk_status_var.get()),
+            bg="#667eea",
+            fg="white",
+            font=("Arial", 10, "bold"),
+            relief=tk.FLAT,
+            padx=10
+        )
+        apply_btn.pack(side=tk.LEFT, padx=(10, 0))
+        
+        closeout_btn = tk.Button(
+            bulk_frame,
+            text="Complete All Ready",
+            command=self.close_out_ready_orders,
+            bg="#4ecdc4",
+            fg="white",
+            font=("Arial", 10, "bold"),
+            relief=tk.FLAT,
+            padx=10
+        )
+        closeout_btn.pack(side=tk.RIGHT)
+        
         # Display order management options
         for order in active_orders:
             order_frame = tk.Frame(
@@ -1570,9 +2672,13 @@ class SweetDreamsApp:
             )
             order_frame.pack(fill=tk.X, pady=5)
             
-            tk.Label(
+            selected_var = tk.BooleanVar(value=False)
+            self.order_mgmt_selection[order[0]] = (selected_var, order)
+            
+            tk.Checkbutton(
                 order_frame,
                 text=f"Order #{order[0]} - {order[2]}",  # id, customer_name
+                variable=selected_var,
                 font=("Arial", 11, "bold"),
                 bg="white"
             ).pack(anchor=tk.W)
@@ -1587,8 +2693,8 @@ class SweetDreamsApp:
                 bg="white"
             ).pack(side=tk.LEFT)
             
-            status_text = order[5].capitalize()  # status
-            status_color = self.get_status_color(order[5])
+            status_text = order[6].capitalize()  # status
+            status_color = self.get_status_color(order[6])
             
             status_label = tk.Label(
                 status_frame,
@@ -1601,12 +2707,12 @@ class SweetDreamsApp:
             )
             status_label.pack(side=tk.LEFT, padx=(5, 0))
             
-            # Status dropdown
-            status_var = tk.StringVar(value=order[5])
+            # Status dropdown (only the moves the status engine allows)
+            status_var = tk.StringVar(value=order[6])
             status_combo = ttk.Combobox(
                 status_frame,
                 textvariable=status_var,
-                values=["pending", "preparing", "ready", "completed", "cancelled"],
+                values=[order[6], *next_statuses(order[6])],
                 state="readonly",
                 width=15,
                 font=("Arial", 10)
@@ -1628,15 +2734,160 @@ class SweetDreamsApp:
             )
             notify_btn.pack(side=tk.LEFT, padx=(10, 0))
     
+    def render_production_plan(self):
+        if not self.tab_built(self.staff_tab):
+            return
+        
+        # Clear existing items
+        for item in self.production_tree.get_children():
+            self.production_tree.delete(item)
+        
+        # Offer today plus every day with accepted orders
+        today = datetime.date.today()
+        days = [today] + [day for day in self.production_planner.upcoming_days(today) if day != today]
+        self.plan_day_combo.config(values=[day.isoformat() for day in days])
+        
+        try:
+            day = datetime.date.fromisoformat(self.plan_day_var.get())
+        except ValueError:
+            day = today
+        
+        for slot in self.production_planner.plan(day):
+            self.production_tree.insert("", "end", values=(
+                slot.start.strftime("%H:%M"),
+                slot.end.strftime("%H:%M"),
+                slot.oven,
+                slot.batch.cake_name,
+                slot.batch.size,
+                slot.batch.quantity,
+                ", ".join(f"#{order_id}" for order_id in slot.batch.order_ids)
+            ), tags=("late",) if slot.late else ())
+    
+    def render_delivery_routes(self):
+        # Clear existing items
+        for item in self.route_tree.get_children():
+            self.route_tree.delete(item)
+        
+        try:
+            day = datetime.date.fromisoformat(self.route_day_entry.get().strip())
+        except ValueError:
+            messagebox.showerror("Error", "Please enter the delivery day in YYYY-MM-DD format.")
+            return
+        
+        stops, unlocated = self.delivery_dispatcher.load_stops(day)
+        routes = self.delivery_dispatcher.plan_routes(stops)
+        
+        for number, route in enumerate(routes, start=1):
+            route_text = f"Route {number} ({route.depart.strftime('%H:%M')})"
+            if route.late_stops:
+                route_text += f" - {route.late_stops} late"
+            route_id = self.route_tree.insert("", "end", text=route_text, open=True, values=(
+                "", "", f"{len(route.stops)} stops", "", "", f"{route.distance_km:.1f}"
+            ), tags=("late",) if route.late_stops else ())
+            for route_stop in route.stops:
+                stop = route_stop.stop
+                self.route_tree.insert(route_id, "end", values=(
+                    route_stop.eta.strftime("%H:%M"),
+                    stop.due.strftime("%H:%M"),
+                    f"#{stop.order_id}",
+                    stop.customer,
+                    stop.address,
+                    f"{route_stop.leg_km:.1f}"
+                ), tags=("late",) if route_stop.late else ())
+        
+        if unlocated:
+            unlocated_id = self.route_tree.insert("", "end", text="No coordinates", open=True, tags=("unlocated",))
+            for order_id, customer, delivery_date, address in unlocated:
+                self.route_tree.insert(unlocated_id, "end", values=(
+                    "", delivery_date or "", f"#{order_id}", customer, address or "", ""
+                ), tags=("unlocated",))
+        
+        if not routes and not unlocated:
+            self.route_tree.insert("", "end", text="No deliveries for this day")
+    
+    def show_delivery_location_modal(self):
+        # Pre-fill with the address of the selected stop, if any; route and
+        # group rows sit at the top level and carry no address
+        address = ""
+        selection = self.route_tree.selection()
+        if selection and self.route_tree.parent(selection[0]):
+            values = self.route_tree.item(selection[0], "values")
+            if len(values) > 4:
+                address = values[4]
+        
+        modal = tk.Toplevel(self.root)
+        modal.title("Set Delivery Coordinates")
+        modal.geometry("400x250")
+        modal.configure(bg="white")
+        modal.transient(self.root)
+        modal.grab_set()
+        
+        # Center the modal
+        modal.update_idletasks()
+        x = self.root.winfo_x() + (self.root.winfo_width() - modal.winfo_width()) // 2
+        y = self.root.winfo_y() + (self.root.winfo_height() - modal.winfo_height()) // 2
+        modal.geometry(f"+{x}+{y}")
+        
+        tk.Label(
+            modal,
+            text="Address:",
+            font=("Arial", 12),
+            bg="white"
+        ).pack(anchor=tk.W, padx=20, pady=(20, 5))
+        
+        address_entry = tk.Entry(
+            modal,
+            font=("Arial", 12),
+            relief=tk.SOLID,
+            bd=1
+        )
+        address_entry.pack(fill=tk.X, padx=20, pady=(0, 10))
+        address_entry.insert(0, address)
+        
+        tk.Label(
+            modal,
+            text="Coordinates (lat, lon):",
+            font=("Arial", 12),
+            bg="white"
+        ).pack(anchor=tk.W, padx=20, pady=(5, 5))
+        
+        coords_entry = tk.Entry(
+            modal,
+            font=("Arial", 12),
+            relief=tk.SOLID,
+            bd=1
+        )
+        coords_entry.pack(fill=tk.X, padx=20, pady=(0, 10))
+        
+        def save_location():
+            coords = parse_coordinates(coords_entry.get())
+            if not address_entry.get().strip() or coords is None:
+                messagebox.showerror("Error", "Please enter an address and valid coordinates.")
+                return
+            
+            self.db.set_delivery_location(address_entry.get().strip(), *coords)
+            modal.destroy()
+            self.render_delivery_routes()
+        
+        tk.Button(
+            modal,
+            text="Save",
+            command=save_location,
+            bg="#4ecdc4",
+            fg="white",
+            font=("Arial", 12, "bold"),
+            relief=tk.FLAT,
+            padx=20
+        ).pack(pady=(10, 20))
+    
     def render_customer_cakes(self):
         # Clear existing widgets
         for widget in self.customer_cakes_frame.winfo_children():
             widget.destroy()
         
-        # Get cakes from database
-        category = self.customer_category_var.get() if self.customer_category_var.get() != "all" else None
+        # Get cakes from the catalog index
         search_term = self.customer_search_entry.get() if self.customer_search_entry.get() else None
-        cakes = self.db.get_cakes(category, search_term)
+        cakes = self.db.catalog.filter(self.facet_selection(self.customer_facets), search_term)
         
         if not cakes:
             no_cakes_label = tk.Label(
@@ -1669,6 +2920,7 @@ class SweetDreamsApp:
                 bg="white"
             )
             emoji_label.pack(pady=(0, 10))
+            self.show_cake_image(emoji_label, cake)
             
             # Cake info
             tk.Label(
@@ -1713,6 +2965,19 @@ class SweetDreamsApp:
             )
             order_btn.pack()
             
+            # Add to cart button
+            cart_btn = tk.Button(
+                cake_card,
+                text="Add to Cart",
+                command=lambda c=cake: self.add_to_cart(c),
+                bg="#4ecdc4",
+                fg="white",
+                font=("Arial", 10, "bold"),
+                relief=tk.FLAT,
+                padx=10
+            )
+            cart_btn.pack(pady=(5, 0))
+            
             # Update column and row for grid
             col += 1
             if col > 2:  # 3 columns per row
@@ -1728,9 +2993,14 @@ class SweetDreamsApp:
         for widget in self.customer_orders_frame.winfo_children():
             widget.destroy()
         
-        # Get customer orders from database
-        orders = self.db.get_orders(user_id=self.current_user_id, user_role=self.current_role)
-        active_orders = [order for order in orders if order[5] not in ["completed", "cancelled"]]
+        # Get customer orders from the session cache
+        active_orders = self.customer_orders.active()
+        
+        totals = self.customer_orders.totals()
+        welcome = f"Welcome, {self.current_user_name}! Browse our delicious cakes and place your order."
+        if totals.orders:
+            welcome += f"\n{totals.orders} orders so far, {totals.active} in progress, ${totals.spent:.2f} spent."
+        self.welcome_label.config(text=welcome)
         
         if not active_orders:
             tk.Label(
@@ -1762,9 +3032,11 @@ class SweetDreamsApp:
             
             tk.Label(
                 order_frame,
-                text=f"Cake: {self.get_cake_name(order[3])}",  # cake_id -> name
+                text=f"Cakes: {describe_items(self.customer_orders.order_items(order[0]))}",
                 font=("Arial", 10),
-                bg="white"
+                bg="white",
+                wraplength=500,
+                justify=tk.LEFT
             ).pack(anchor=tk.W)
             
             tk.Label(
@@ -1774,8 +3046,8 @@ class SweetDreamsApp:
                 bg="white"
             ).pack(anchor=tk.W)
             
-            status_text = order[5].capitalize()  # status
-            status_color = self.get_status_color(order[5])
+            status_text = order[6].capitalize()  # status
+            status_color = self.get_status_color(order[6])
             
             status_label = tk.Label(
                 order_frame,
@@ -1803,7 +3075,7 @@ class SweetDreamsApp:
             ).pack(anchor=tk.W)
             
             # Cancel button for pending orders
-            if order[5] == "pending":
+            if order[6] == "pending":
                 cancel_btn = tk.Button(
                     order_frame,
                     text="Cancel Order",
@@ -1821,20 +3093,161 @@ class SweetDreamsApp:
         for item in self.history_tree.get_children():
             self.history_tree.delete(item)
         
-        # Get customer orders from database
-        orders = self.db.get_orders(user_id=self.current_user_id, user_role=self.current_role)
+        # Get customer orders from the session cache
+        orders = self.customer_orders.history()
         
-        # Add orders to treeview
+        self.archived_history_btn.config(state=tk.NORMAL, text="Show Archived Orders")
+        
+        # Add orders to treeview (row id is the order id)
         for order in orders:
-            status_text = order[5].capitalize()  # status
-            self.history_tree.insert("", "end", values=(
+            status_text = order[6].capitalize()  # status
+            self.history_tree.insert("", "end", iid=str(order[0]), values=(
                 order[7].split('T')[0] if order[7] else "",  # order_date
-                self.get_cake_name(order[3]),  # cake_id -> name
+                describe_items(self.customer_orders.order_items(order[0])),
                 order[4],  # quantity
                 status_text,
                 f"${order[5]:.2f}"  # total_price
             ))
     
+    def load_archived_history(self):
+        orders, order_items = self.db.get_archived_orders(self.current_user_id)
+        for order in orders:
+            if self.history_tree.exists(str(order[0])):
+                continue
+            self.history_tree.insert("", "end", iid=str(order[0]), tags=("archived",), values=(
+                order[7].split('T')[0] if order[7] else "",  # order_date
+                describe_items(order_items.get(order[0], [])),
+                order[4],  # quantity
+                order[6].capitalize(),  # status
+                f"${order[5]:.2f}"  # total_price
+            ))
+        self.archived_history_btn.config(
+            state=tk.DISABLED,
+            text=f"{len(orders)} archived orders shown" if orders else "No archived orders"
+        )
+    
+    def start_backup(self):
+        # Orders keep flowing while the worker copies the database page by page
+        if not self.backup_worker.start():
+            return
+        self.backup_btn.config(state=tk.DISABLED)
+        self.backup_status.config(text="Backing up...")
+        self.root.after(200, self.poll_backup)
+    
+    def poll_backup(self):
+        if self.backup_worker.running:
+            self.root.after(200, self.poll_backup)
+            return
+        
+        self.backup_btn.config(state=tk.NORMAL)
+        if self.backup_worker.error:
+            self.backup_status.config(text="Backup failed")
+            messagebox.showerror("Backup", f"Backup failed: {self.backup_worker.error}")
+        else:
+            snapshot = self.backup_worker.result
+            self.backup_status.config(
+                text=f"Last backup: {snapshot['created_at'].split('.')[0]} "
+                     f"({snapshot['size'] / 1e6:.1f} MB, {snapshot['new_bytes'] / 1e3:.0f} KB new)"
+            )
+    
+    def show_audit_history(self, entity, entity_id):
+        if not entity_id:
+            messagebox.showerror("Error", "Please enter an id to look up.")
+            return
+        # Ids are recorded as ints except for addresses
+        if entity_id.isdigit():
+            entity_id = int(entity_id)
+        records = self.db.audit_log.history(entity, entity_id)
+        
+        modal = tk.Toplevel(self.root)
+        modal.title(f"Audit Log - {entity} {entity_id}")
+        modal.geometry("800x400")
+        modal.configure(bg="white")
+        modal.transient(self.root)
+        
+        columns = ("Time", "User", "Action", "Details")
+        tree = ttk.Treeview(modal, columns=columns, show="headings")
+        for col, width in zip(columns, (160, 100, 130, 380)):
+            tree.heading(col, text=col)
+            tree.column(col, width=width)
+        tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        
+        for record in records:
+            details = ", ".join(f"{key}={value}" for key, value in record["data"].items() if value is not None)
+            tree.insert("", tk.END, values=(
+                record["ts"].replace("T", " "),
+                record["actor"] or "-",
+                record["action"],
+                details
+            ))
+        if not records:
+            tree.insert("", tk.END, values=("", "", "No records", ""))
+    
+    def show_scheduled_jobs(self):
+        modal = tk.Toplevel(self.root)
+        modal.title("Scheduled Jobs")
+        modal.geometry("900x320")
+        modal.configure(bg="white")
+        modal.transient(self.root)
+        
+        columns = ("Job", "Next Run", "Last Run", "Status", "Last", "Avg", "Max", "Runs", "Failed", "Skipped")
+        tree = ttk.Treeview(modal, columns=columns, show="headings")
+        for col, width in zip(columns, (130, 130, 130, 200, 60, 60, 60, 50, 50, 55)):
+            tree.heading(col, text=col)
+            tree.column(col, width=width)
+        tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        
+        def refresh():
+            tree.delete(*tree.get_children())
+            for job in job_stats(self.db.conn):
+                if job.running_since:
+                    status = f"running since {job.running_since[11:19]}"
+                elif job.last_status:
+                    status = f"{job.last_status}: {job.last_result}" if job.last_result else job.last_status
+                else:
+                    status = "-"
+                tree.insert("", tk.END, iid=job.name, values=(
+                    job.name,
+                    job.next_run[:16].replace("T", " "),
+                    job.last_started[:16].replace("T", " ") if job.last_started else "-",
+                    status,
+                    f"{job.last_seconds:.1f}s" if job.last_seconds is not None else "-",
+                    f"{job.avg_seconds:.1f}s",
+                    f"{job.max_seconds:.1f}s",
+                    job.runs,
+                    job.failures,
+                    job.skipped
+                ))
+        
+        def run_selected():
+            for name in tree.selection():
+                self.scheduler.run_now(name)
+            modal.after(500, refresh)
+        
+        btn_frame = tk.Frame(modal, bg="white")
+        btn_frame.pack(fill=tk.X, padx=10, pady=(0, 10))
+        for text, command in (("Run Now", run_selected), ("Refresh", refresh)):
+            tk.Button(
+                btn_frame,
+                text=text,
+                command=command,
+                bg="#667eea",
+                fg="white",
+                font=("Arial", 10, "bold"),
+                relief=tk.FLAT
+            ).pack(side=tk.LEFT, padx=(0, 5))
+        refresh()
+    
+    def archive_old_orders(self):
+        if not messagebox.askyesno(
+            "Archive Orders",
+            f"Move completed and cancelled orders older than {ARCHIVE_AFTER_DAYS} days to the archive?"
+        ):
+            return
+        count = self.db.archive_orders()
+        self.render_all_orders()
+        messagebox.showinfo("Archive Orders", f"Archived {count} orders.")
+    
     def show_register_modal(self):
         modal = tk.Toplevel(self.root)
         modal.title("Customer Registration")
@@ -1998,16 +3411,9 @@ class SweetDreamsApp:
             messagebox.showerror("Error", "Username already exists. Please choose a different one.")
             return
         
-        # Hash password
-        hashed_password = self.db.hash_password(password)
-        
         # Insert new customer
         try:
-            cursor.execute(
-                "INSERT INTO users (username, password, role, name, email, phone) VALUES (?, ?, 'customer', ?, ?, ?)",
-                (username, hashed_password, name, email, phone)
-            )
-            self.db.conn.commit()
+            self.db.add_user(username, password, "customer", name, email, phone)
             modal.destroy()
             messagebox.showinfo("Success", "Registration successful! You can now login.")
         except Exception as e:
@@ -2067,8 +3473,7 @@ class SweetDreamsApp:
         flavor_combo = ttk.Combobox(
             modal,
             textvariable=flavor_var,
-            values=["chocolate", "vanilla", "strawberry", "red-velvet", "carrot", "lemon", "cheesecake"],
-            state="readonly",
+            values=self.db.catalog.values("flavor"),
             font=("Arial", 12)
         )
         flavor_combo.pack(fill=tk.X, padx=20, pady=(0, 10))
@@ -2085,8 +3490,7 @@ class SweetDreamsApp:
         size_combo = ttk.Combobox(
             modal,
             textvariable=size_var,
-            values=["small", "medium", "large", "extra-large"],
-            state="readonly",
+            values=self.db.catalog.values("size"),
             font=("Arial", 12)
         )
         size_combo.pack(fill=tk.X, padx=20, pady=(0, 10))
@@ -2103,8 +3507,7 @@ class SweetDreamsApp:
         category_combo = ttk.Combobox(
             modal,
             textvariable=category_var,
-            values=["birthday", "wedding", "anniversary", "celebration", "regular"],
-            state="readonly",
+            values=self.db.catalog.values("category"),
             font=("Arial", 12)
         )
         category_combo.pack(fill=tk.X, padx=20, pady=(0, 10))
@@ -2196,13 +3599,9 @@ class SweetDreamsApp:
             return
         
         # Insert into database
-        cursor = self.db.conn.cursor()
         try:
-            cursor.execute(
-                "INSERT INTO cakes (name, flavor, size, price, stock, description, category) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                (name, flavor, size, price_val, stock_val, description, category)
-            )
-            self.db.conn.commit()
+            self.db.add_cake(name, flavor.strip().lower(), size.strip().lower(), price_val, stock_val,
+                             description, category.strip().lower())
             modal.destroy()
             self.render_admin_cakes()
             messagebox.showinfo("Success", "Cake added successfully!")
@@ -2216,10 +3615,8 @@ class SweetDreamsApp:
     
     def delete_cake(self, cake):
         if messagebox.askyesno("Confirm", "Are you sure you want to delete this cake?"):
-            cursor = self.db.conn.cursor()
             try:
-                cursor.execute("DELETE FROM cakes WHERE id = ?", (cake[0],))
-                self.db.conn.commit()
+                self.db.delete_cake(cake[0])
                 self.render_admin_cakes()
                 messagebox.showinfo("Success", "Cake deleted successfully!")
             except Exception as e:
@@ -2251,7 +3648,7 @@ class SweetDreamsApp:
             stats_text += f"Most Popular: {popular_items[0][0]}\n"
         
         # Get low stock items
-        low_stock = self.db.get_low_stock_items()
+        low_stock = self.db.get_stock_alerts()
         if low_stock:
             stats_text += f"\nLow Stock Alert: {len(low_stock)} items need restocking"
         
@@ -2315,43 +3712,112 @@ class SweetDreamsApp:
         
         # Validate dates
         try:
-            datetime.datetime.strptime(start_date, "%Y-%m-%d")
-            datetime.datetime.strptime(end_date, "%Y-%m-%d")
+            start = datetime.datetime.strptime(start_date, "%Y-%m-%d").date()
+            end = datetime.datetime.strptime(end_date, "%Y-%m-%d").date()
         except ValueError:
             messagebox.showerror("Error", "Please enter dates in YYYY-MM-DD format.")
             return
         
-        # Get sales data
-        sales_data = self.db.get_sales_report(start_date, end_date)
-        popular_items = self.db.get_popular_items(start_date, end_date)
-        
-        # Calculate totals
-        total_orders = 0
-        total_revenue = 0
-        status_counts = {}
+        # Months are aggregated in worker processes; closed months come from the cache
+        try:
+            job = self.db.report_engine.start(start, end)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return
+        self.report_display.config(text=f"Building report ({start_date} to {end_date})...")
+        self.poll_custom_report(job)
+    
+    def poll_custom_report(self, job):
+        if not job.ready():
+            self.root.after(100, lambda: self.poll_custom_report(job))
+            return
         
-        for data in sales_data:
-            total_orders += data[0]  # total_orders
-            total_revenue += data[1] if data[1] else 0  # total_revenue
-            status_counts[data[3]] = data[0]  # status count
+        try:
+            report = self.db.report_engine.finish(job)
+        except Exception as e:
+            self.report_display.config(text="Select a report to generate...")
+            messagebox.showerror("Error", f"Failed to build report: {str(e)}")
+            return
         
         # Format report text
-        report_text = f"Custom Report ({start_date} to {end_date})\n\n"
-        report_text += f"Total Orders: {total_orders}\n"
-        report_text += f"Total Revenue: ${total_revenue:.2f}\n"
+        report_text = f"Custom Report ({report.start} to {report.end})\n\n"
+        report_text += f"Total Orders: {report.total_orders}\n"
+        report_text += f"Total Revenue: ${report.total_revenue:.2f}\n"
         
-        if total_orders > 0:
-            report_text += f"Average Order Value: ${total_revenue/total_orders:.2f}\n\n"
+        if report.total_orders > 0:
+            report_text += f"Average Order Value: ${report.total_revenue/report.total_orders:.2f}\n\n"
         else:
             report_text += "\n"
         
         report_text += "Order Status:\n"
-        for status, count in status_counts.items():
+        for status, (count, _) in report.statuses.items():
             report_text += f"  {status.capitalize()}: {count}\n"
         
+        # Cakes deleted since are left out, as the live report did
+        popular_items = [item for item in report.popular if item[0] in self.db.catalog.cakes]
         if popular_items:
-            report_text += f"\nMost Popular Item: {popular_items[0][0]}\n"
-            report_text += f"Revenue from Top Item: ${popular_items[0][5]:.2f}\n"
+            report_text += f"\nMost Popular Item: {self.db.catalog.cakes[popular_items[0][0]][1]}\n"
+            report_text += f"Revenue from Top Item: ${popular_items[0][3]:.2f}\n"
+        
+        self.report_display.config(text=report_text)
+    
+    def generate_lead_time_report(self):
+        # Uses the custom report's date range; computed in the report worker processes
+        try:
+            start = datetime.datetime.strptime(self.start_date_entry.get(), "%Y-%m-%d").date()
+            end = datetime.datetime.strptime(self.end_date_entry.get(), "%Y-%m-%d").date()
+        except ValueError:
+            messagebox.showerror("Error", "Please enter dates in YYYY-MM-DD format.")
+            return
+        
+        try:
+            future = self.db.report_engine.lead_times(start, end)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return
+        self.report_display.config(text=f"Measuring lead times ({start} to {end})...")
+        self.poll_lead_time_report(future)
+    
+    def poll_lead_time_report(self, future):
+        if not future.done():
+            self.root.after(100, lambda: self.poll_lead_time_report(future))
+            return
+        
+        try:
+            lead_times = future.result()
+        except Exception as e:
+            self.report_display.config(text="Select a report to generate...")
+            messagebox.showerror("Error", f"Failed to measure lead times: {str(e)}")
+            return
+        
+        def line(label, percentiles):
+            return (f"  {label}: p50 {format_duration(percentiles.p50)}, p90 {format_duration(percentiles.p90)}, "
+                    f"p99 {format_duration(percentiles.p99)} ({percentiles.count} orders)\n")
+        
+        report_text = f"Lead Times ({lead_times.start} to {lead_times.end}), {lead_times.orders} orders\n\n"
+        report_text += "By Stage:\n"
+        for stage in STAGES:
+            if stage in lead_times.overall:
+                report_text += line(stage, lead_times.overall[stage])
+        
+        # The stage with the worst p90 is where orders queue up
+        kitchen = [stage for stage in STAGES if stage != TOTAL and stage in lead_times.overall]
+        if kitchen:
+            bottleneck = max(kitchen, key=lambda stage: lead_times.overall[stage].p90)
+            report_text += f"\nBottleneck: {bottleneck}\n"
+            
+            report_text += f"\nSlowest Cakes ({bottleneck}):\n"
+            for cake_id, percentiles in slowest(lead_times.by_cake, bottleneck):
+                cake = self.db.catalog.cakes.get(cake_id)
+                report_text += line(cake[1] if cake else f"Cake #{cake_id}", percentiles)
+            
+            report_text += f"\nSlowest Notes ({bottleneck}):\n"
+            for note, percentiles in slowest(lead_times.by_note, bottleneck):
+                report_text += line(note, percentiles)
+        
+        report_text += f"\nBy Day Ordered ({TOTAL}):\n"
+        for day, percentiles in slowest(lead_times.by_weekday, TOTAL, limit=7):
+            report_text += line(day, percentiles)
         
         self.report_display.config(text=report_text)
     
@@ -2535,25 +4001,9 @@ class SweetDreamsApp:
             messagebox.showerror("Error", "Username already exists. Please choose a different one.")
             return
         
-        # Hash password
-        hashed_password = self.db.hash_password(password)
-        
         # Insert new staff
         try:
-            cursor.execute(
-                "INSERT INTO users (username, password, role, name, email) VALUES (?, ?, 'staff', ?, ?)",
-                (username, hashed_password, name, email)
-            )
-            user_id = cursor.lastrowid
-            
-            # Add to staff table
-            hire_date = datetime.datetime.now().isoformat()
-            cursor.execute(
-                "INSERT INTO staff (user_id, position, hire_date) VALUES (?, ?, ?)",
-                (user_id, position, hire_date)
-            )
-            
-            self.db.conn.commit()
+            self.db.add_staff_member(username, password, name, email, position)
             modal.destroy()
             self.render_staff_list()
             messagebox.showinfo("Success", "Staff member added successfully!")
@@ -2638,6 +4088,17 @@ class SweetDreamsApp:
         )
         edit_btn.pack(side=tk.LEFT, padx=5)
         
+        history_btn = tk.Button(
+            btn_frame,
+            text="History",
+            command=lambda: self.show_inventory_history(tree),
+            bg="#667eea",
+            fg="white",
+            font=("Arial", 10, "bold"),
+            relief=tk.FLAT
+        )
+        history_btn.pack(side=tk.LEFT, padx=5)
+        
         close_btn = tk.Button(
             btn_frame,
             text="Close",
@@ -2655,13 +4116,12 @@ class SweetDreamsApp:
             messagebox.showerror("Error", "Please select an item to edit.")
             return
         
-        item_id = tree.item(selection[0], "values")[0]
-        current_qty = tree.item(selection[0], "values")[3]
+        item_id, item_name, _, current_qty, unit = tree.item(selection[0], "values")[:5]
         
         # Create edit modal
         edit_modal = tk.Toplevel(self.root)
         edit_modal.title("Edit Inventory Item")
-        edit_modal.geometry("300x200")
+        edit_modal.geometry("320x380")
         edit_modal.configure(bg="white")
         edit_modal.transient(self.root)
         edit_modal.grab_set()
@@ -2674,21 +4134,38 @@ class SweetDreamsApp:
         
         tk.Label(
             edit_modal,
-            text="Edit Inventory Quantity",
+            text=f"Record Stock Movement - {item_name}",
             font=("Arial", 14, "bold"),
             bg="white"
         ).pack(pady=(20, 10))
         
         tk.Label(
             edit_modal,
-            text=f"Current Quantity: {current_qty}",
+            text=f"Current Quantity: {current_qty} {unit}",
             font=("Arial", 11),
             bg="white"
         ).pack(pady=(0, 10))
         
         tk.Label(
             edit_modal,
-            text="New Quantity:",
+            text="Movement:",
+            font=("Arial", 11),
+            bg="white"
+        ).pack(anchor=tk.W, padx=20, pady=(5, 5))
+        
+        kind_var = tk.StringVar(value="receipt")
+        kind_combo = ttk.Combobox(
+            edit_modal,
+            textvariable=kind_var,
+            values=list(MOVEMENT_KINDS),
+            state="readonly",
+            font=("Arial", 11)
+        )
+        kind_combo.pack(fill=tk.X, padx=20, pady=(0, 10))
+        
+        tk.Label(
+            edit_modal,
+            text="Quantity (adjustments may be negative):",
             font=("Arial", 11),
             bg="white"
         ).pack(anchor=tk.W, padx=20, pady=(5, 5))
@@ -2700,13 +4177,28 @@ class SweetDreamsApp:
             bd=1
         )
         qty_entry.pack(fill=tk.X, padx=20, pady=(0, 10))
-        qty_entry.insert(0, current_qty)
+        
+        tk.Label(
+            edit_modal,
+            text="Note (optional):",
+            font=("Arial", 11),
+            bg="white"
+        ).pack(anchor=tk.W, padx=20, pady=(5, 5))
+        
+        note_entry = tk.Entry(
+            edit_modal,
+            font=("Arial", 11),
+            relief=tk.SOLID,
+            bd=1
+        )
+        note_entry.pack(fill=tk.X, padx=20, pady=(0, 10))
         
         # Update button
         update_btn = tk.Button(
             edit_modal,
-            text="Update",
-            command=lambda: self.update_inventory_item(item_id, qty_entry.get(), edit_modal),
+            text="Record",
+            command=lambda: self.update_inventory_item(tree, selection[0], item_id, kind_var.get(), qty_entry.get(),
+                                                       note_entry.get().strip(), edit_modal),
             bg="#4ecdc4",
             fg="white",
             font=("Arial", 11, "bold"),
@@ -2716,24 +4208,104 @@ class SweetDreamsApp:
         )
         update_btn.pack(pady=(10, 20))
     
-    def update_inventory_item(self, item_id, quantity, modal):
+    def update_inventory_item(self, tree, row, item_id, kind, quantity, note, modal):
         try:
             qty_val = float(quantity)
-            if qty_val < 0:
-                raise ValueError
         except ValueError:
             messagebox.showerror("Error", "Please enter a valid quantity.")
             return
         
         try:
-            self.db.update_inventory(item_id, qty_val)
+            new_qty = self.db.record_inventory_movement(int(item_id), kind, qty_val, note or None)
+            tree.set(row, "quantity", f"{new_qty:.1f}")
             modal.destroy()
             messagebox.showinfo("Success", "Inventory updated successfully!")
             if self.current_role == "staff":
                 self.update_inventory_display()
+        except InventoryError as e:
+            messagebox.showerror("Error", str(e))
         except Exception as e:
             messagebox.showerror("Error", f"Failed to update inventory: {str(e)}")
     
+    def show_inventory_history(self, tree):
+        selection = tree.selection()
+        if not selection:
+            messagebox.showerror("Error", "Please select an item to view.")
+            return
+        
+        item_id, item_name, _, _, unit = tree.item(selection[0], "values")[:5]
+        item_id = int(item_id)
+        
+        modal = tk.Toplevel(self.root)
+        modal.title(f"Stock History - {item_name}")
+        modal.geometry("640x480")
+        modal.configure(bg="white")
+        modal.transient(self.root)
+        
+        tk.Label(
+            modal,
+            text=f"Stock History - {item_name}",
+            font=("Arial", 16, "bold"),
+            bg="white"
+        ).pack(pady=(20, 10))
+        
+        # Balance at the end of a chosen day
+        as_of_frame = tk.Frame(modal, bg="white")
+        as_of_frame.pack(fill=tk.X, padx=20, pady=(0, 10))
+        
+        tk.Label(
+            as_of_frame,
+            text="Quantity at end of (YYYY-MM-DD):",
+            font=("Arial", 10),
+            bg="white"
+        ).pack(side=tk.LEFT)
+        
+        day_entry = tk.Entry(as_of_frame, font=("Arial", 10), width=12, relief=tk.SOLID, bd=1)
+        day_entry.pack(side=tk.LEFT, padx=5)
+        day_entry.insert(0, datetime.date.today().isoformat())
+        
+        as_of_label = tk.Label(as_of_frame, text="", font=("Arial", 10, "bold"), bg="white")
+        
+        def show_as_of():
+            try:
+                day = datetime.date.fromisoformat(day_entry.get().strip())
+            except ValueError:
+                messagebox.showerror("Error", "Please enter a date as YYYY-MM-DD.", parent=modal)
+                return
+            end_of_day = datetime.datetime.combine(day, datetime.time.max).isoformat()
+            quantity = self.db.get_inventory_as_of(end_of_day).get(item_id)
+            as_of_label.config(
+                text="not stocked yet" if quantity is None else f"{quantity:.1f} {unit}"
+            )
+        
+        tk.Button(
+            as_of_frame,
+            text="Show",
+            command=show_as_of,
+            bg="#4ecdc4",
+            fg="white",
+            font=("Arial", 10, "bold"),
+            relief=tk.FLAT
+        ).pack(side=tk.LEFT, padx=5)
+        as_of_label.pack(side=tk.LEFT, padx=10)
+        
+        columns = ("when", "kind", "change", "by", "note")
+        history_tree = ttk.Treeview(modal, columns=columns, show="headings", height=15)
+        for column, heading, width in (("when", "When", 140), ("kind", "Movement", 100), ("change", "Change", 80),
+                                       ("by", "By", 100), ("note", "Note", 180)):
+            history_tree.heading(column, text=heading)
+            history_tree.column(column, width=width)
+        history_tree.pack(fill=tk.BOTH, expand=True, padx=20, pady=(0, 20))
+        
+        for movement in self.db.get_inventory_movements(item_id):
+            history_tree.insert("", "end", values=(
+                movement.moved_at[:16].replace("T", " "),
+                movement.kind,
+                f"{movement.delta:+.1f}",
+                movement.actor or "",
+                movement.note or ""
+            ))
+    
     def show_add_inventory_modal(self):
         modal = tk.Toplevel(self.root)
         modal.title("Add Inventory Item")
@@ -2883,7 +4455,7 @@ class SweetDreamsApp:
             messagebox.showerror("Error", f"Failed to add inventory item: {str(e)}")
     
     def show_low_stock_modal(self):
-        low_stock_items = self.db.get_low_stock_items()
+        low_stock_items = self.db.get_stock_alerts()
         
         if not low_stock_items:
             messagebox.showinfo("Info", "No items are below minimum stock levels.")
@@ -2939,13 +4511,13 @@ class SweetDreamsApp:
         tree_scroll.pack(side=tk.RIGHT, fill=tk.Y, pady=10)
         
         # Load low stock data
-        for item in low_stock_items:
+        for alert in low_stock_items:
             tree.insert("", "end", values=(
-                item[1],  # item_name
-                item[2],  # category
-                f"{item[3]:.1f}",  # quantity
-                item[4],  # unit
-                f"{item[5]:.1f}"  # min_stock_level
+                alert.name,
+                alert.category,
+                f"{alert.quantity:.1f}",
+                alert.unit,
+                f"{alert.min_level:.1f}"
             ))
         
         # Close button
@@ -2962,6 +4534,9 @@ class SweetDreamsApp:
         close_btn.pack(pady=(0, 20))
     
     def update_inventory_display(self):
+        if not self.tab_built(self.staff_tab):
+            return
+        
         inventory = self.db.get_inventory()
         
         # Format inventory text
@@ -2973,67 +4548,135 @@ class SweetDreamsApp:
             inventory_text += f"\n... and {len(inventory) - 5} more items"
         
         # Check for low stock
-        low_stock = self.db.get_low_stock_items()
+        low_stock = self.db.get_stock_alerts()
         if low_stock:
             inventory_text += f"\n\n⚠️ Low Stock Alert: {len(low_stock)} items need restocking"
         
         self.inventory_display.config(text=inventory_text)
     
     def accept_order(self, order):
-        self.db.update_order_status(order[0], "preparing", "Order accepted by staff")
+        try:
+            self.db.update_order_status(order[0], "preparing", "Order accepted by staff")
+        except InvalidTransitionError as e:
+            messagebox.showerror("Error", str(e))
+            self.render_incoming_orders()
+            return
+        
         self.render_incoming_orders()
         self.render_order_management()
+        self.render_production_plan()
         
         # Send notification email
-        if order[13]:  # email
-            subject = f"Sweet Dreams Bakery - Order #{order[0]} Accepted"
-            body = f"Dear {order[2]},\n\nYour order #{order[0]} has been accepted and is now being prepared.\n\nThank you for choosing Sweet Dreams Bakery!"
-            self.email_service.send_email(order[13], subject, body)
+        self.notifier.order_status_changed(order[13], order[2], order[0], "preparing")  # email, customer_name
         
         messagebox.showinfo("Success", f"Order #{order[0]} has been accepted and moved to preparation.")
     
     def decline_order(self, order):
         if messagebox.askyesno("Confirm", "Are you sure you want to decline this order?"):
-            self.db.update_order_status(order[0], "cancelled", "Order declined by staff")
+            try:
+                self.db.update_order_status(order[0], "cancelled", "Order declined by staff")
+            except InvalidTransitionError as e:
+                messagebox.showerror("Error", str(e))
+                self.render_incoming_orders()
+                return
+            
             self.render_incoming_orders()
             self.render_order_management()
+            self.render_production_plan()
             
             # Send notification email
-            if order[13]:  # email
-                subject = f"Sweet Dreams Bakery - Order #{order[0]} Cancelled"
-                body = f"Dear {order[2]},\n\nWe regret to inform you that your order #{order[0]} has been cancelled.\n\nPlease contact us if you have any questions."
-                self.email_service.send_email(order[13], subject, body)
+            self.notifier.order_status_changed(order[13], order[2], order[0], "cancelled")  # email, customer_name
             
             messagebox.showinfo("Success", f"Order #{order[0]} has been declined and cancelled.")
     
     def update_order_status(self, order, new_status):
-        self.db.update_order_status(order[0], new_status, f"Status changed by {self.current_role}")
+        if new_status == order[6]:  # status unchanged
+            return
+        
+        try:
+            self.db.update_order_status(order[0], new_status, f"Status changed by {self.current_role}")
+        except InvalidTransitionError as e:
+            messagebox.showerror("Error", str(e))
+            self.render_order_management()
+            return
+        
         self.render_order_management()
+        self.render_production_plan()
         if self.current_role == "admin":
             self.render_all_orders()
         
         # Send notification email for important status changes
-        if new_status in ["ready", "completed"] and order[13]:  # email
-            subject = f"Sweet Dreams Bakery - Order #{order[0]} Status Update"
-            body = f"Dear {order[2]},\n\nYour order #{order[0]} status has been updated to: {new_status}\n\nThank you for choosing Sweet Dreams Bakery!"
-            self.email_service.send_email(order[13], subject, body)
+        if new_status in ["ready", "completed"]:
+            self.notifier.order_status_changed(order[13], order[2], order[0], new_status)  # email, customer_name
         
         messagebox.showinfo("Success", f"Order #{order[0]} status updated to: {new_status}")
     
+    def apply_bulk_status(self, new_status):
+        selected = [order for var, order in self.order_mgmt_selection.values() if var.get()]
+        
+        if not selected:
+            messagebox.showerror("Error", "Please select at least one order.")
+            return
+        
+        self.bulk_update_order_status(selected, new_status)
+    
+    def close_out_ready_orders(self):
+        ready_orders = self.db.get_orders(status="ready")
+        
+        if not ready_orders:
+            messagebox.showinfo("Info", "No orders are ready for completion.")
+            return
+        
+        if messagebox.askyesno("Confirm", f"Mark {len(ready_orders)} ready orders as completed?"):
+            self.bulk_update_order_status(ready_orders, "completed")
+    
+    def bulk_update_order_status(self, orders, new_status):
+        # Single transaction for the whole batch, then a single re-render
+        moved, rejected = self.db.bulk_update_order_status(
+            [order[0] for order in orders], new_status, f"Bulk status change by {self.current_role}"
+        )
+        
+        self.render_incoming_orders()
+        self.render_order_management()
+        self.render_production_plan()
+        if self.current_role == "admin":
+            self.render_all_orders()
+        
+        # Queued for the notifier; a customer with several orders in the batch gets one email
+        if new_status in ["ready", "completed"]:
+            moved_ids = {order_id for order_id, _ in moved}
+            for order in orders:
+                if order[0] in moved_ids:
+                    self.notifier.order_status_changed(order[13], order[2], order[0], new_status)
+        
+        summary = f"{len(moved)} orders updated to: {new_status}"
+        if rejected:
+            summary += f"\n{len(rejected)} orders skipped (invalid status change)"
+        messagebox.showinfo("Success", summary)
+    
     def notify_customer(self, order):
         if order[13]:  # email
-            subject = f"Sweet Dreams Bakery - Order #{order[0]} Notification"
-            body = f"Dear {order[2]},\n\nThis is a notification about your order #{order[0]}.\n\nCurrent status: {order[5]}\n\nThank you for choosing Sweet Dreams Bakery!"
-            if self.email_service.send_email(order[13], subject, body):
-                messagebox.showinfo("Notification", f"Customer {order[2]} has been notified via email.")
-            else:
-                messagebox.showerror("Error", "Failed to send email notification.")
+            sent = self.notifier.send(order[13], "order_notice", name=order[2], order_id=order[0], status=order[6])
+            self.root.after(200, lambda: self.check_notification(sent, order))
+        else:
+            messagebox.showinfo("Notification", f"Customer {order[2]} would be notified about Order #{order[0]} status: {order[6]}")
+    
+    def check_notification(self, sent, order):
+        if not sent.done():
+            self.root.after(200, lambda: self.check_notification(sent, order))
+        elif sent.result():
+            messagebox.showinfo("Notification", f"Customer {order[2]} has been notified via email.")
         else:
-            messagebox.showinfo("Notification", f"Customer {order[2]} would be notified about Order #{order[0]} status: {order[5]}")
+            messagebox.showerror("Error", "Failed to send email notification.")
     
     def cancel_order(self, order):
         if messagebox.askyesno("Confirm", "Are you sure you want to cancel this order?"):
-            self.db.update_order_status(order[0], "cancelled", "Cancelled by customer")
+            try:
+                self.db.update_order_status(order[0], "cancelled", "Cancelled by customer")
+            except InvalidTransitionError as e:
+                messagebox.showerror("Error", str(e))
+                return
+            
             self.render_customer_orders()
             self.render_order_history()
             messagebox.showinfo("Success", f"Order #{order[0]} has been cancelled.")
@@ -3142,7 +4785,7 @@ class SweetDreamsApp:
         qty_combo = ttk.Combobox(
             modal,
             textvariable=qty_var,
-            values=["1", "2", "3", "4", "5"],
+            values=[str(n) for n in range(1, MAX_ORDER_QUANTITY + 1)],
             state="readonly",
             font=("Arial", 12)
         )
@@ -3263,11 +4906,10 @@ class SweetDreamsApp:
             return
         
         cake_id, cake_price = cake_data
-        total_price = cake_price * qty_val
         
-        # Add delivery fee if applicable
-        if service == "delivery":
-            total_price += 5  # $5 delivery fee
+        # Promotions and the delivery fee; walk-ins have no loyalty account
+        quote = self.db.price_book.quote([(cake_id, qty_val)], service)
+        total_price = quote.total
         
         # Create order
         order_id = self.db.create_order(
@@ -3282,7 +4924,8 @@ class SweetDreamsApp:
             delivery_date=datetime.datetime.now().isoformat(),
             address=address,
             phone=phone,
-            email=email
+            email=email,
+            lines=quote_order_lines(quote)
         )
         
         # Update cake stock
@@ -3368,42 +5011,45 @@ class SweetDreamsApp:
         )
         design_text.pack(fill=tk.X, padx=20, pady=(0, 10))
         
-        # Pickup/Delivery Date
+        # Pickup/Delivery Slot
         tk.Label(
             modal,
-            text="Pickup/Delivery Date:",
+            text="Pickup/Delivery Slot:",
             font=("Arial", 12),
             bg="white"
         ).pack(anchor=tk.W, padx=20, pady=(5, 5))
         
-        # Create a frame for date and time entries
-        date_frame = tk.Frame(modal, bg="white")
-        date_frame.pack(fill=tk.X, padx=20, pady=(0, 10))
-        
-        # Date entry
-        today = datetime.datetime.now()
-        date_var = tk.StringVar(value=today.strftime("%Y-%m-%d"))
-        date_entry = tk.Entry(
-            date_frame,
-            textvariable=date_var,
-            font=("Arial", 12),
-            relief=tk.SOLID,
-            bd=1,
-            width=12
+        slot_var = tk.StringVar()
+        slot_choices = []
+        slot_combo = ttk.Combobox(
+            modal,
+            textvariable=slot_var,
+            state="readonly",
+            font=("Arial", 12)
         )
-        date_entry.pack(side=tk.LEFT)
+        slot_combo.pack(fill=tk.X, padx=20, pady=(0, 10))
         
-        # Time entry
-        time_var = tk.StringVar(value="12:00")
-        time_entry = tk.Entry(
-            date_frame,
-            textvariable=time_var,
-            font=("Arial", 12),
-            relief=tk.SOLID,
-            bd=1,
-            width=8
-        )
-        time_entry.pack(side=tk.LEFT, padx=(10, 0))
+        # Only slots with room for the chosen quantity are offered; re-read on every open
+        def refresh_slots(*args):
+            selected = slot_choices[slot_combo.current()].id if slot_combo.current() >= 0 else None
+            slot_choices[:] = self.db.get_available_slots(int(qty_var.get()))
+            slot_combo["values"] = [format_slot(slot) for slot in slot_choices]
+            
+            slot_ids = [slot.id for slot in slot_choices]
+            if selected in slot_ids:
+                slot_combo.current(slot_ids.index(selected))
+            elif slot_choices:
+                slot_combo.current(0)
+            else:
+                slot_var.set("No slots available")
+        
+        slot_combo.configure(postcommand=refresh_slots)
+        qty_var.trace("w", refresh_slots)
+        refresh_slots()
+        
+        def selected_slot():
+            index = slot_combo.current()
+            return slot_choices[index] if index >= 0 else None
         
         # Service Type
         tk.Label(
@@ -3452,6 +5098,18 @@ class SweetDreamsApp:
         service_var.trace("w", toggle_address)
         toggle_address()  # Initial call
         
+        # Loyalty points, offered once the balance is worth redeeming
+        points_balance = self.db.get_loyalty_points(self.current_user_id)
+        use_points_var = tk.BooleanVar(value=False)
+        if points_balance >= MIN_REDEEM_POINTS:
+            tk.Checkbutton(
+                modal,
+                text=f"Use my loyalty points ({points_balance} available)",
+                variable=use_points_var,
+                font=("Arial", 11),
+                bg="white"
+            ).pack(anchor=tk.W, padx=20)
+        
         # Price display
         price_frame = tk.Frame(modal, bg="white")
         price_frame.pack(fill=tk.X, padx=20, pady=(10, 0))
@@ -3490,25 +5148,21 @@ class SweetDreamsApp:
         )
         total_label.pack(side=tk.RIGHT)
         
-        # Update prices when quantity or service type changes
+        # Update prices when quantity, service type or points change; the price
+        # book has the cake's rules precompiled, so this is cheap per keystroke
         def update_prices(*args):
             try:
                 qty = int(qty_var.get())
-                base_price = cake[4] * qty
-                delivery_fee = 5 if service_var.get() == "delivery" else 0
-                total = base_price + delivery_fee
-                
-                if delivery_fee > 0:
-                    delivery_label.config(text=f"+ ${delivery_fee:.2f} delivery")
-                else:
-                    delivery_label.config(text="")
-                
-                total_label.config(text=f"Total: ${total:.2f}")
-            except:
-                pass
+            except ValueError:
+                return
+            points = points_balance if use_points_var.get() else 0
+            quote = self.db.price_book.quote([(cake[0], qty)], service_var.get(), points)
+            delivery_label.config(text=describe_quote(quote))
+            total_label.config(text=f"Total: ${quote.total:.2f}")
         
         qty_var.trace("w", update_prices)
         service_var.trace("w", update_prices)
+        use_points_var.trace("w", update_prices)
         update_prices()  # Initial call
         
         # Confirm Button
@@ -3520,10 +5174,11 @@ class SweetDreamsApp:
                 int(qty_var.get()),
                 message_entry.get(),
                 design_text.get("1.0", tk.END).strip(),
-                f"{date_var.get()} {time_var.get()}",
+                selected_slot(),
                 service_var.get(),
                 address_entry.get(),
-                modal
+                modal,
+                use_points_var.get()
             ),
             bg="#4ecdc4",
             fg="white",
@@ -3534,9 +5189,9 @@ class SweetDreamsApp:
         )
         confirm_btn.pack(pady=(20, 20))
     
-    def confirm_order(self, cake, quantity, message, design, delivery, service, address, modal):
-        if not delivery:
-            messagebox.showerror("Error", "Please fill in all required fields.")
+    def confirm_order(self, cake, quantity, message, design, slot, service, address, modal, use_points=False):
+        if slot is None:
+            messagebox.showerror("Error", "Please choose a pickup/delivery slot.")
             return
         
         if service == "delivery" and not address:
@@ -3544,9 +5199,9 @@ class SweetDreamsApp:
             return
         
         # Calculate total price
-        base_price = cake[4] * quantity
-        delivery_fee = 5 if service == "delivery" else 0
-        total = base_price + delivery_fee
+        points = self.db.get_loyalty_points(self.current_user_id) if use_points else 0
+        quote = self.db.price_book.quote([(cake[0], quantity)], service, points)
+        total = quote.total
         
         # Get user info
         cursor = self.db.conn.cursor()
@@ -3555,21 +5210,31 @@ class SweetDreamsApp:
         email = user_info[0] if user_info else None
         phone = user_info[1] if user_info else None
         
-        # Create order
-        order_id = self.db.create_order(
-            customer_id=self.current_user_id,
-            customer_name=self.current_user_name,
-            cake_id=cake[0],
-            quantity=quantity,
-            total_price=total,
-            status="pending",
-            special_instructions=f"{message}\n\nDesign: {design}",
-            delivery_type=service,
-            delivery_date=delivery,
-            address=address,
-            phone=phone,
-            email=email
-        )
+        # Create order (books the slot in the same transaction)
+        try:
+            order_id = self.db.create_order(
+                customer_id=self.current_user_id,
+                customer_name=self.current_user_name,
+                cake_id=cake[0],
+                quantity=quantity,
+                total_price=total,
+                status="pending",
+                special_instructions=f"{message}\n\nDesign: {design}",
+                delivery_type=service,
+                delivery_date=slot.start,
+                address=address,
+                phone=phone,
+                email=email,
+                slot_id=slot.id,
+                lines=quote_order_lines(quote),
+                points=quote.points_redeemed
+            )
+        except SlotUnavailableError as e:
+            messagebox.showerror("Slot Full", str(e))
+            return
+        except LoyaltyError as e:
+            messagebox.showerror("Loyalty Points", str(e))
+            return
         
         # Update cake stock
         self.db.update_cake_stock(cake[0], quantity)
@@ -3582,9 +5247,386 @@ class SweetDreamsApp:
         
         # Send confirmation email
         if email:
-            subject = f"Sweet Dreams Bakery - Order Confirmation #{order_id}"
-            body = f"Dear {self.current_user_name},\n\nThank you for your order!\n\nOrder Details:\n- Cake: {cake[1]}\n- Quantity: {quantity}\n- Total: ${total:.2f}\n- Delivery Type: {service}\n- Expected Date: {delivery}\n\nWe will notify you when your order status changes.\n\nThank you for choosing Sweet Dreams Bakery!"
-            self.email_service.send_email(email, subject, body)
+            self.notifier.send(
+                email, "order_confirmation", name=self.current_user_name, order_id=order_id,
+                items=f"- Cake: {cake[1]}\n- Quantity: {quantity}", total=total, service=service, expected=slot.start
+            )
+        
+        messagebox.showinfo("Success", f"Order placed successfully! Order #{order_id}\nTotal: ${total:.2f}")
+    
+    def add_to_cart(self, cake):
+        try:
+            self.cart.add(cake)
+        except CartFullError as e:
+            messagebox.showwarning("Cart Full", str(e))
+            return
+        self.render_cart()
+    
+    def update_cart_quantity(self, cake_id, quantity):
+        try:
+            self.cart.set_quantity(cake_id, quantity)
+        except CartFullError as e:
+            messagebox.showwarning("Cart Full", str(e))
+            return
+        self.render_cart()
+    
+    def clear_cart(self):
+        self.cart.clear()
+        self.render_cart()
+    
+    def render_cart(self):
+        # Clear existing widgets
+        for widget in self.cart_frame.winfo_children():
+            widget.destroy()
+        
+        if not self.cart:
+            tk.Label(
+                self.cart_frame,
+                text="Your cart is empty. Use \"Add to Cart\" to order several cakes at once.",
+                font=("Arial", 11),
+                bg="white"
+            ).pack(pady=10)
+            return
+        
+        quote = self.db.price_book.quote([(cake[0], quantity) for cake, quantity in self.cart.items()])
+        for (cake, quantity), line in zip(self.cart.items(), quote.lines):
+            line_frame = tk.Frame(self.cart_frame, bg="white")
+            line_frame.pack(fill=tk.X, pady=2)
+            
+            tk.Label(
+                line_frame,
+                text=f"{self.get_cake_emoji(cake[2])} {cake[1]}",  # flavor, name
+                font=("Arial", 11),
+                bg="white"
+            ).pack(side=tk.LEFT)
+            
+            tk.Button(
+                line_frame,
+                text="✕",
+                command=lambda c=cake: self.update_cart_quantity(c[0], 0),
+                bg="#ff6b6b",
+                fg="white",
+                font=("Arial", 9, "bold"),
+                relief=tk.FLAT
+            ).pack(side=tk.RIGHT, padx=(10, 0))
+            
+            tk.Label(
+                line_frame,
+                text=f"${line.total:.2f}",  # after promotions
+                font=("Arial", 11, "bold"),
+                bg="white"
+            ).pack(side=tk.RIGHT, padx=(10, 0))
+            
+            tk.Button(
+                line_frame,
+                text="+",
+                command=lambda c=cake, q=quantity: self.update_cart_quantity(c[0], q + 1),
+                relief=tk.FLAT,
+                width=2
+            ).pack(side=tk.RIGHT)
+            
+            tk.Label(
+                line_frame,
+                text=str(quantity),
+                font=("Arial", 11),
+                bg="white",
+                width=3
+            ).pack(side=tk.RIGHT)
+            
+            tk.Button(
+                line_frame,
+                text="-",
+                command=lambda c=cake, q=quantity: self.update_cart_quantity(c[0], q - 1),
+                relief=tk.FLAT,
+                width=2
+            ).pack(side=tk.RIGHT)
+        
+        footer = tk.Frame(self.cart_frame, bg="white")
+        footer.pack(fill=tk.X, pady=(10, 0))
+        
+        tk.Label(
+            footer,
+            text=f"Subtotal: ${quote.total:.2f} ({self.cart.total_quantity()} cakes)"
+                 + (f", you save ${quote.discount:.2f}" if quote.discount else ""),
+            font=("Arial", 12, "bold"),
+            fg="#ff6b6b",
+            bg="white"
+        ).pack(side=tk.LEFT)
+        
+        tk.Button(
+            footer,
+            text="Checkout",
+            command=self.show_checkout_modal,
+            bg="#667eea",
+            fg="white",
+            font=("Arial", 10, "bold"),
+            relief=tk.FLAT,
+            padx=10
+        ).pack(side=tk.RIGHT)
+        
+        tk.Button(
+            footer,
+            text="Clear",
+            command=self.clear_cart,
+            bg="#999",
+            fg="white",
+            font=("Arial", 10, "bold"),
+            relief=tk.FLAT,
+            padx=10
+        ).pack(side=tk.RIGHT, padx=(0, 10))
+    
+    def show_checkout_modal(self):
+        modal = tk.Toplevel(self.root)
+        modal.title("Checkout")
+        modal.geometry("500x600")
+        modal.configure(bg="white")
+        modal.resizable(False, False)
+        modal.transient(self.root)
+        modal.grab_set()
+        
+        # Center the modal
+        modal.update_idletasks()
+        x = self.root.winfo_x() + (self.root.winfo_width() - modal.winfo_width()) // 2
+        y = self.root.winfo_y() + (self.root.winfo_height() - modal.winfo_height()) // 2
+        modal.geometry(f"+{x}+{y}")
+        
+        tk.Label(
+            modal,
+            text=f"Checkout: {self.cart.total_quantity()} cakes",
+            font=("Arial", 16, "bold"),
+            bg="white"
+        ).pack(pady=(20, 10))
+        
+        tk.Label(
+            modal,
+            text="\n".join(f"{cake[1]} x{quantity}" for cake, quantity in self.cart.items()),
+            font=("Arial", 11),
+            bg="white",
+            justify=tk.LEFT
+        ).pack(anchor=tk.W, padx=20)
+        
+        # Special Message
+        tk.Label(
+            modal,
+            text="Special Message:",
+            font=("Arial", 12),
+            bg="white"
+        ).pack(anchor=tk.W, padx=20, pady=(10, 5))
+        
+        message_entry = tk.Entry(
+            modal,
+            font=("Arial", 12),
+            relief=tk.SOLID,
+            bd=1
+        )
+        message_entry.pack(fill=tk.X, padx=20, pady=(0, 10))
+        
+        # Pickup/Delivery Slot (must fit every cake in the cart)
+        tk.Label(
+            modal,
+            text="Pickup/Delivery Slot:",
+            font=("Arial", 12),
+            bg="white"
+        ).pack(anchor=tk.W, padx=20, pady=(5, 5))
+        
+        slot_var = tk.StringVar()
+        slot_choices = []
+        slot_combo = ttk.Combobox(
+            modal,
+            textvariable=slot_var,
+            state="readonly",
+            font=("Arial", 12)
+        )
+        slot_combo.pack(fill=tk.X, padx=20, pady=(0, 10))
+        
+        def refresh_slots():
+            selected = slot_choices[slot_combo.current()].id if slot_combo.current() >= 0 else None
+            slot_choices[:] = self.db.get_available_slots(self.cart.total_quantity())
+            slot_combo["values"] = [format_slot(slot) for slot in slot_choices]
+            
+            slot_ids = [slot.id for slot in slot_choices]
+            if selected in slot_ids:
+                slot_combo.current(slot_ids.index(selected))
+            elif slot_choices:
+                slot_combo.current(0)
+            else:
+                slot_var.set("No slots available")
+        
+        slot_combo.configure(postcommand=refresh_slots)
+        refresh_slots()
+        
+        # Service Type
+        tk.Label(
+            modal,
+            text="Service Type:",
+            font=("Arial", 12),
+            bg="white"
+        ).pack(anchor=tk.W, padx=20, pady=(5, 5))
+        
+        service_var = tk.StringVar(value="pickup")
+        ttk.Combobox(
+            modal,
+            textvariable=service_var,
+            values=["pickup", "delivery"],
+            state="readonly",
+            font=("Arial", 12)
+        ).pack(fill=tk.X, padx=20, pady=(0, 10))
+        
+        # Delivery Address (only show if delivery is selected)
+        address_frame = tk.Frame(modal, bg="white")
+        
+        tk.Label(
+            address_frame,
+            text="Delivery Address:",
+            font=("Arial", 12),
+            bg="white"
+        ).pack(anchor=tk.W)
+        
+        address_entry = tk.Entry(
+            address_frame,
+            font=("Arial", 12),
+            relief=tk.SOLID,
+            bd=1
+        )
+        address_entry.pack(fill=tk.X, pady=(5, 0))
+        
+        points_balance = self.db.get_loyalty_points(self.current_user_id)
+        use_points_var = tk.BooleanVar(value=False)
+        points_check = tk.Checkbutton(
+            modal,
+            text=f"Use my loyalty points ({points_balance} available)",
+            variable=use_points_var,
+            font=("Arial", 11),
+            bg="white"
+        )
+        
+        adjustments_label = tk.Label(
+            modal,
+            text="",
+            font=("Arial", 11),
+            bg="white",
+            fg="green"
+        )
+        
+        total_label = tk.Label(
+            modal,
+            text="",
+            font=("Arial", 12, "bold"),
+            bg="white",
+            fg="#ff6b6b"
+        )
+        
+        # One delivery fee for the whole cart
+        def update_service(*args):
+            if service_var.get() == "delivery":
+                address_frame.pack(fill=tk.X, padx=20, pady=(5, 5), before=adjustments_label)
+            else:
+                address_frame.pack_forget()
+            points = points_balance if use_points_var.get() else 0
+            quote = self.db.price_book.quote(
+                [(cake[0], quantity) for cake, quantity in self.cart.items()], service_var.get(), points
+            )
+            adjustments_label.config(text=describe_quote(quote))
+            total_label.config(text=f"Total: ${quote.total:.2f}")
+        
+        if points_balance >= MIN_REDEEM_POINTS:
+            points_check.pack(anchor=tk.W, padx=20)
+        adjustments_label.pack(anchor=tk.E, padx=20, pady=(10, 0))
+        total_label.pack(anchor=tk.E, padx=20)
+        service_var.trace("w", update_service)
+        use_points_var.trace("w", update_service)
+        update_service()
+        
+        def place_order():
+            index = slot_combo.current()
+            self.place_cart_order(
+                message_entry.get(),
+                slot_choices[index] if index >= 0 else None,
+                service_var.get(),
+                address_entry.get(),
+                modal,
+                use_points_var.get()
+            )
+        
+        tk.Button(
+            modal,
+            text="Place Order",
+            command=place_order,
+            bg="#4ecdc4",
+            fg="white",
+            font=("Arial", 12, "bold"),
+            relief=tk.FLAT,
+            padx=20,
+            pady=10
+        ).pack(pady=(20, 20))
+    
+    def place_cart_order(self, message, slot, service, address, modal, use_points=False):
+        if not self.cart:
+            modal.destroy()
+            return
+        
+        if slot is None:
+            messagebox.showerror("Error", "Please choose a pickup/delivery slot.")
+            return
+        
+        if service == "delivery" and not address:
+            messagebox.showerror("Error", "Please provide a delivery address.")
+            return
+        
+        items = self.cart.items()
+        points = self.db.get_loyalty_points(self.current_user_id) if use_points else 0
+        quote = self.db.price_book.quote([(cake[0], quantity) for cake, quantity in items], service, points)
+        total = quote.total
+        
+        # Get user info
+        cursor = self.db.conn.cursor()
+        cursor.execute("SELECT email, phone FROM users WHERE id = ?", (self.current_user_id,))
+        user_info = cursor.fetchone()
+        email = user_info[0] if user_info else None
+        phone = user_info[1] if user_info else None
+        
+        # One order, one transaction for the whole cart (lines, stock and slot)
+        try:
+            order_id = self.db.create_cart_order(
+                customer_id=self.current_user_id,
+                customer_name=self.current_user_name,
+                lines=quote_order_lines(quote),
+                total_price=total,
+                status="pending",
+                special_instructions=message,
+                delivery_type=service,
+                delivery_date=slot.start,
+                address=address,
+                phone=phone,
+                email=email,
+                slot_id=slot.id,
+                points=quote.points_redeemed
+            )
+        except SlotUnavailableError as e:
+            messagebox.showerror("Slot Full", str(e))
+            return
+        except LoyaltyError as e:
+            messagebox.showerror("Loyalty Points", str(e))
+            return
+        except OutOfStockError as e:
+            messagebox.showerror("Out of Stock", str(e))
+            return
+        
+        self.cart.clear()
+        modal.destroy()
+        
+        self.render_cart()
+        self.render_customer_orders()
+        self.render_customer_cakes()
+        self.render_order_history()
+        
+        # Send one confirmation email for the whole cart
+        if email:
+            self.notifier.send(
+                email, "order_confirmation", name=self.current_user_name, order_id=order_id,
+                items="\n".join(f"- {cake[1]} x{quantity}" for cake, quantity in items),
+                total=total, service=service, expected=slot.start
+            )
         
         messagebox.showinfo("Success", f"Order placed successfully! Order #{order_id}\nTotal: ${total:.2f}")
     
@@ -3640,16 +5682,18 @@ class SweetDreamsApp:
         
         # Add order details
         details_text.insert(tk.END, f"Customer: {order[2]}\n")
-        details_text.insert(tk.END, f"Cake: {self.get_cake_name(order[3])}\n")
+        details_text.insert(tk.END, "Items:\n")
+        for item in self.db.get_order_items([order[0]]).get(order[0], []):
+            details_text.insert(tk.END, f"- {item.cake_name} x{item.quantity} @ ${item.unit_price:.2f}\n")
         details_text.insert(tk.END, f"Quantity: {order[4]}\n")
         details_text.insert(tk.END, f"Total: ${order[5]:.2f}\n")
         details_text.insert(tk.END, f"Status: {order[6]}\n")
         details_text.insert(tk.END, f"Order Date: {order[7].split('T')[0] if order[7] else ''}\n")
-        details_text.insert(tk.END, f"Delivery Date: {order[9] if order[9] else 'N/A'}\n")
+        details_text.insert(tk.END, f"Delivery Date: {order[8] if order[8] else 'N/A'}\n")
         details_text.insert(tk.END, f"Delivery Type: {order[10]}\n")
         
-        if order[11]:  # special instructions
-            details_text.insert(tk.END, f"\nSpecial Instructions:\n{order[11]}\n")
+        if order[9]:  # special instructions
+            details_text.insert(tk.END, f"\nSpecial Instructions:\n{order[9]}\n")
         
         details_text.insert(tk.END, f"\nStatus History:\n")
         for record in history:
@@ -3677,22 +5721,23 @@ class SweetDreamsApp:
         if not selection:
             return
         
-        order_date = self.history_tree.item(selection[0], "values")[0]
-        cake_name = self.history_tree.item(selection[0], "values")[1]
-        
         # Get order details from database
         cursor = self.db.conn.cursor()
         cursor.execute(
-            "SELECT * FROM orders WHERE customer_id = ? AND order_date LIKE ? AND cake_id IN (SELECT id FROM cakes WHERE name = ?)",
-            (self.current_user_id, f"{order_date}%", cake_name)
+            "SELECT * FROM orders WHERE customer_id = ? AND id = ?",
+            (self.current_user_id, int(selection[0]))
         )
         order = cursor.fetchone()
         
-        if not order:
-            return
-        
-        # Get order history
-        history = self.db.get_order_history(order[0])
+        if order:
+            items = self.db.get_order_items([order[0]]).get(order[0], [])
+            history = self.db.get_order_history(order[0])
+        else:
+            # Not in the hot database; look in the archive
+            archived = self.db.get_archived_order_details(int(selection[0]))
+            if not archived or archived[0][1] != self.current_user_id:
+                return
+            order, items, history = archived
         
         # Create details modal
         modal = tk.Toplevel(self.root)
@@ -3728,16 +5773,18 @@ class SweetDreamsApp:
         
         # Add order details
         details_text.insert(tk.END, f"Customer: {order[2]}\n")
-        details_text.insert(tk.END, f"Cake: {self.get_cake_name(order[3])}\n")
+        details_text.insert(tk.END, "Items:\n")
+        for item in items:
+            details_text.insert(tk.END, f"- {item.cake_name} x{item.quantity} @ ${item.unit_price:.2f}\n")
         details_text.insert(tk.END, f"Quantity: {order[4]}\n")
         details_text.insert(tk.END, f"Total: ${order[5]:.2f}\n")
         details_text.insert(tk.END, f"Status: {order[6]}\n")
         details_text.insert(tk.END, f"Order Date: {order[7].split('T')[0] if order[7] else ''}\n")
-        details_text.insert(tk.END, f"Delivery Date: {order[9] if order[9] else 'N/A'}\n")
+        details_text.insert(tk.END, f"Delivery Date: {order[8] if order[8] else 'N/A'}\n")
         details_text.insert(tk.END, f"Delivery Type: {order[10]}\n")
         
-        if order[11]:  # special instructions
-            details_text.insert(tk.END, f"\nSpecial Instructions:\n{order[11]}\n")
+        if order[9]:  # special instructions
+            details_text.insert(tk.END, f"\nSpecial Instructions:\n{order[9]}\n")
         
         details_text.insert(tk.END, f"\nStatus History:\n")
         for record in history:
@@ -3763,6 +5810,51 @@ class SweetDreamsApp:
     def filter_cakes(self, event=None):
         self.render_admin_cakes()
     
+    def create_facet_filters(self, parent, search_entry, command, facets, defaults=None, fixed=None):
+        # One combobox per facet; the values and their counts come from the catalog
+        # when the list is opened, so they always match the cakes on file.
+        # Returns facet -> {"var", "value", "labels"}; fixed facets have no widget.
+        defaults = defaults or {}
+        filters = {facet: {"var": None, "value": value, "labels": {}} for facet, value in (fixed or {}).items()}
+        for facet in facets:
+            tk.Label(
+                parent,
+                text=f"{FACETS[facet]}:",
+                font=("Arial", 10),
+                bg="white"
+            ).pack(side=tk.LEFT, padx=(15, 5))
+            
+            value = defaults.get(facet)
+            var = tk.StringVar(value=value or ALL)
+            combo = ttk.Combobox(
+                parent,
+                textvariable=var,
+                state="readonly",
+                width=12,
+                font=("Arial", 10)
+            )
+            combo.configure(postcommand=lambda f=facet, c=combo: self.refresh_facet_values(filters, search_entry, f, c))
+            combo.pack(side=tk.LEFT)
+            combo.bind("<<ComboboxSelected>>", lambda e, f=facet: self.select_facet(filters, f, command))
+            filters[facet] = {"var": var, "value": value, "labels": {}}
+        return filters
+    
+    def facet_selection(self, filters):
+        return {facet: state["value"] for facet, state in filters.items()}
+    
+    def refresh_facet_values(self, filters, search_entry, facet, combo):
+        # Each value shows how many cakes picking it would leave
+        search_term = search_entry.get() or None
+        counts = self.db.catalog.counts(self.facet_selection(filters), search_term)[facet]
+        labels = {f"{value} ({count})": value for value, count in counts.items()}
+        filters[facet]["labels"] = labels
+        combo.configure(values=[ALL] + list(labels))
+    
+    def select_facet(self, filters, facet, command):
+        state = filters[facet]
+        state["value"] = state["labels"].get(state["var"].get())
+        command()
+    
     def filter_customer_cakes(self, event=None):
         self.render_customer_cakes()
     
@@ -3775,6 +5867,15 @@ class SweetDreamsApp:
         result = cursor.fetchone()
         return result[0] if result else "Unknown Cake"
     
+    def show_cake_image(self, label, cake):
+        # The emoji stays as a placeholder until the thumbnail is ready, or for good if there is no photo
+        def apply(photo):
+            if label.winfo_exists():
+                label.config(image=photo, text="")
+                label.image = photo
+        
+        self.image_cache.request(cake[6], apply)  # image_path
+    
     def get_cake_emoji(self, flavor):
         emoji_map = {
             "chocolate": "🍫",
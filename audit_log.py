@@ -0,0 +1,231 @@
+import datetime
+import itertools
+import json
+import os
+import queue
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from file_locks import lock_file
+
+AUDIT_DIR = "audit"
+SEGMENT_BYTES = 8 * 1024 * 1024   # a segment is sealed and a new one started past this size
+BATCH_SIZE = 512
+FLUSH_SECONDS = 0.25              # longest a record waits in memory before it is written
+
+_SEGMENT_FILE = re.compile(r"^audit-([a-z]+\d*)-(\d{6})\.jsonl$")
+_FLUSH = object()
+_CLOSE = object()
+
+# Segment index: "entity:id" -> byte offsets of that entity's records in the segment
+SegmentIndex = Dict[str, List[int]]
+
+
+def _key(entity: str, entity_id) -> str:
+    return f"{entity}:{entity_id}"
+
+
+def _scan_segment(path: str, index: Optional[SegmentIndex] = None, start: int = 0) -> Tuple[SegmentIndex, int]:
+    # Indexes complete lines from start on; returns the index and where scanning stopped
+    index = {} if index is None else index
+    offset = start
+    with open(path, "rb") as f:
+        f.seek(start)
+        for line in f:
+            if not line.endswith(b"\n"):
+                break   # still being written, or torn by a crash
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            index.setdefault(_key(record["entity"], record["id"]), []).append(offset)
+            offset += len(line)
+    return index, offset
+
+
+class AuditLog:
+    # Append-only JSONL, one file per segment and writing process (source), plus a
+    # sealed .idx sidecar per segment. Callers only enqueue; a background thread
+    # writes whole batches with one write() each.
+    def __init__(self, source: str, directory: str = AUDIT_DIR, segment_bytes: int = SEGMENT_BYTES,
+                 batch_size: int = BATCH_SIZE, flush_seconds: float = FLUSH_SECONDS):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        os.makedirs(directory, exist_ok=True)
+        
+        # A source's segments have one writer, holding audit-<source>.lock while
+        # open. Another process started with the same source (a second admin
+        # dashboard) writes as admin2, admin3, ... instead.
+        for number in itertools.count(1):
+            self.source = source if number == 1 else f"{source}{number}"
+            self.lock_file = open(os.path.join(directory, f"audit-{self.source}.lock"), "a+b")
+            if lock_file(self.lock_file, blocking=False):
+                break
+            self.lock_file.close()
+        
+        # Guards the indexes, which the writer extends while lookups read them
+        self.lock = threading.Lock()
+        self.indexes: Dict[str, SegmentIndex] = {}
+        
+        own = [name for name in self.segment_names() if _SEGMENT_FILE.match(name).group(1) == self.source]
+        self.segment_number = int(_SEGMENT_FILE.match(own[-1]).group(2)) if own else 1
+        self.segment_name = self._name(self.segment_number)
+        path = os.path.join(directory, self.segment_name)
+        self.indexes[self.segment_name] = {}
+        if os.path.exists(path):
+            # Drop a line torn by a crash so appends start on a clean line
+            self.indexes[self.segment_name], end = _scan_segment(path)
+            if os.path.getsize(path) > end:
+                os.truncate(path, end)
+        self.file = open(path, "ab")
+        # Segments other processes may still be appending to: name -> (index, bytes scanned)
+        self.foreign: Dict[str, Tuple[SegmentIndex, int]] = {}
+        
+        self.queue: "queue.Queue" = queue.Queue()
+        self.stats = {"records": 0, "batches": 0, "segments": len(own) or 1}
+        self.thread = threading.Thread(target=self._run, name="audit-log", daemon=True)
+        self.thread.start()
+    
+    def _name(self, number: int) -> str:
+        return f"audit-{self.source}-{number:06d}.jsonl"
+    
+    def segment_names(self) -> List[str]:
+        # Every source's segments, oldest first within a source
+        return sorted(name for name in os.listdir(self.directory) if _SEGMENT_FILE.match(name))
+    
+    def record(self, action: str, entity: str, entity_id, actor: Optional[str] = None, **data) -> None:
+        # The only cost on the write path: build a dict and enqueue it
+        self.queue.put({
+            "ts": datetime.datetime.now().isoformat(timespec="milliseconds"),
+            "actor": actor,
+            "action": action,
+            "entity": entity,
+            "id": entity_id,
+            "data": data,
+        })
+    
+    def flush(self) -> None:
+        # Returns once everything recorded so far is on disk
+        self.queue.put(_FLUSH)
+        self.queue.join()
+    
+    def close(self) -> None:
+        self.queue.put(_CLOSE)
+        self.thread.join(timeout=10)
+        self.lock_file.close()
+    
+    def _run(self) -> None:
+        while True:
+            batch = []
+            markers = 0
+            item = self.queue.get()
+            deadline = time.monotonic() + self.flush_seconds
+            while True:
+                if item is _FLUSH or item is _CLOSE:
+                    markers += 1
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self.queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    item = None
+                    break
+            
+            if batch:
+                try:
+                    self._write(batch)
+                except (OSError, TypeError, ValueError) as e:
+                    print(f"Error writing audit log: {e}")
+            for _ in range(len(batch) + markers):
+                self.queue.task_done()
+            if item is _CLOSE:
+                self._seal()
+                self.file.close()
+                return
+    
+    def _write(self, batch: List[dict]) -> None:
+        if self.file.tell() >= self.segment_bytes:
+            self._rotate()
+        
+        offset = self.file.tell()
+        lines = []
+        entries = []
+        for record in batch:
+            line = json.dumps(record, separators=(",", ":"), default=str).encode() + b"\n"
+            entries.append((_key(record["entity"], record["id"]), offset))
+            lines.append(line)
+            offset += len(line)
+        self.file.write(b"".join(lines))
+        self.file.flush()
+        
+        with self.lock:
+            index = self.indexes[self.segment_name]
+            for key, line_offset in entries:
+                index.setdefault(key, []).append(line_offset)
+        self.stats["records"] += len(batch)
+        self.stats["batches"] += 1
+    
+    def _seal(self) -> None:
+        # The sidecar lets later lookups skip scanning a closed segment
+        index_path = os.path.join(self.directory, self.segment_name[:-len(".jsonl")] + ".idx")
+        with self.lock:
+            data = json.dumps(self.indexes[self.segment_name], separators=(",", ":"))
+        with open(index_path + ".tmp", "w") as f:
+            f.write(data)
+        os.replace(index_path + ".tmp", index_path)
+    
+    def _rotate(self) -> None:
+        self._seal()
+        self.file.close()
+        self.segment_number += 1
+        self.segment_name = self._name(self.segment_number)
+        with self.lock:
+            self.indexes[self.segment_name] = {}
+        self.file = open(os.path.join(self.directory, self.segment_name), "ab")
+        self.stats["segments"] += 1
+    
+    def _segment_index(self, name: str) -> SegmentIndex:
+        with self.lock:
+            index = self.indexes.get(name)
+        if index is not None:
+            return index
+        
+        # A sealed segment loads its sidecar once; an open one (another process's
+        # active segment, or a segment without a current sidecar) is scanned
+        # incrementally from where the last lookup stopped
+        path = os.path.join(self.directory, name)
+        index_path = path[:-len(".jsonl")] + ".idx"
+        if os.path.exists(index_path) and os.path.getmtime(index_path) >= os.path.getmtime(path):
+            with open(index_path) as f:
+                index = json.load(f)
+            with self.lock:
+                self.indexes[name] = index
+            self.foreign.pop(name, None)
+            return index
+        
+        index, scanned = self.foreign.get(name, (None, 0))
+        index, scanned = _scan_segment(path, index, scanned)
+        self.foreign[name] = (index, scanned)
+        return index
+    
+    def history(self, entity: str, entity_id, limit: Optional[int] = None) -> List[dict]:
+        # Records for one entity across all segments and sources, oldest first
+        self.flush()
+        key = _key(entity, entity_id)
+        records = []
+        for name in self.segment_names():
+            offsets = self._segment_index(name).get(key)
+            if not offsets:
+                continue
+            with open(os.path.join(self.directory, name), "rb") as f:
+                for offset in offsets:
+                    f.seek(offset)
+                    records.append(json.loads(f.readline()))
+        records.sort(key=lambda record: record["ts"])
+        return records[-limit:] if limit else records
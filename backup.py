@@ -0,0 +1,419 @@
+import argparse
+import contextlib
+import datetime
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+import zlib
+from typing import Callable, Dict, List, Optional
+
+from file_locks import lock_file, unlock_file
+
+DB_PATH = "bakery.db"
+BACKUP_DIR = "backups"
+KEEP_SNAPSHOTS = 14
+BACKUP_TIME = datetime.time(2, 0)   # nightly snapshot from the admin app's scheduler
+
+PAGES_PER_STEP = 256      # pages copied per backup step; the source is unlocked between steps
+STEP_SLEEP = 0.005        # seconds handed to writers after each step
+MAX_RESTARTS = 5          # writes on another connection restart a paged backup; then copy in one step
+CHUNK_SIZE = 1024 * 1024   # snapshot dedup unit
+COMPRESS_LEVEL = 6
+LOCK_NAME = "backup.lock"
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def online_backup(db_path: str, dest_path: str, pages: int = PAGES_PER_STEP,
+                  step_sleep: float = STEP_SLEEP) -> Dict[str, float]:
+    # Consistent copy of a live database. Opens its own connections, so it can
+    # run on any thread while the app keeps writing through its own connection.
+    started = time.perf_counter()
+    stats = {"steps": 0, "restarts": 0, "pages": 0}
+    last_remaining = None
+    
+    def progress(status, remaining, total):
+        nonlocal last_remaining
+        stats["steps"] += 1
+        stats["pages"] = total
+        if last_remaining is not None and remaining > last_remaining:
+            stats["restarts"] += 1
+            if stats["restarts"] > MAX_RESTARTS:
+                raise _TooManyRestarts()
+        last_remaining = remaining
+        time.sleep(step_sleep)
+    
+    source = sqlite3.connect(db_path)
+    try:
+        dest = sqlite3.connect(dest_path)
+        try:
+            try:
+                source.backup(dest, pages=pages, progress=progress)
+            except _TooManyRestarts:
+                # Busy shop: take one short read lock instead of chasing writes
+                source.backup(dest, pages=-1)
+        finally:
+            dest.close()
+    finally:
+        source.close()
+    
+    stats["seconds"] = time.perf_counter() - started
+    return stats
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _chunk_path(backup_dir: str, chunk: str) -> str:
+    return os.path.join(backup_dir, "chunks", chunk[:2], chunk)
+
+
+def _manifest_path(backup_dir: str, snapshot_id: str) -> str:
+    return os.path.join(backup_dir, f"snapshot-{snapshot_id}.json")
+
+
+@contextlib.contextmanager
+def _backup_lock(backup_dir: str):
+    # Held across a snapshot and its prune, and while a snapshot is read back.
+    # Backups start from the scheduler, the Backup Now button and the command
+    # line; without it a prune could delete chunks another snapshot has written
+    # but not yet listed in its manifest.
+    os.makedirs(backup_dir, exist_ok=True)
+    with open(os.path.join(backup_dir, LOCK_NAME), "a+b") as f:
+        lock_file(f)
+        try:
+            yield
+        finally:
+            unlock_file(f)
+
+
+def create_snapshot(db_path: str = DB_PATH, backup_dir: str = BACKUP_DIR,
+                    keep: Optional[int] = KEEP_SNAPSHOTS) -> dict:
+    # Online backup, then store the copy as compressed content-addressed chunks.
+    # Chunks already stored by an earlier snapshot are reused, so each snapshot
+    # only writes what changed since the last one.
+    os.makedirs(os.path.join(backup_dir, "chunks"), exist_ok=True)
+    with _backup_lock(backup_dir):
+        manifest = _write_snapshot(db_path, backup_dir)
+        if keep:
+            _prune_snapshots(backup_dir, keep)
+    return manifest
+
+
+def _write_snapshot(db_path: str, backup_dir: str) -> dict:
+    snapshot_id = datetime.datetime.now().strftime("%Y%m%dT%H%M%S%f")
+    
+    fd, copy_path = tempfile.mkstemp(suffix=".db", dir=backup_dir)
+    os.close(fd)
+    try:
+        stats = online_backup(db_path, copy_path)
+        
+        chunks = []
+        new_bytes = 0
+        digest = hashlib.sha256()
+        with open(copy_path, "rb") as f:
+            for block in iter(lambda: f.read(CHUNK_SIZE), b""):
+                digest.update(block)
+                chunk = hashlib.sha256(block).hexdigest()
+                chunks.append(chunk)
+                path = _chunk_path(backup_dir, chunk)
+                if not os.path.exists(path):
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    data = zlib.compress(block, COMPRESS_LEVEL)
+                    with open(f"{path}.tmp", "wb") as out:
+                        out.write(data)
+                    os.replace(f"{path}.tmp", path)
+                    new_bytes += len(data)
+        
+        manifest = {
+            "id": snapshot_id,
+            "created_at": datetime.datetime.now().isoformat(),
+            "source": os.path.abspath(db_path),
+            "size": os.path.getsize(copy_path),
+            "sha256": digest.hexdigest(),
+            "chunk_size": CHUNK_SIZE,
+            "chunks": chunks,
+            "new_bytes": new_bytes,
+            "backup_seconds": round(stats["seconds"], 3),
+            "backup_restarts": stats["restarts"],
+        }
+        with open(_manifest_path(backup_dir, snapshot_id) + ".tmp", "w") as f:
+            json.dump(manifest, f)
+        os.replace(_manifest_path(backup_dir, snapshot_id) + ".tmp", _manifest_path(backup_dir, snapshot_id))
+    finally:
+        os.remove(copy_path)
+    return manifest
+
+
+def list_snapshots(backup_dir: str = BACKUP_DIR) -> List[dict]:
+    # Oldest first
+    if not os.path.isdir(backup_dir):
+        return []
+    snapshots = []
+    for name in sorted(os.listdir(backup_dir)):
+        if name.startswith("snapshot-") and name.endswith(".json"):
+            with open(os.path.join(backup_dir, name)) as f:
+                snapshots.append(json.load(f))
+    return snapshots
+
+
+def prune_snapshots(backup_dir: str = BACKUP_DIR, keep: int = KEEP_SNAPSHOTS) -> List[str]:
+    with _backup_lock(backup_dir):
+        return _prune_snapshots(backup_dir, keep)
+
+
+def _prune_snapshots(backup_dir: str, keep: int) -> List[str]:
+    # Drop all but the newest `keep` snapshots, then any chunk no snapshot uses.
+    # Callers hold the backup lock.
+    snapshots = list_snapshots(backup_dir)
+    removed = [snapshot["id"] for snapshot in snapshots[:max(len(snapshots) - keep, 0)]]
+    for snapshot_id in removed:
+        os.remove(_manifest_path(backup_dir, snapshot_id))
+    
+    live = set()
+    for snapshot in snapshots[len(removed):]:
+        live.update(snapshot["chunks"])
+    chunk_root = os.path.join(backup_dir, "chunks")
+    for folder, _, files in os.walk(chunk_root):
+        for name in files:
+            if name not in live:
+                os.remove(os.path.join(folder, name))
+    return removed
+
+
+def _assemble(snapshot: dict, backup_dir: str, dest_path: str) -> None:
+    with open(dest_path, "wb") as out:
+        for chunk in snapshot["chunks"]:
+            path = _chunk_path(backup_dir, chunk)
+            if not os.path.exists(path):
+                raise SnapshotError(f"Snapshot {snapshot['id']} is missing chunk {chunk}")
+            with open(path, "rb") as f:
+                try:
+                    out.write(zlib.decompress(f.read()))
+                except zlib.error as e:
+                    raise SnapshotError(f"Snapshot {snapshot['id']} has a corrupt chunk {chunk}: {e}")
+
+
+def _verify_file(snapshot: dict, path: str) -> None:
+    if os.path.getsize(path) != snapshot["size"] or _file_sha256(path) != snapshot["sha256"]:
+        raise SnapshotError(f"Snapshot {snapshot['id']} does not match its checksum")
+    conn = sqlite3.connect(path)
+    try:
+        result = conn.execute("PRAGMA integrity_check").fetchone()[0]
+    finally:
+        conn.close()
+    if result != "ok":
+        raise SnapshotError(f"Snapshot {snapshot['id']} failed integrity check: {result}")
+
+
+def find_snapshot(snapshot_id: Optional[str] = None, backup_dir: str = BACKUP_DIR) -> dict:
+    # The given snapshot, or the newest one
+    snapshots = list_snapshots(backup_dir)
+    if not snapshots:
+        raise SnapshotError("No snapshots found")
+    if snapshot_id is None:
+        return snapshots[-1]
+    for snapshot in snapshots:
+        if snapshot["id"] == snapshot_id:
+            return snapshot
+    raise SnapshotError(f"Unknown snapshot {snapshot_id}")
+
+
+def verify_snapshot(snapshot_id: Optional[str] = None, backup_dir: str = BACKUP_DIR) -> dict:
+    with _backup_lock(backup_dir):
+        snapshot = find_snapshot(snapshot_id, backup_dir)
+        fd, path = tempfile.mkstemp(suffix=".db", dir=backup_dir)
+        os.close(fd)
+        try:
+            _assemble(snapshot, backup_dir, path)
+            _verify_file(snapshot, path)
+        finally:
+            os.remove(path)
+    return snapshot
+
+
+def restore_snapshot(snapshot_id: Optional[str] = None, target_path: str = DB_PATH,
+                     backup_dir: str = BACKUP_DIR) -> dict:
+    # Run with the app closed. The snapshot is rebuilt and verified next to the
+    # target before it replaces it; the replaced file is kept as .before-restore.
+    target_dir = os.path.dirname(os.path.abspath(target_path))
+    fd, path = tempfile.mkstemp(suffix=".db", dir=target_dir)
+    os.close(fd)
+    try:
+        with _backup_lock(backup_dir):
+            snapshot = find_snapshot(snapshot_id, backup_dir)
+            _assemble(snapshot, backup_dir, path)
+        _verify_file(snapshot, path)
+        if os.path.exists(target_path):
+            shutil.copy2(target_path, f"{target_path}.before-restore")
+        os.replace(path, target_path)
+    except Exception:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    return snapshot
+
+
+class BackupWorker:
+    # Runs create_snapshot on a background thread; poll `running` from the UI
+    def __init__(self, db_path: str = DB_PATH, backup_dir: str = BACKUP_DIR, keep: int = KEEP_SNAPSHOTS):
+        self.db_path = db_path
+        self.backup_dir = backup_dir
+        self.keep = keep
+        self.thread: Optional[threading.Thread] = None
+        self.result: Optional[dict] = None
+        self.error: Optional[Exception] = None
+    
+    @property
+    def running(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+    
+    def start(self) -> bool:
+        if self.running:
+            return False
+        self.result = None
+        self.error = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return True
+    
+    def _run(self) -> None:
+        try:
+            self.result = create_snapshot(self.db_path, self.backup_dir, self.keep)
+        except Exception as e:
+            self.error = e
+
+
+def benchmark(orders: int = 200000, writes: int = 400, pages: int = PAGES_PER_STEP,
+              report: Callable[[str], None] = print) -> Dict[str, float]:
+    # Synthetic bakery.db-sized database in a temp dir: backup throughput, and
+    # single-order insert latency with and without a backup running alongside
+    workdir = tempfile.mkdtemp(prefix="bakery-bench-")
+    db_path = os.path.join(workdir, "bench.db")
+    try:
+        conn = sqlite3.connect(db_path)
+        conn.execute("""CREATE TABLE orders (id INTEGER PRIMARY KEY AUTOINCREMENT, customer_id INTEGER,
+                        customer_name TEXT, cake_id INTEGER, quantity INTEGER, total_price REAL,
+                        status TEXT, order_date TEXT, special_instructions TEXT)""")
+        conn.executemany(
+            "INSERT INTO orders (customer_id, customer_name, cake_id, quantity, total_price, status, order_date, special_instructions) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            ((i % 500, f"Customer {i % 500}", i % 20, 1 + i % 3, 35.0, "completed",
+              datetime.datetime(2025, 1, 1).isoformat(), "Happy birthday! " * 4) for i in range(orders))
+        )
+        conn.commit()
+        size_mb = os.path.getsize(db_path) / 1e6
+        
+        def place_order() -> float:
+            # One order insert + commit, as the app does it; returns milliseconds
+            start = time.perf_counter()
+            conn.execute(
+                "INSERT INTO orders (customer_id, customer_name, cake_id, quantity, total_price, status, order_date) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (1, "Bench", 1, 1, 35.0, "pending", datetime.datetime.now().isoformat())
+            )
+            conn.commit()
+            elapsed = (time.perf_counter() - start) * 1000
+            time.sleep(0.002)
+            return elapsed
+        
+        def summary(latencies):
+            latencies = sorted(latencies)
+            return (statistics.median(latencies), latencies[max(int(len(latencies) * 0.99) - 1, 0)], latencies[-1])
+        
+        idle = summary([place_order() for _ in range(writes)])
+        
+        results = {}
+        dest = os.path.join(workdir, "copy.db")
+        worker = threading.Thread(target=lambda: results.update(online_backup(db_path, dest, pages)))
+        worker.start()
+        during = []
+        while worker.is_alive():
+            during.append(place_order())
+        worker.join()
+        conn.close()
+        
+        single_start = time.perf_counter()
+        online_backup(db_path, os.path.join(workdir, "single.db"), pages=-1)
+        single_seconds = time.perf_counter() - single_start
+        
+        stats = {
+            "db_mb": size_mb,
+            "paged_seconds": results["seconds"],
+            "paged_mb_per_s": size_mb / results["seconds"],
+            "restarts": results["restarts"],
+            "single_step_mb_per_s": size_mb / single_seconds,
+            "idle_p50_ms": idle[0], "idle_p99_ms": idle[1], "idle_max_ms": idle[2],
+            "backup_writes": len(during),
+        }
+        if during:
+            busy = summary(during)
+            stats.update({"backup_p50_ms": busy[0], "backup_p99_ms": busy[1], "backup_max_ms": busy[2]})
+        
+        report(f"Database: {size_mb:.1f} MB, {orders} orders")
+        report(f"Paged backup ({pages} pages/step): {results['seconds']:.2f}s, "
+               f"{stats['paged_mb_per_s']:.1f} MB/s, {results['restarts']} restarts")
+        report(f"Single-step backup: {stats['single_step_mb_per_s']:.1f} MB/s")
+        report(f"Order insert latency idle:          p50 {idle[0]:.2f} ms  p99 {idle[1]:.2f} ms  max {idle[2]:.2f} ms")
+        if during:
+            report(f"Order insert latency during backup: p50 {stats['backup_p50_ms']:.2f} ms  "
+                   f"p99 {stats['backup_p99_ms']:.2f} ms  max {stats['backup_max_ms']:.2f} ms ({len(during)} writes)")
+        return stats
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweet Dreams Bakery database backups")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--dir", default=BACKUP_DIR)
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    backup_cmd = commands.add_parser("backup", help="take a snapshot of the live database")
+    backup_cmd.add_argument("--keep", type=int, default=KEEP_SNAPSHOTS)
+    commands.add_parser("list", help="list snapshots")
+    verify_cmd = commands.add_parser("verify", help="rebuild a snapshot and check it")
+    verify_cmd.add_argument("snapshot", nargs="?")
+    restore_cmd = commands.add_parser("restore", help="verify a snapshot and restore it over --db (app must be closed)")
+    restore_cmd.add_argument("snapshot", nargs="?")
+    bench_cmd = commands.add_parser("bench", help="measure backup throughput and order latency")
+    bench_cmd.add_argument("--orders", type=int, default=200000)
+    bench_cmd.add_argument("--pages", type=int, default=PAGES_PER_STEP)
+    args = parser.parse_args()
+    
+    try:
+        if args.command == "backup":
+            snapshot = create_snapshot(args.db, args.dir, args.keep)
+            print(f"Snapshot {snapshot['id']}: {snapshot['size']} bytes, {snapshot['new_bytes']} new compressed bytes")
+        elif args.command == "list":
+            for snapshot in list_snapshots(args.dir):
+                print(f"{snapshot['id']}  {snapshot['created_at']}  {snapshot['size']} bytes")
+        elif args.command == "verify":
+            snapshot = verify_snapshot(args.snapshot, args.dir)
+            print(f"Snapshot {snapshot['id']} OK")
+        elif args.command == "restore":
+            snapshot = restore_snapshot(args.snapshot, args.db, args.dir)
+            print(f"Restored snapshot {snapshot['id']} to {args.db}")
+        elif args.command == "bench":
+            benchmark(args.orders, pages=args.pages)
+    except SnapshotError as e:
+        raise SystemExit(f"Error: {e}")
+
+
+if __name__ == "__main__":
+    main()
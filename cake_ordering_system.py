@@ -6,13 +6,48 @@ import hashlib
 import json
 import os
 import re
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple, Callable
+from order_status import (ORDER_STATUSES, OPEN_STATUSES, InvalidTransitionError,
+                          next_statuses, transition_orders)
+from delivery_slots import (MAX_ORDER_QUANTITY, SlotUnavailableError, create_slot_tables, ensure_slots,
+                            format_slot, get_available_slots, record_slot_booking, reserve_slot)
+from order_items import (OrderItem, OrderLine, create_order_items_table, describe_items, get_order_items,
+                         insert_order_lines)
+from catalog import ALL, IN_STOCK, CatalogIndex
+from pricing import PriceBook, create_pricing_tables, describe_quote, quote_order_lines
+from audit_log import AuditLog
+from report_engine import create_report_tables
+from money import ZERO, Money, create_money_columns, to_cents
+from order_dates import create_order_date_columns, order_date_fields
+from order_columns import create_order_column_tables
+from lead_times import create_lead_time_index
+from incoming_queue import INCOMING_SHOWN, IncomingQueue
+from inventory_ledger import create_inventory_ledger_tables, record_movement
+from stock_alerts import create_stock_alert_tables, get_low_inventory
 
 class Database:
     def __init__(self):
         self.conn = sqlite3.connect('bakery.db')
+        
+        # Callbacks notified with the ids of orders created or changed
+        self.order_listeners: List[Callable[[List[int]], None]] = []
+        
         self.create_tables()
         self.insert_sample_data()
+        
+        # Cakes held in memory with facet bitmaps; refreshed after every write to cakes
+        self.catalog = CatalogIndex(self.conn)
+        
+        # Promotions compiled per cake for checkout quotes; recompiled when cakes change
+        self.price_book = PriceBook(self.conn, sync=self.catalog.sync)
+        self.catalog.add_listener(self.price_book.on_cakes_changed)
+        
+        # Every write is recorded here, tagged with the logged-in username
+        self.audit_log = AuditLog("ordering")
+        self.actor: Optional[str] = None
+    
+    def audit(self, action: str, entity: str, entity_id, **data) -> None:
+        self.audit_log.record(action, entity, entity_id, actor=self.actor, **data)
     
     def create_tables(self):
         cursor = self.conn.cursor()
@@ -93,6 +128,36 @@ class Database:
             )
         ''')
         
+        # Stock movements ledger; inventory.quantity is its running balance
+        create_inventory_ledger_tables(cursor)
+        
+        # Items below their minimum stock, kept by triggers on inventory and cakes
+        create_stock_alert_tables(cursor)
+        
+        # Delivery slot inventory and bookings
+        create_slot_tables(cursor)
+        
+        # Order line items (one row per cake in an order)
+        create_order_items_table(cursor)
+        
+        # Integer-cents copies of prices and totals
+        create_money_columns(cursor)
+        
+        # Indexed order_day / epoch columns beside the ISO timestamps
+        create_order_date_columns(cursor)
+        
+        # Status history by order, for the admin's lead-time analytics
+        create_lead_time_index(cursor)
+        
+        # Promotions and loyalty balances
+        create_pricing_tables(cursor)
+        
+        # Cached monthly report aggregates; the triggers drop them when orders here change
+        create_report_tables(cursor)
+        
+        # Orders changed here are queued for the admin's column files
+        create_order_column_tables(cursor)
+        
         self.conn.commit()
     
     def insert_sample_data(self):
@@ -160,20 +225,7 @@ class Database:
         return cursor.fetchone()
     
     def get_cakes(self, category: Optional[str] = None, search_term: Optional[str] = None) -> List[tuple]:
-        cursor = self.conn.cursor()
-        query = "SELECT * FROM cakes WHERE stock > 0"
-        params = []
-        
-        if category and category != "all":
-            query += " AND category = ?"
-            params.append(category)
-        
-        if search_term:
-            query += " AND (name LIKE ? OR flavor LIKE ? OR description LIKE ?)"
-            params.extend([f"%{search_term}%", f"%{search_term}%", f"%{search_term}%"])
-        
-        cursor.execute(query, params)
-        return cursor.fetchall()
+        return self.catalog.filter({"category": category, "availability": IN_STOCK}, search_term)
     
     def get_cake_by_id(self, cake_id: int) -> Optional[tuple]:
         cursor = self.conn.cursor()
@@ -184,33 +236,66 @@ class Database:
         cursor = self.conn.cursor()
         cursor.execute("UPDATE cakes SET stock = stock - ? WHERE id = ?", (quantity, cake_id))
         self.conn.commit()
+        self.catalog.refresh([cake_id])
+        self.audit("cake.stock", "cake", cake_id, delta=-quantity)
     
     def create_order(self, customer_id: Optional[int], customer_name: str, cake_id: int, 
                     quantity: int, total_price: float, status: str, special_instructions: str,
-                    delivery_type: str, delivery_date: str, address: str, phone: str, email: str) -> int:
+                    delivery_type: str, delivery_date: str, address: str, phone: str, email: str,
+                    slot_id: Optional[int] = None, lines: Optional[List[OrderLine]] = None) -> int:
+        # lines are the priced lines from quote_order_lines; without them, the list price
         cursor = self.conn.cursor()
-        order_date = datetime.datetime.now().isoformat()
+        order_date, order_day, order_ts = order_date_fields()
         
-        cursor.execute(
-            """INSERT INTO orders 
-            (customer_id, customer_name, cake_id, quantity, total_price, status, order_date, 
-            special_instructions, delivery_type, delivery_date, address, phone, email) 
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-            (customer_id, customer_name, cake_id, quantity, total_price, status, order_date,
-             special_instructions, delivery_type, delivery_date, address, phone, email)
-        )
-        
-        order_id = cursor.lastrowid
-        
-        # Add initial status to history
-        cursor.execute(
-            "INSERT INTO order_status_history (order_id, status, changed_at) VALUES (?, ?, ?)",
-            (order_id, status, order_date)
-        )
+        try:
+            # The slot is taken in the same transaction as the order; raises SlotUnavailableError when full
+            if slot_id is not None:
+                delivery_date = reserve_slot(cursor, slot_id, quantity)
+            
+            cursor.execute(
+                """INSERT INTO orders 
+                (customer_id, customer_name, cake_id, quantity, total_price, total_cents, status, order_date, 
+                order_day, order_ts, special_instructions, delivery_type, delivery_date, address, phone, email) 
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (customer_id, customer_name, cake_id, quantity, total_price, to_cents(total_price), status,
+                 order_date, order_day, order_ts, special_instructions, delivery_type, delivery_date, address,
+                 phone, email)
+            )
+            
+            order_id = cursor.lastrowid
+            
+            # Single-cake order; reports and the kitchen plan read line items
+            if lines is None:
+                cake = self.get_cake_by_id(cake_id)
+                lines = [OrderLine(cake_id, quantity, cake[4] if cake else total_price / quantity)]
+            insert_order_lines(cursor, order_id, lines)
+            
+            if slot_id is not None:
+                record_slot_booking(cursor, order_id, slot_id, quantity)
+            
+            # Add initial status to history
+            cursor.execute(
+                "INSERT INTO order_status_history (order_id, status, changed_at) VALUES (?, ?, ?)",
+                (order_id, status, order_date)
+            )
+            
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
         
-        self.conn.commit()
+        self.audit("order.create", "order", order_id, customer_id=customer_id, total_price=total_price,
+                   status=status, lines=[(cake_id, quantity, unit_price)], slot_id=slot_id)
+        self.notify_order_listeners([order_id])
         return order_id
     
+    def add_order_listener(self, callback: Callable[[List[int]], None]) -> None:
+        self.order_listeners.append(callback)
+    
+    def notify_order_listeners(self, order_ids: List[int]) -> None:
+        for callback in self.order_listeners:
+            callback(order_ids)
+    
     def get_orders(self, user_id: Optional[int] = None, user_role: Optional[str] = None, 
                   status: Optional[str] = None) -> List[tuple]:
         cursor = self.conn.cursor()
@@ -231,32 +316,52 @@ class Database:
         cursor.execute(query, params)
         return cursor.fetchall()
     
-    def update_order_status(self, order_id: int, new_status: str, notes: Optional[str] = None) -> None:
+    def get_order_items(self, order_ids: List[int]) -> Dict[int, List[OrderItem]]:
+        return get_order_items(self.conn, order_ids)
+    
+    def get_orders_between(self, start_day: str, end_day: str) -> List[tuple]:
+        # Inclusive YYYY-MM-DD days, read through the order_day index
         cursor = self.conn.cursor()
-        changed_at = datetime.datetime.now().isoformat()
-        
-        cursor.execute("UPDATE orders SET status = ? WHERE id = ?", (new_status, order_id))
-        
         cursor.execute(
-            "INSERT INTO order_status_history (order_id, status, changed_at, notes) VALUES (?, ?, ?, ?)",
-            (order_id, new_status, changed_at, notes)
+            "SELECT * FROM orders WHERE order_day BETWEEN ? AND ? ORDER BY order_date DESC",
+            (start_day, end_day)
         )
-        
-        self.conn.commit()
+        return cursor.fetchall()
+    
+    def update_order_status(self, order_id: int, new_status: str, notes: Optional[str] = None) -> None:
+        # Raises InvalidTransitionError if the order cannot move to new_status
+        moved, _ = transition_orders(self.conn, [order_id], new_status, notes)
+        self.audit_status_changes(moved, new_status, notes)
+        self.notify_order_listeners([order_id])
+    
+    def bulk_update_order_status(self, order_ids: List[int], new_status: str,
+                                 notes: Optional[str] = None) -> Tuple[List[tuple], List[tuple]]:
+        # One transaction for the whole batch; invalid orders are skipped and returned
+        moved, rejected = transition_orders(self.conn, order_ids, new_status, notes, skip_invalid=True)
+        self.audit_status_changes(moved, new_status, notes)
+        if moved:
+            self.notify_order_listeners([order_id for order_id, _ in moved])
+        return moved, rejected
+    
+    def audit_status_changes(self, moved: List[tuple], new_status: str, notes: Optional[str]) -> None:
+        for order_id, previous in moved:
+            self.audit("order.status", "order", order_id, previous=previous, status=new_status, notes=notes)
+    
+    def get_available_slots(self, quantity: int = 1) -> List[tuple]:
+        ensure_slots(self.conn)
+        return get_available_slots(self.conn, quantity)
     
     def get_inventory(self) -> List[tuple]:
         cursor = self.conn.cursor()
         cursor.execute("SELECT * FROM inventory ORDER BY category, item_name")
         return cursor.fetchall()
     
-    def update_inventory(self, item_id: int, quantity: float) -> None:
-        cursor = self.conn.cursor()
-        last_updated = datetime.datetime.now().isoformat()
-        cursor.execute(
-            "UPDATE inventory SET quantity = ?, last_updated = ? WHERE id = ?",
-            (quantity, last_updated, item_id)
-        )
-        self.conn.commit()
+    def record_inventory_movement(self, item_id: int, kind: str, amount: float,
+                                  note: Optional[str] = None) -> float:
+        # Appends a delta to the stock ledger (see inventory_ledger); returns the new quantity
+        quantity = record_movement(self.conn, item_id, kind, amount, actor=self.actor, note=note)
+        self.audit("inventory.move", "inventory", item_id, kind=kind, amount=amount, quantity=quantity, note=note)
+        return quantity
     
     def add_inventory_item(self, item_name: str, category: str, quantity: float, 
                           unit: str, min_stock_level: float) -> None:
@@ -267,25 +372,33 @@ class Database:
             (item_name, category, quantity, unit, min_stock_level, last_updated)
         )
         self.conn.commit()
+        self.audit("inventory.create", "inventory", cursor.lastrowid, item_name=item_name, category=category,
+                   quantity=quantity, unit=unit, min_stock_level=min_stock_level)
     
     def get_low_stock_items(self) -> List[tuple]:
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT * FROM inventory WHERE quantity <= min_stock_level")
-        return cursor.fetchall()
+        # Read from the trigger-kept alerts rather than by scanning inventory
+        return get_low_inventory(self.conn)
     
     def add_cake(self, name: str, flavor: str, size: str, price: float, stock: int, 
                 description: str, category: str) -> None:
         cursor = self.conn.cursor()
         cursor.execute(
-            "INSERT INTO cakes (name, flavor, size, price, stock, description, category) VALUES (?, ?, ?, ?, ?, ?, ?)",
-            (name, flavor, size, price, stock, description, category)
+            "INSERT INTO cakes (name, flavor, size, price, price_cents, stock, description, category) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (name, flavor, size, price, to_cents(price), stock, description, category)
         )
         self.conn.commit()
+        self.catalog.refresh([cursor.lastrowid])
+        self.audit("cake.create", "cake", cursor.lastrowid, name=name, flavor=flavor, size=size, price=price,
+                   stock=stock, category=category)
     
     def delete_cake(self, cake_id: int) -> None:
+        cake = self.get_cake_by_id(cake_id)
         cursor = self.conn.cursor()
         cursor.execute("DELETE FROM cakes WHERE id = ?", (cake_id,))
         self.conn.commit()
+        self.catalog.refresh([cake_id])
+        self.audit("cake.delete", "cake", cake_id, before=cake)
     
     def add_user(self, username: str, password: str, role: str, name: str, email: str, phone: str = "") -> None:
         cursor = self.conn.cursor()
@@ -295,6 +408,7 @@ class Database:
             (username, hashed_password, role, name, email, phone)
         )
         self.conn.commit()
+        self.audit("user.create", "user", cursor.lastrowid, username=username, role=role, name=name, email=email)
     
     def get_users_by_role(self, role: str) -> List[tuple]:
         cursor = self.conn.cursor()
@@ -310,6 +424,12 @@ class SweetDreamsApp:
         
         # Initialize database
         self.db = Database()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        
+        # Pending orders by when work on them has to start
+        self.incoming_queue = IncomingQueue(self.db)
+        self.incoming_queue.load()
+        self.db.add_order_listener(self.incoming_queue.on_orders_changed)
         
         # Current user state
         self.current_user = None
@@ -317,6 +437,10 @@ class SweetDreamsApp:
         self.current_role = None
         self.current_user_name = None
         
+        # Admin dashboard section to show when the dashboard is (re)built
+        self.admin_section = 0
+        self.admin_sections: Dict[str, tuple] = {}
+        
         # Style configuration
         self.style = ttk.Style()
         self.style.theme_use('clam')
@@ -427,6 +551,11 @@ class SweetDreamsApp:
         # Bind Enter key to login
         self.root.bind('<Return>', lambda event: self.login())
     
+    def on_close(self):
+        # Audit records still in the writer's batch reach the file before exit
+        self.db.audit_log.close()
+        self.root.destroy()
+    
     def login(self):
         username = self.username_entry.get()
         password = self.password_entry.get()
@@ -443,6 +572,7 @@ class SweetDreamsApp:
             self.current_user_id = user_data[0]
             self.current_user_name = user_data[1]
             self.current_role = user_type
+            self.db.actor = username
             
             # Show user info
             self.user_label.config(text=f"Welcome, {self.current_user_name} ({user_type})")
@@ -463,6 +593,7 @@ class SweetDreamsApp:
         self.current_user_id = None
         self.current_user_name = None
         self.current_role = None
+        self.db.actor = None
         
         # Hide user info
         self.user_info_frame.pack_forget()
@@ -524,34 +655,35 @@ class SweetDreamsApp:
         
         self.update_admin_stats(stats_frame)
         
-        # Create notebook for admin sections
+        # Create notebook for admin sections; each is built and loaded the first
+        # time it is selected, then kept until the dashboard is rebuilt
         admin_notebook = ttk.Notebook(scrollable_frame)
         admin_notebook.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
-        
-        # Cake Management Tab
-        cake_frame = ttk.Frame(admin_notebook)
-        admin_notebook.add(cake_frame, text="🍰 Cakes")
-        self.create_cake_management(cake_frame)
-        
-        # Order Management Tab
-        order_frame = ttk.Frame(admin_notebook)
-        admin_notebook.add(order_frame, text="📋 Orders")
-        self.create_order_management(order_frame)
-        
-        # Staff Management Tab
-        staff_frame = ttk.Frame(admin_notebook)
-        admin_notebook.add(staff_frame, text="👥 Staff")
-        self.create_staff_management(staff_frame)
-        
-        # Inventory Tab
-        inventory_frame = ttk.Frame(admin_notebook)
-        admin_notebook.add(inventory_frame, text="📦 Inventory")
-        self.create_inventory_management(inventory_frame)
-        
-        # Reports Tab
-        reports_frame = ttk.Frame(admin_notebook)
-        admin_notebook.add(reports_frame, text="📈 Reports")
-        self.create_reports_section(reports_frame)
+        self.admin_sections = {}
+        
+        self.add_lazy_tab(admin_notebook, "🍰 Cakes", self.create_cake_management)
+        self.add_lazy_tab(admin_notebook, "📋 Orders", self.create_order_management)
+        self.add_lazy_tab(admin_notebook, "👥 Staff", self.create_staff_management)
+        self.add_lazy_tab(admin_notebook, "📦 Inventory", self.create_inventory_management)
+        self.add_lazy_tab(admin_notebook, "📈 Reports", self.create_reports_section)
+        
+        # A rebuild after adding staff or stock returns to the section that was open
+        admin_notebook.bind("<<NotebookTabChanged>>", lambda e: self.on_admin_section_changed(admin_notebook))
+        admin_notebook.select(self.admin_section)
+        self.on_admin_section_changed(admin_notebook)
+    
+    def add_lazy_tab(self, notebook: ttk.Notebook, text: str, builder) -> ttk.Frame:
+        frame = ttk.Frame(notebook)
+        notebook.add(frame, text=text)
+        self.admin_sections[str(frame)] = (frame, builder)
+        return frame
+    
+    def on_admin_section_changed(self, notebook: ttk.Notebook) -> None:
+        self.admin_section = notebook.index(notebook.select())
+        section = self.admin_sections.pop(notebook.select(), None)
+        if section:
+            frame, builder = section
+            builder(frame)
     
     def create_staff_dashboard(self):
         # Clear existing widgets
@@ -645,10 +777,9 @@ class SweetDreamsApp:
         
         # Get today's orders
         today = datetime.datetime.now().strftime("%Y-%m-%d")
-        all_orders = self.db.get_orders()
-        today_orders = [order for order in all_orders if order[7].startswith(today)]
+        today_orders = self.db.get_orders_between(today, today)
         
-        today_revenue = sum(order[5] for order in today_orders)
+        today_revenue = sum((Money.from_dollars(order[5]) for order in today_orders), ZERO)
         total_cakes = len(self.db.get_cakes())
         low_stock = len(self.db.get_low_stock_items())
         
@@ -673,7 +804,7 @@ Low Stock Items: {low_stock}"""
         ttk.Label(search_frame, text="Category:").pack(side=tk.LEFT)
         self.cake_category_var = tk.StringVar(value="all")
         category_combo = ttk.Combobox(search_frame, textvariable=self.cake_category_var,
-                                     values=["all", "birthday", "wedding", "anniversary", "celebration", "regular"],
+                                     postcommand=lambda: self.refresh_category_values(category_combo),
                                      state="readonly", width=15)
         category_combo.pack(side=tk.LEFT, padx=5)
         category_combo.bind('<<ComboboxSelected>>', self.refresh_cake_list)
@@ -689,6 +820,10 @@ Low Stock Items: {low_stock}"""
         
         self.refresh_cake_list()
     
+    def refresh_category_values(self, combo: ttk.Combobox) -> None:
+        # Categories come from the cakes on file, so new ones show up without code changes
+        combo.configure(values=[ALL] + self.db.catalog.values("category"))
+    
     def refresh_cake_list(self, event=None):
         # Clear existing cake widgets
         for widget in self.cake_list_frame.winfo_children():
@@ -791,14 +926,12 @@ Low Stock Items: {low_stock}"""
         orders = self.db.get_orders(status=status)
         
         # Add orders to tree
+        order_items = self.db.get_order_items([order[0] for order in orders])
         for order in orders:
-            cake = self.db.get_cake_by_id(order[3])
-            cake_name = cake[1] if cake else "Unknown"
-            
             self.order_tree.insert("", "end", values=(
                 f"#{order[0]}",
                 order[2],
-                cake_name,
+                describe_items(order_items.get(order[0], [])),
                 order[4],
                 order[6].capitalize(),
                 f"${order[5]:.2f}",
@@ -892,21 +1025,22 @@ Low Stock Items: {low_stock}"""
         self.report_text.configure(yscrollcommand=report_scroll.set)
     
     def create_incoming_orders(self, parent):
-        # Get pending orders
-        orders = self.db.get_orders(status="pending")
+        # Pending orders that have to be started soonest come first
+        upcoming = self.incoming_queue.upcoming(INCOMING_SHOWN)
         
-        if not orders:
+        if not upcoming:
             ttk.Label(parent, text="No pending orders at the moment.", font=('Arial', 12)).pack(pady=10)
             return
         
-        for order in orders:
+        order_items = self.db.get_order_items([order[0] for _, _, order in upcoming])
+        for start_by, due, order in upcoming:
             order_frame = ttk.LabelFrame(parent, text=f"Order #{order[0]}", padding="10")
             order_frame.pack(fill=tk.X, pady=5)
             
-            cake = self.db.get_cake_by_id(order[3])
-            cake_name = cake[1] if cake else "Unknown"
-            
-            info_text = f"Customer: {order[2]}\nCake: {cake_name}\nQuantity: {order[4]}\nTotal: ${order[5]:.2f}"
+            cakes = describe_items(order_items.get(order[0], []))
+            info_text = f"Customer: {order[2]}\nCakes: {cakes}\nQuantity: {order[4]}\nTotal: ${order[5]:.2f}"
+            if due:
+                info_text += f"\nDue: {due.strftime('%Y-%m-%d %H:%M')} - start by {start_by.strftime('%Y-%m-%d %H:%M')}"
             ttk.Label(order_frame, text=info_text, font=('Arial', 10)).pack(anchor=tk.W)
             
             btn_frame = ttk.Frame(order_frame)
@@ -918,24 +1052,57 @@ Low Stock Items: {low_stock}"""
             ttk.Button(btn_frame, text="Decline", 
                       command=lambda o=order: self.decline_order(o), 
                       style='Danger.TButton').pack(side=tk.LEFT, padx=2)
+        
+        hidden = len(self.incoming_queue) - len(upcoming)
+        if hidden > 0:
+            ttk.Label(parent, text=f"+ {hidden} more pending orders due later",
+                      style='Info.TLabel').pack(pady=5)
     
     def create_staff_order_management(self, parent):
         # Get active orders
         orders = self.db.get_orders()
-        active_orders = [order for order in orders if order[6] not in ["completed", "cancelled"]]
+        active_orders = [order for order in orders if order[6] in OPEN_STATUSES]
+        
+        # Selection state for bulk actions, keyed by order id
+        self.order_selection = {}
         
         if not active_orders:
             ttk.Label(parent, text="No active orders at the moment.", font=('Arial', 12)).pack(pady=10)
             return
         
+        # Bulk actions
+        bulk_frame = ttk.Frame(parent)
+        bulk_frame.pack(fill=tk.X, pady=(0, 10))
+        
+        select_all_var = tk.BooleanVar(value=False)
+        
+        def toggle_select_all():
+            for var, _ in self.order_selection.values():
+                var.set(select_all_var.get())
+        
+        ttk.Checkbutton(bulk_frame, text="Select All", variable=select_all_var,
+                       command=toggle_select_all).pack(side=tk.LEFT)
+        
+        bulk_status_var = tk.StringVar(value="preparing")
+        ttk.Combobox(bulk_frame, textvariable=bulk_status_var, values=ORDER_STATUSES[1:],
+                    state="readonly", width=15).pack(side=tk.LEFT, padx=(10, 0))
+        
+        ttk.Button(bulk_frame, text="Apply to Selected",
+                  command=lambda: self.apply_bulk_status(bulk_status_var.get())).pack(side=tk.LEFT, padx=(10, 0))
+        ttk.Button(bulk_frame, text="Complete All Ready", command=self.close_out_ready_orders,
+                  style='Success.TButton').pack(side=tk.RIGHT)
+        
+        order_items = self.db.get_order_items([order[0] for order in active_orders])
         for order in active_orders:
             order_frame = ttk.LabelFrame(parent, text=f"Order #{order[0]} - {order[2]}", padding="10")
             order_frame.pack(fill=tk.X, pady=5)
             
-            cake = self.db.get_cake_by_id(order[3])
-            cake_name = cake[1] if cake else "Unknown"
+            selected_var = tk.BooleanVar(value=False)
+            self.order_selection[order[0]] = (selected_var, order)
+            ttk.Checkbutton(order_frame, text="Select", variable=selected_var).pack(anchor=tk.W)
             
-            info_text = f"Cake: {cake_name}\nQuantity: {order[4]}\nCurrent Status: {order[6].capitalize()}"
+            cakes = describe_items(order_items.get(order[0], []))
+            info_text = f"Cakes: {cakes}\nQuantity: {order[4]}\nCurrent Status: {order[6].capitalize()}"
             ttk.Label(order_frame, text=info_text, font=('Arial', 10)).pack(anchor=tk.W)
             
             status_frame = ttk.Frame(order_frame)
@@ -945,7 +1112,7 @@ Low Stock Items: {low_stock}"""
             
             status_var = tk.StringVar(value=order[6])
             status_combo = ttk.Combobox(status_frame, textvariable=status_var,
-                                       values=["pending", "preparing", "ready", "completed", "cancelled"],
+                                       values=[order[6], *next_statuses(order[6])],
                                        state="readonly", width=15)
             status_combo.pack(side=tk.LEFT, padx=5)
             status_combo.bind('<<ComboboxSelected>>', 
@@ -980,7 +1147,7 @@ Low Stock Items: {low_stock}"""
         ttk.Label(search_frame, text="Category:").pack(side=tk.LEFT)
         self.customer_category_var = tk.StringVar(value="all")
         category_combo = ttk.Combobox(search_frame, textvariable=self.customer_category_var,
-                                     values=["all", "birthday", "wedding", "anniversary", "celebration", "regular"],
+                                     postcommand=lambda: self.refresh_category_values(category_combo),
                                      state="readonly", width=15)
         category_combo.pack(side=tk.LEFT, padx=5)
         category_combo.bind('<<ComboboxSelected>>', self.refresh_customer_cakes)
@@ -1076,10 +1243,8 @@ Low Stock Items: {low_stock}"""
         order_frame = ttk.LabelFrame(parent, text=f"Order #{order[0]}", padding="10")
         order_frame.pack(fill=tk.X, pady=5)
         
-        cake = self.db.get_cake_by_id(order[3])
-        cake_name = cake[1] if cake else "Unknown"
-        
-        info_text = f"Cake: {cake_name}\nQuantity: {order[4]}\nTotal: ${order[5]:.2f}\nStatus: {order[6].capitalize()}\nDate: {order[7].split('T')[0]}"
+        cakes = describe_items(self.db.get_order_items([order[0]]).get(order[0], []))
+        info_text = f"Cakes: {cakes}\nQuantity: {order[4]}\nTotal: ${order[5]:.2f}\nStatus: {order[6].capitalize()}\nDate: {order[7].split('T')[0]}"
         ttk.Label(order_frame, text=info_text, font=('Arial', 10)).pack(anchor=tk.W)
         
         if order[6] == "pending":
@@ -1186,22 +1351,22 @@ Low Stock Items: {low_stock}"""
         
         # Flavor
         ttk.Label(main_frame, text="Flavor:", font=('Arial', 12)).pack(anchor=tk.W, pady=(5, 2))
-        entries['flavor'] = ttk.Combobox(main_frame, values=["chocolate", "vanilla", "strawberry", "red-velvet", "carrot", "lemon"],
-                                        state="readonly", font=('Arial', 12), width=38)
+        entries['flavor'] = ttk.Combobox(main_frame, values=self.db.catalog.values("flavor"),
+                                        font=('Arial', 12), width=38)
         entries['flavor'].set("chocolate")
         entries['flavor'].pack(fill=tk.X, pady=(0, 10))
         
         # Size
         ttk.Label(main_frame, text="Size:", font=('Arial', 12)).pack(anchor=tk.W, pady=(5, 2))
-        entries['size'] = ttk.Combobox(main_frame, values=["small", "medium", "large", "extra-large"],
-                                      state="readonly", font=('Arial', 12), width=38)
+        entries['size'] = ttk.Combobox(main_frame, values=self.db.catalog.values("size"),
+                                      font=('Arial', 12), width=38)
         entries['size'].set("medium")
         entries['size'].pack(fill=tk.X, pady=(0, 10))
         
         # Category
         ttk.Label(main_frame, text="Category:", font=('Arial', 12)).pack(anchor=tk.W, pady=(5, 2))
-        entries['category'] = ttk.Combobox(main_frame, values=["birthday", "wedding", "anniversary", "celebration", "regular"],
-                                          state="readonly", font=('Arial', 12), width=38)
+        entries['category'] = ttk.Combobox(main_frame, values=self.db.catalog.values("category"),
+                                          font=('Arial', 12), width=38)
         entries['category'].set("regular")
         entries['category'].pack(fill=tk.X, pady=(0, 10))
         
@@ -1223,9 +1388,9 @@ Low Stock Items: {low_stock}"""
         def add_cake():
             try:
                 name = entries['name'].get()
-                flavor = entries['flavor'].get()
-                size = entries['size'].get()
-                category = entries['category'].get()
+                flavor = entries['flavor'].get().strip().lower()
+                size = entries['size'].get().strip().lower()
+                category = entries['category'].get().strip().lower()
                 price = float(entries['price'].get())
                 stock = int(entries['stock'].get())
                 description = entries['description'].get("1.0", tk.END).strip()
@@ -1432,7 +1597,7 @@ Low Stock Items: {low_stock}"""
         
         # Quantity
         ttk.Label(main_frame, text="Quantity:", font=('Arial', 12)).pack(anchor=tk.W, pady=(5, 2))
-        entries['quantity'] = ttk.Combobox(main_frame, values=["1", "2", "3", "4", "5"], 
+        entries['quantity'] = ttk.Combobox(main_frame, values=[str(n) for n in range(1, MAX_ORDER_QUANTITY + 1)],
                                           state="readonly", font=('Arial', 12), width=38)
         entries['quantity'].set("1")
         entries['quantity'].pack(fill=tk.X, pady=(0, 10))
@@ -1494,9 +1659,9 @@ Low Stock Items: {low_stock}"""
                     messagebox.showerror("Error", "Selected cake not found.")
                     return
                 
-                total_price = cake[4] * quantity
-                if service == "delivery":
-                    total_price += 5  # Delivery fee
+                # Promotions and the delivery fee; walk-ins have no loyalty account
+                quote = self.db.price_book.quote([(cake[0], quantity)], service)
+                total_price = quote.total
                 
                 order_id = self.db.create_order(
                     customer_id=None,
@@ -1510,7 +1675,8 @@ Low Stock Items: {low_stock}"""
                     delivery_date=datetime.datetime.now().isoformat(),
                     address=address,
                     phone=phone,
-                    email=email
+                    email=email,
+                    lines=quote_order_lines(quote)
                 )
                 
                 self.db.update_cake_stock(cake[0], quantity)
@@ -1569,18 +1735,29 @@ Low Stock Items: {low_stock}"""
         entries['design'] = tk.Text(main_frame, font=('Arial', 12), height=4, width=40)
         entries['design'].pack(fill=tk.X, pady=(0, 10))
         
-        # Delivery Date
-        ttk.Label(main_frame, text="Pickup/Delivery Date:", font=('Arial', 12)).pack(anchor=tk.W, pady=(5, 2))
-        date_frame = ttk.Frame(main_frame)
-        date_frame.pack(fill=tk.X, pady=(0, 10))
-        
-        entries['date'] = ttk.Entry(date_frame, font=('Arial', 12), width=15)
-        entries['date'].pack(side=tk.LEFT)
-        entries['date'].insert(0, datetime.datetime.now().strftime("%Y-%m-%d"))
+        # Delivery Slot
+        ttk.Label(main_frame, text="Pickup/Delivery Slot:", font=('Arial', 12)).pack(anchor=tk.W, pady=(5, 2))
+        entries['slot'] = ttk.Combobox(main_frame, state="readonly", font=('Arial', 12), width=38)
+        entries['slot'].pack(fill=tk.X, pady=(0, 10))
+        slot_choices = []
+        
+        # Only slots with room for the chosen quantity are offered; re-read on every open
+        def refresh_slots(*args):
+            index = entries['slot'].current()
+            selected = slot_choices[index].id if index >= 0 else None
+            slot_choices[:] = self.db.get_available_slots(int(entries['quantity'].get()))
+            entries['slot']['values'] = [format_slot(slot) for slot in slot_choices]
+            
+            slot_ids = [slot.id for slot in slot_choices]
+            if selected in slot_ids:
+                entries['slot'].current(slot_ids.index(selected))
+            elif slot_choices:
+                entries['slot'].current(0)
+            else:
+                entries['slot'].set("No slots available")
         
-        entries['time'] = ttk.Entry(date_frame, font=('Arial', 12), width=10)
-        entries['time'].pack(side=tk.LEFT, padx=(10, 0))
-        entries['time'].insert(0, "12:00")
+        entries['slot'].configure(postcommand=refresh_slots)
+        refresh_slots()
         
         # Service Type
         ttk.Label(main_frame, text="Service Type:", font=('Arial', 12)).pack(anchor=tk.W, pady=(5, 2))
@@ -1620,22 +1797,19 @@ Low Stock Items: {low_stock}"""
         def update_prices(*args):
             try:
                 qty = int(entries['quantity'].get())
-                base_price = cake[4] * qty
-                delivery_fee = 5 if entries['service'].get() == "delivery" else 0
-                total = base_price + delivery_fee
-                
-                base_price_label.config(text=f"Base Price: ${base_price:.2f}")
-                
-                if delivery_fee > 0:
-                    delivery_label.config(text=f"+ ${delivery_fee:.2f} delivery")
-                else:
-                    delivery_label.config(text="")
-                
-                total_label.config(text=f"Total: ${total:.2f}")
-            except:
-                pass
+            except ValueError:
+                return
+            quote = self.db.price_book.quote([(cake[0], qty)], entries['service'].get())
+            
+            base_price_label.config(text=f"Base Price: ${quote.subtotal:.2f}")
+            delivery_label.config(text=describe_quote(quote))
+            total_label.config(text=f"Total: ${quote.total:.2f}")
         
-        entries['quantity'].bind('<<ComboboxSelected>>', update_prices)
+        def on_quantity_change(*args):
+            update_prices()
+            refresh_slots()
+        
+        entries['quantity'].bind('<<ComboboxSelected>>', on_quantity_change)
         entries['service'].bind('<<ComboboxSelected>>', update_prices)
         
         def confirm_order():
@@ -1643,22 +1817,21 @@ Low Stock Items: {low_stock}"""
                 quantity = int(entries['quantity'].get())
                 message = entries['message'].get()
                 design = entries['design'].get("1.0", tk.END).strip()
-                date = entries['date'].get()
-                time = entries['time'].get()
+                slot_index = entries['slot'].current()
                 service = entries['service'].get()
                 address = entries['address'].get("1.0", tk.END).strip()
                 
-                if not date:
-                    messagebox.showerror("Error", "Please enter a delivery date.")
+                if slot_index < 0:
+                    messagebox.showerror("Error", "Please choose a pickup/delivery slot.")
                     return
+                slot = slot_choices[slot_index]
                 
                 if service == "delivery" and not address:
                     messagebox.showerror("Error", "Please provide a delivery address.")
                     return
                 
-                base_price = cake[4] * quantity
-                delivery_fee = 5 if service == "delivery" else 0
-                total = base_price + delivery_fee
+                quote = self.db.price_book.quote([(cake[0], quantity)], service)
+                total = quote.total
                 
                 # Get user info
                 cursor = self.db.conn.cursor()
@@ -1676,10 +1849,12 @@ Low Stock Items: {low_stock}"""
                     status="pending",
                     special_instructions=f"{message}\n\nDesign: {design}",
                     delivery_type=service,
-                    delivery_date=f"{date} {time}",
+                    delivery_date=slot.start,
                     address=address,
                     phone=phone,
-                    email=email
+                    email=email,
+                    slot_id=slot.id,
+                    lines=quote_order_lines(quote)
                 )
                 
                 self.db.update_cake_stock(cake[0], quantity)
@@ -1690,6 +1865,9 @@ Low Stock Items: {low_stock}"""
                 # Refresh customer dashboard
                 self.create_customer_dashboard()
                 
+            except SlotUnavailableError as e:
+                messagebox.showerror("Slot Full", str(e))
+                refresh_slots()
             except ValueError:
                 messagebox.showerror("Error", "Please enter valid values.")
             except Exception as e:
@@ -1734,11 +1912,10 @@ Low Stock Items: {low_stock}"""
         ttk.Label(main_frame, text=f"Order Details #{order_id}", style='Header.TLabel').pack(pady=(0, 20))
         
         # Order details
-        cake = self.db.get_cake_by_id(order[3])
-        cake_name = cake[1] if cake else "Unknown Cake"
+        cakes = describe_items(self.db.get_order_items([order_id]).get(order_id, []))
         
         details_text = f"""Customer: {order[2]}
-Cake: {cake_name}
+Cakes: {cakes}
 Quantity: {order[4]}
 Total: ${order[5]:.2f}
 Status: {order[6].capitalize()}
@@ -1784,24 +1961,72 @@ Delivery Type: {order[10].capitalize()}"""
                 messagebox.showerror("Error", f"Failed to delete cake: {str(e)}")
     
     def accept_order(self, order):
-        self.db.update_order_status(order[0], "preparing", "Order accepted by staff")
+        try:
+            self.db.update_order_status(order[0], "preparing", "Order accepted by staff")
+        except InvalidTransitionError as e:
+            messagebox.showerror("Error", str(e))
+            self.create_staff_dashboard()
+            return
         messagebox.showinfo("Success", f"Order #{order[0]} has been accepted and moved to preparation.")
         self.create_staff_dashboard()
     
     def decline_order(self, order):
         if messagebox.askyesno("Confirm", "Are you sure you want to decline this order?"):
-            self.db.update_order_status(order[0], "cancelled", "Order declined by staff")
+            try:
+                self.db.update_order_status(order[0], "cancelled", "Order declined by staff")
+            except InvalidTransitionError as e:
+                messagebox.showerror("Error", str(e))
+                self.create_staff_dashboard()
+                return
             messagebox.showinfo("Success", f"Order #{order[0]} has been declined and cancelled.")
             self.create_staff_dashboard()
     
     def update_order_status_staff(self, order, new_status):
-        self.db.update_order_status(order[0], new_status, f"Status changed by {self.current_role}")
+        if new_status == order[6]:  # status unchanged
+            return
+        try:
+            self.db.update_order_status(order[0], new_status, f"Status changed by {self.current_role}")
+        except InvalidTransitionError as e:
+            messagebox.showerror("Error", str(e))
+            self.create_staff_dashboard()
+            return
         messagebox.showinfo("Success", f"Order #{order[0]} status updated to: {new_status}")
         self.create_staff_dashboard()
     
+    def apply_bulk_status(self, new_status):
+        selected = [order for var, order in self.order_selection.values() if var.get()]
+        if not selected:
+            messagebox.showerror("Error", "Please select at least one order.")
+            return
+        self.bulk_update_order_status(selected, new_status)
+    
+    def close_out_ready_orders(self):
+        ready_orders = self.db.get_orders(status="ready")
+        if not ready_orders:
+            messagebox.showinfo("Info", "No orders are ready for completion.")
+            return
+        if messagebox.askyesno("Confirm", f"Mark {len(ready_orders)} ready orders as completed?"):
+            self.bulk_update_order_status(ready_orders, "completed")
+    
+    def bulk_update_order_status(self, orders, new_status):
+        # Single transaction for the whole batch, then a single re-render
+        moved, rejected = self.db.bulk_update_order_status(
+            [order[0] for order in orders], new_status, f"Bulk status change by {self.current_role}"
+        )
+        summary = f"{len(moved)} orders updated to: {new_status}"
+        if rejected:
+            summary += f"\n{len(rejected)} orders skipped (invalid status change)"
+        messagebox.showinfo("Success", summary)
+        self.create_staff_dashboard()
+    
     def cancel_customer_order(self, order):
         if messagebox.askyesno("Confirm", "Are you sure you want to cancel this order?"):
-            self.db.update_order_status(order[0], "cancelled", "Cancelled by customer")
+            try:
+                self.db.update_order_status(order[0], "cancelled", "Cancelled by customer")
+            except InvalidTransitionError as e:
+                messagebox.showerror("Error", str(e))
+                self.create_customer_dashboard()
+                return
             messagebox.showinfo("Success", f"Order #{order[0]} has been cancelled.")
             self.create_customer_dashboard()
     
@@ -1824,13 +2049,11 @@ Delivery Type: {order[10].capitalize()}"""
         end_date_str = end_date.strftime("%Y-%m-%d")
         
         # Get orders in date range
-        all_orders = self.db.get_orders()
-        period_orders = [order for order in all_orders 
-                        if start_date_str <= order[7].split('T')[0] <= end_date_str]
+        period_orders = self.db.get_orders_between(start_date_str, end_date_str)
         
         total_orders = len(period_orders)
-        total_revenue = sum(order[5] for order in period_orders)
-        avg_order_value = total_revenue / total_orders if total_orders > 0 else 0
+        total_revenue = sum((Money.from_dollars(order[5]) for order in period_orders), ZERO)
+        avg_order_value = total_revenue / total_orders if total_orders > 0 else ZERO
         
         # Status breakdown
         status_counts = {}
@@ -1851,12 +2074,10 @@ Delivery Type: {order[10].capitalize()}"""
         
         # Popular items
         cake_counts = {}
-        for order in period_orders:
-            cake_id = order[3]
-            cake = self.db.get_cake_by_id(cake_id)
-            if cake:
-                cake_name = cake[1]
-                cake_counts[cake_name] = cake_counts.get(cake_name, 0) + order[4]
+        order_items = self.db.get_order_items([order[0] for order in period_orders])
+        for items in order_items.values():
+            for item in items:
+                cake_counts[item.cake_name] = cake_counts.get(item.cake_name, 0) + item.quantity
         
         if cake_counts:
             report_text += f"\nMost Popular Items:\n"
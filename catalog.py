@@ -0,0 +1,178 @@
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+# facet -> label shown next to its filter
+FACETS = OrderedDict([
+    ("category", "Category"),
+    ("flavor", "Flavor"),
+    ("size", "Size"),
+    ("price_band", "Price"),
+    ("availability", "Stock"),
+])
+
+# (label, low inclusive, high exclusive); the last band is open-ended
+PRICE_BANDS = [
+    ("Under $30", 0, 30),
+    ("$30 - $60", 30, 60),
+    ("$60 - $100", 60, 100),
+    ("$100 and up", 100, None),
+]
+
+IN_STOCK = "in stock"
+OUT_OF_STOCK = "out of stock"
+ALL = "all"
+
+# Selection: facet -> chosen value; None, "" or "all" leaves the facet unfiltered
+Selection = Dict[str, Optional[str]]
+
+
+def price_band(price: float) -> str:
+    for label, low, high in PRICE_BANDS:
+        if price >= low and (high is None or price < high):
+            return label
+    return PRICE_BANDS[0][0]
+
+
+def cake_facets(cake: tuple) -> Dict[str, str]:
+    # cakes row: id, name, flavor, size, price, stock, image_path, description, category
+    return {
+        "category": cake[8] or "regular",
+        "flavor": cake[2],
+        "size": cake[3],
+        "price_band": price_band(cake[4]),
+        "availability": IN_STOCK if cake[5] > 0 else OUT_OF_STOCK,
+    }
+
+
+def _bit_ids(bits: int) -> Iterator[int]:
+    # Set bits in ascending order, i.e. cake ids by id
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+class CatalogIndex:
+    def __init__(self, conn):
+        self.conn = conn
+        self.cakes: Dict[int, tuple] = {}
+        # Lower-cased name, flavor and description for the search box
+        self.text: Dict[int, str] = {}
+        # facet -> value -> bitmap with bit n set for cake id n
+        self.bitmaps: Dict[str, Dict[str, int]] = {facet: {} for facet in FACETS}
+        self.all_bits = 0
+        
+        # Callbacks notified with the ids of cakes added, changed or removed
+        self.listeners: List[Callable[[List[int]], None]] = []
+        self.version = 0
+        self.seen_version = self._data_version()
+        self.load()
+    
+    def load(self) -> None:
+        self.cakes.clear()
+        self.text.clear()
+        self.bitmaps = {facet: {} for facet in FACETS}
+        self.all_bits = 0
+        for cake in self.conn.execute("SELECT * FROM cakes ORDER BY id").fetchall():
+            self._add(cake)
+    
+    def _data_version(self) -> int:
+        return self.conn.execute("PRAGMA data_version").fetchone()[0]
+    
+    def sync(self) -> None:
+        # Writes from the other app never call refresh(); they show up through
+        # PRAGMA data_version, and then the cakes rows that differ are refreshed
+        version = self._data_version()
+        if version == self.seen_version:
+            return
+        self.seen_version = version
+        rows = {cake[0]: cake for cake in self.conn.execute("SELECT * FROM cakes").fetchall()}
+        changed = [cake_id for cake_id in rows.keys() | self.cakes.keys()
+                   if rows.get(cake_id) != self.cakes.get(cake_id)]
+        if changed:
+            self.refresh(changed)
+    
+    def add_listener(self, callback: Callable[[List[int]], None]) -> None:
+        self.listeners.append(callback)
+    
+    def refresh(self, cake_ids: Optional[Iterable[int]] = None) -> None:
+        # Call after committing a write to cakes: re-reads those rows (all of them
+        # when None) instead of reloading the whole catalog
+        if cake_ids is None:
+            self.load()
+            changed = list(self.cakes)
+        else:
+            changed = sorted(set(cake_ids))
+            for cake_id in changed:
+                self._remove(cake_id)
+            if changed:
+                placeholders = ",".join("?" * len(changed))
+                for cake in self.conn.execute(f"SELECT * FROM cakes WHERE id IN ({placeholders})", changed):
+                    self._add(cake)
+        
+        self.version += 1
+        for callback in self.listeners:
+            callback(changed)
+    
+    def _add(self, cake: tuple) -> None:
+        bit = 1 << cake[0]
+        self.cakes[cake[0]] = cake
+        self.text[cake[0]] = " ".join(str(cake[i] or "") for i in (1, 2, 7)).lower()
+        for facet, value in cake_facets(cake).items():
+            values = self.bitmaps[facet]
+            values[value] = values.get(value, 0) | bit
+        self.all_bits |= bit
+    
+    def _remove(self, cake_id: int) -> None:
+        cake = self.cakes.pop(cake_id, None)
+        if cake is None:
+            return
+        del self.text[cake_id]
+        mask = ~(1 << cake_id)
+        for facet, value in cake_facets(cake).items():
+            remaining = self.bitmaps[facet][value] & mask
+            if remaining:
+                self.bitmaps[facet][value] = remaining
+            else:
+                del self.bitmaps[facet][value]
+        self.all_bits &= mask
+    
+    def values(self, facet: str) -> List[str]:
+        # Values present in the data; price bands keep their natural order
+        if facet == "price_band":
+            return [label for label, _, _ in PRICE_BANDS if label in self.bitmaps[facet]]
+        return sorted(self.bitmaps[facet])
+    
+    def _search_bits(self, search_term: Optional[str]) -> int:
+        if not search_term:
+            return self.all_bits
+        term = search_term.lower()
+        bits = 0
+        for cake_id, text in self.text.items():
+            if term in text:
+                bits |= 1 << cake_id
+        return bits
+    
+    def _match(self, selection: Selection, bits: int, skip: Optional[str] = None) -> int:
+        for facet, value in selection.items():
+            if facet != skip and value not in (None, "", ALL):
+                bits &= self.bitmaps[facet].get(value, 0)
+        return bits
+    
+    def filter(self, selection: Selection, search_term: Optional[str] = None) -> List[tuple]:
+        # Matching cake rows ordered by id, like SELECT * FROM cakes
+        self.sync()
+        bits = self._match(selection, self._search_bits(search_term))
+        return [self.cakes[cake_id] for cake_id in _bit_ids(bits)]
+    
+    def counts(self, selection: Selection, search_term: Optional[str] = None) -> Dict[str, Dict[str, int]]:
+        # facet -> value -> cakes that would match if that value were picked,
+        # given the search and the other facets' choices
+        self.sync()
+        base = self._search_bits(search_term)
+        counts = {}
+        for facet in FACETS:
+            others = self._match(selection, base, skip=facet)
+            counts[facet] = {value: (others & self.bitmaps[facet][value]).bit_count()
+                             for value in self.values(facet)}
+        return counts
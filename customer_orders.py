@@ -0,0 +1,104 @@
+from collections import namedtuple
+from typing import Dict, Iterable, List, Optional
+
+from money import ZERO, Money
+from order_items import OrderItem
+
+CLOSED_STATUSES = ("completed", "cancelled")
+
+CustomerTotals = namedtuple("CustomerTotals", "orders active spent")
+
+
+class CustomerOrders:
+    # The logged-in customer's orders and line items, loaded with one query at
+    # login and kept current from order changes instead of re-querying per view.
+    # Writes from other connections show up through PRAGMA data_version, which
+    # only moves when another connection commits.
+    def __init__(self, db):
+        self.db = db
+        self.customer_id: Optional[int] = None
+        self.orders: Dict[int, tuple] = {}
+        self.items: Dict[int, List[OrderItem]] = {}
+        self.sorted: Optional[List[tuple]] = None
+        self.seen_version: Optional[int] = None
+    
+    def _select(self, where: str, params: Iterable) -> Dict[int, tuple]:
+        # Orders with their line items in one pass; cake names come from the catalog
+        cursor = self.db.conn.cursor()
+        cursor.execute(
+            f"""SELECT o.*, i.cake_id, i.quantity, i.unit_price
+            FROM orders o
+            LEFT JOIN order_items i ON i.order_id = o.id
+            WHERE {where}
+            ORDER BY o.id, i.id""",
+            list(params)
+        )
+        cakes = self.db.catalog.cakes
+        orders = {}
+        for row in cursor.fetchall():
+            order, (cake_id, quantity, unit_price) = row[:-3], row[-3:]
+            if order[0] not in orders:
+                orders[order[0]] = order
+                self.items[order[0]] = []
+            if cake_id is not None:
+                cake = cakes.get(cake_id)
+                self.items[order[0]].append(
+                    OrderItem(order[0], cake_id, cake[1] if cake else "Unknown Cake", quantity, unit_price)
+                )
+        return orders
+    
+    def _external_version(self) -> int:
+        return self.db.conn.execute("PRAGMA data_version").fetchone()[0]
+    
+    def load(self, customer_id: int) -> None:
+        self.customer_id = customer_id
+        self.items = {}
+        self.seen_version = self._external_version()
+        self.orders = self._select("o.customer_id = ?", [customer_id])
+        self.sorted = None
+    
+    def clear(self) -> None:
+        self.customer_id = None
+        self.orders = {}
+        self.items = {}
+        self.sorted = None
+    
+    def on_orders_changed(self, order_ids: Iterable[int]) -> None:
+        # Order listener: re-reads just the changed orders that belong to this customer
+        if self.customer_id is None:
+            return
+        order_ids = list(order_ids)
+        for order_id in order_ids:
+            self.orders.pop(order_id, None)
+            self.items.pop(order_id, None)
+        for start in range(0, len(order_ids), 500):
+            chunk = order_ids[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            self.orders.update(self._select(f"o.id IN ({placeholders}) AND o.customer_id = ?",
+                                            chunk + [self.customer_id]))
+        self.sorted = None
+    
+    def _current(self) -> List[tuple]:
+        if self.customer_id is not None and self._external_version() != self.seen_version:
+            self.load(self.customer_id)
+        if self.sorted is None:
+            # Newest first, like get_orders
+            self.sorted = sorted(self.orders.values(), key=lambda order: order[7] or "", reverse=True)
+        return self.sorted
+    
+    def history(self) -> List[tuple]:
+        return list(self._current())
+    
+    def active(self) -> List[tuple]:
+        return [order for order in self._current() if order[6] not in CLOSED_STATUSES]
+    
+    def order_items(self, order_id: int) -> List[OrderItem]:
+        return self.items.get(order_id, [])
+    
+    def totals(self) -> CustomerTotals:
+        orders = self._current()
+        return CustomerTotals(
+            len(orders),
+            sum(1 for order in orders if order[6] not in CLOSED_STATUSES),
+            sum((Money.from_dollars(order[5]) for order in orders if order[6] != "cancelled"), ZERO)
+        )
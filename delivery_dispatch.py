@@ -0,0 +1,178 @@
+import datetime
+import math
+from collections import namedtuple
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from production_planner import parse_delivery_date
+
+# Bakery location used as the start and end of every route
+DEPOT = (40.7128, -74.0060)
+
+AVERAGE_SPEED_KMH = 30.0
+STOP_MINUTES = 5             # hand-over time at each address
+MAX_STOPS_PER_ROUTE = 12
+WAVE_MINUTES = 120           # deliveries due in the same window leave together
+LATENESS_PENALTY_KM = 50.0   # route cost added per minute late
+
+DeliveryStop = namedtuple("DeliveryStop", "order_id customer address location due")
+RouteStop = namedtuple("RouteStop", "stop eta late leg_km")
+Route = namedtuple("Route", "wave_start depart stops distance_km late_stops")
+
+
+def normalize_address(address: Optional[str]) -> str:
+    # Lookup key: case-insensitive, punctuation and whitespace collapsed
+    cleaned = "".join(ch.lower() if ch.isalnum() else " " for ch in (address or ""))
+    return " ".join(cleaned.split())
+
+
+def parse_coordinates(text: str) -> Optional[Tuple[float, float]]:
+    # "lat, lon" as typed by staff
+    parts = text.replace(";", ",").split(",")
+    if len(parts) != 2:
+        return None
+    try:
+        lat, lon = float(parts[0]), float(parts[1])
+    except ValueError:
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    return lat, lon
+
+
+def haversine_km(a: Tuple[float, float], b: Tuple[float, float]) -> float:
+    lat1, lon1 = map(math.radians, a)
+    lat2, lon2 = map(math.radians, b)
+    h = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 6371.0 * 2 * math.asin(math.sqrt(h))
+
+
+class DeliveryDispatcher:
+    def __init__(self, db, depot: Tuple[float, float] = DEPOT, speed_kmh: float = AVERAGE_SPEED_KMH,
+                 max_stops: int = MAX_STOPS_PER_ROUTE, wave_minutes: int = WAVE_MINUTES):
+        self.db = db
+        self.depot = depot
+        self.speed_kmh = speed_kmh
+        self.max_stops = max_stops
+        self.wave_minutes = wave_minutes
+    
+    def load_stops(self, day: datetime.date) -> Tuple[List[DeliveryStop], List[tuple]]:
+        # Returns (located stops, orders whose address has no coordinates yet)
+        orders = self.db.get_delivery_orders(day)
+        locations = self.db.get_delivery_locations([normalize_address(order[3]) for order in orders])
+        
+        stops = []
+        unlocated = []
+        for order_id, customer, delivery_date, address in orders:
+            location = locations.get(normalize_address(address))
+            due = parse_delivery_date(delivery_date)
+            if location is None or due is None:
+                unlocated.append((order_id, customer, delivery_date, address))
+            else:
+                stops.append(DeliveryStop(order_id, customer, address, location, due))
+        return stops, unlocated
+    
+    def plan_routes(self, stops: Sequence[DeliveryStop]) -> List[Route]:
+        routes = []
+        for wave_start, wave_stops in self._waves(stops):
+            for cluster in self._sweep_clusters(wave_stops):
+                routes.append(self._build_route(wave_start, cluster))
+        return routes
+    
+    def _waves(self, stops: Sequence[DeliveryStop]) -> List[Tuple[datetime.datetime, List[DeliveryStop]]]:
+        # Bucket stops by delivery window so a route never mixes morning and evening drops
+        waves: Dict[datetime.datetime, List[DeliveryStop]] = {}
+        for stop in stops:
+            midnight = datetime.datetime.combine(stop.due.date(), datetime.time())
+            minutes = int((stop.due - midnight).total_seconds() // 60)
+            window = midnight + datetime.timedelta(minutes=minutes - minutes % self.wave_minutes)
+            waves.setdefault(window, []).append(stop)
+        return sorted(waves.items())
+    
+    def _sweep_clusters(self, stops: List[DeliveryStop]) -> List[List[DeliveryStop]]:
+        # Sweep by bearing from the depot and cut every max_stops
+        def bearing(stop):
+            return math.atan2(stop.location[0] - self.depot[0], stop.location[1] - self.depot[1])
+        
+        ordered = sorted(stops, key=bearing)
+        return [ordered[i:i + self.max_stops] for i in range(0, len(ordered), self.max_stops)]
+    
+    def _build_route(self, wave_start: datetime.datetime, stops: List[DeliveryStop]) -> Route:
+        points = [self.depot] + [stop.location for stop in stops]
+        dist = [[haversine_km(a, b) for b in points] for a in points]
+        
+        # Order the stops assuming the earliest sensible departure
+        depart = wave_start - datetime.timedelta(minutes=self.wave_minutes)
+        order = self._nearest_neighbour(dist, len(stops))
+        order = self._two_opt(order, dist, stops, depart)
+        
+        # Then leave as late as the tightest stop allows, but not before the earliest departure
+        route_stops, _, _ = self._schedule(order, dist, stops, depart)
+        slack = min(route_stop.stop.due - route_stop.eta for route_stop in route_stops)
+        if slack > datetime.timedelta(0):
+            depart += slack
+        
+        route_stops, total_km, late = self._schedule(order, dist, stops, depart)
+        return Route(wave_start, depart, route_stops, total_km, late)
+    
+    def _nearest_neighbour(self, dist: List[List[float]], count: int) -> List[int]:
+        remaining = set(range(1, count + 1))
+        order = []
+        current = 0
+        while remaining:
+            current = min(remaining, key=lambda node: dist[current][node])
+            order.append(current)
+            remaining.remove(current)
+        return order
+    
+    def _route_cost(self, order: List[int], dist: List[List[float]], stops: List[DeliveryStop],
+                    depart: datetime.datetime) -> float:
+        km = 0.0
+        late_minutes = 0.0
+        clock = 0.0
+        previous = 0
+        for node in order:
+            km += dist[previous][node]
+            clock += dist[previous][node] / self.speed_kmh * 60
+            due = (stops[node - 1].due - depart).total_seconds() / 60
+            late_minutes += max(0.0, clock - due)
+            clock += STOP_MINUTES
+            previous = node
+        km += dist[previous][0]
+        return km + late_minutes * LATENESS_PENALTY_KM
+    
+    def _two_opt(self, order: List[int], dist: List[List[float]], stops: List[DeliveryStop],
+                 depart: datetime.datetime) -> List[int]:
+        best = order
+        best_cost = self._route_cost(best, dist, stops, depart)
+        improved = True
+        while improved:
+            improved = False
+            for i in range(len(best) - 1):
+                for j in range(i + 1, len(best)):
+                    candidate = best[:i] + best[i:j + 1][::-1] + best[j + 1:]
+                    cost = self._route_cost(candidate, dist, stops, depart)
+                    if cost < best_cost - 1e-9:
+                        best, best_cost = candidate, cost
+                        improved = True
+        return best
+    
+    def _schedule(self, order: List[int], dist: List[List[float]], stops: List[DeliveryStop],
+                  depart: datetime.datetime) -> Tuple[List[RouteStop], float, int]:
+        route_stops = []
+        clock = depart
+        total_km = 0.0
+        late = 0
+        previous = 0
+        for node in order:
+            leg = dist[previous][node]
+            total_km += leg
+            clock += datetime.timedelta(minutes=leg / self.speed_kmh * 60)
+            stop = stops[node - 1]
+            is_late = clock > stop.due
+            late += is_late
+            route_stops.append(RouteStop(stop, clock, is_late, leg))
+            clock += datetime.timedelta(minutes=STOP_MINUTES)
+            previous = node
+        total_km += dist[previous][0]
+        return route_stops, total_km, late
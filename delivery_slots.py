@@ -0,0 +1,150 @@
+import datetime
+from collections import namedtuple
+from typing import List, Optional
+
+SLOT_FORMAT = "%Y-%m-%d %H:%M"   # same shape the order form used for delivery_date
+
+SLOT_MINUTES = 60
+OPENING_TIME = datetime.time(9, 0)
+CLOSING_TIME = datetime.time(18, 0)   # last slot ends here
+MAX_ORDER_QUANTITY = 5                # largest quantity the order forms offer
+# Cakes the kitchen can hand over per slot; at least MAX_ORDER_QUANTITY so the
+# biggest single order still fits an empty slot
+DEFAULT_SLOT_CAPACITY = 6
+BOOKING_DAYS = 14
+MIN_LEAD_HOURS = 3                    # time needed to bake before the first bookable slot
+
+DeliverySlot = namedtuple("DeliverySlot", "id start capacity booked")
+
+
+class SlotUnavailableError(ValueError):
+    pass
+
+
+def create_slot_tables(cursor) -> None:
+    # Slot inventory; booked is kept in step with slot_bookings so the picker never counts orders
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS delivery_slots (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            slot_start TEXT UNIQUE NOT NULL,
+            capacity INTEGER NOT NULL,
+            booked INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS slot_bookings (
+            order_id INTEGER PRIMARY KEY,
+            slot_id INTEGER NOT NULL,
+            quantity INTEGER NOT NULL,
+            FOREIGN KEY (order_id) REFERENCES orders (id),
+            FOREIGN KEY (slot_id) REFERENCES delivery_slots (id)
+        )
+    ''')
+    
+    # Covers the available-slots range scan without touching the table
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_delivery_slots_start ON delivery_slots (slot_start, capacity, booked)"
+    )
+    
+    # Cancelling an order gives its capacity back in the same transaction
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_release_slot_on_cancel
+        AFTER UPDATE OF status ON orders
+        WHEN NEW.status = 'cancelled' AND OLD.status <> 'cancelled'
+        BEGIN
+            UPDATE delivery_slots
+            SET booked = booked - (SELECT quantity FROM slot_bookings WHERE order_id = NEW.id)
+            WHERE id = (SELECT slot_id FROM slot_bookings WHERE order_id = NEW.id);
+            DELETE FROM slot_bookings WHERE order_id = NEW.id;
+        END
+    ''')
+
+
+def _slot_starts(day: datetime.date) -> List[datetime.datetime]:
+    starts = []
+    current = datetime.datetime.combine(day, OPENING_TIME)
+    closing = datetime.datetime.combine(day, CLOSING_TIME)
+    step = datetime.timedelta(minutes=SLOT_MINUTES)
+    while current + step <= closing:
+        starts.append(current)
+        current += step
+    return starts
+
+
+def ensure_slots(conn, days: int = BOOKING_DAYS, capacity: int = DEFAULT_SLOT_CAPACITY,
+                 today: Optional[datetime.date] = None) -> None:
+    # Extend the inventory so the booking window is always populated
+    today = today or datetime.date.today()
+    last_day = today + datetime.timedelta(days=days - 1)
+    
+    cursor = conn.cursor()
+    cursor.execute("SELECT MAX(slot_start) FROM delivery_slots")
+    latest = cursor.fetchone()[0]
+    last_slot = _slot_starts(last_day)[-1].strftime(SLOT_FORMAT)
+    if latest is not None and latest >= last_slot:
+        return
+    
+    rows = []
+    for offset in range(days):
+        for start in _slot_starts(today + datetime.timedelta(days=offset)):
+            rows.append((start.strftime(SLOT_FORMAT), capacity))
+    cursor.executemany(
+        "INSERT OR IGNORE INTO delivery_slots (slot_start, capacity) VALUES (?, ?)",
+        rows
+    )
+    conn.commit()
+
+
+def get_available_slots(conn, quantity: int = 1, days: int = BOOKING_DAYS,
+                        now: Optional[datetime.datetime] = None) -> List[DeliverySlot]:
+    now = now or datetime.datetime.now()
+    earliest = now + datetime.timedelta(hours=MIN_LEAD_HOURS)
+    window_end = datetime.datetime.combine(now.date() + datetime.timedelta(days=days), datetime.time())
+    
+    cursor = conn.cursor()
+    cursor.execute(
+        """SELECT id, slot_start, capacity, booked FROM delivery_slots
+        WHERE slot_start >= ? AND slot_start < ? AND capacity - booked >= ?
+        ORDER BY slot_start""",
+        (earliest.strftime(SLOT_FORMAT), window_end.strftime(SLOT_FORMAT), quantity)
+    )
+    return [DeliverySlot(*row) for row in cursor.fetchall()]
+
+
+def format_slot(slot: DeliverySlot) -> str:
+    start = datetime.datetime.strptime(slot.start, SLOT_FORMAT)
+    end = start + datetime.timedelta(minutes=SLOT_MINUTES)
+    return f"{start:%a %d %b}  {start:%H:%M}-{end:%H:%M}  ({slot.capacity - slot.booked} left)"
+
+
+def reserve_slot(cursor, slot_id: int, quantity: int) -> str:
+    # Check and take capacity in one statement; the write lock it takes keeps
+    # concurrent bookings from both passing the check. Returns the slot start.
+    cursor.execute(
+        "UPDATE delivery_slots SET booked = booked + ? WHERE id = ? AND capacity - booked >= ?",
+        (quantity, slot_id, quantity)
+    )
+    if cursor.rowcount != 1:
+        raise SlotUnavailableError("That delivery slot is no longer available. Please choose another.")
+    
+    cursor.execute("SELECT slot_start FROM delivery_slots WHERE id = ?", (slot_id,))
+    return cursor.fetchone()[0]
+
+
+def record_slot_booking(cursor, order_id: int, slot_id: int, quantity: int) -> None:
+    cursor.execute(
+        "INSERT INTO slot_bookings (order_id, slot_id, quantity) VALUES (?, ?, ?)",
+        (order_id, slot_id, quantity)
+    )
+
+
+def set_slot_capacity(conn, slot_start: str, capacity: int) -> None:
+    # Capacity may drop below what is already booked; existing bookings are kept
+    cursor = conn.cursor()
+    cursor.execute(
+        """INSERT INTO delivery_slots (slot_start, capacity) VALUES (?, ?)
+        ON CONFLICT (slot_start) DO UPDATE SET capacity = excluded.capacity""",
+        (slot_start, capacity)
+    )
+    conn.commit()
@@ -0,0 +1,36 @@
+import time
+
+try:
+    import fcntl
+except ImportError:   # Windows
+    fcntl = None
+    import msvcrt
+
+RETRY_SECONDS = 0.1
+
+
+def lock_file(f, blocking: bool = True) -> bool:
+    # Exclusive lock on an open file, held until unlock_file or the file is
+    # closed. Locks are per open file, so they also keep threads of one process
+    # apart when each opens the file itself. Returns False when not blocking
+    # and another holder has it.
+    while True:
+        try:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            if not blocking:
+                return False
+            time.sleep(RETRY_SECONDS)
+
+
+def unlock_file(f) -> None:
+    if fcntl:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
@@ -0,0 +1,95 @@
+import datetime
+import heapq
+from collections import namedtuple
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from production_planner import DEFAULT_BAKE_MINUTES, DEFAULT_OVEN_CAPACITY, parse_delivery_date, prep_time
+
+# Orders waiting for staff to accept them
+INCOMING_STATUS = "pending"
+INCOMING_SHOWN = 25   # cards on the incoming orders screen
+
+# start_by and due are None for orders without a usable delivery date
+IncomingOrder = namedtuple("IncomingOrder", "start_by due order")
+
+# (start-by sort key, order_date, order id); undated orders sort after every dated one
+QueueItem = Tuple[datetime.datetime, str, int]
+
+
+class IncomingQueue:
+    # Pending orders as a heap keyed on when work has to start: the delivery
+    # time minus the oven loads the order needs. Seeded once from the status
+    # index and kept current from order changes; commits from the other app
+    # show up through PRAGMA data_version and reseed it. Replaced entries stay
+    # in the heap until they surface or the heap is compacted.
+    def __init__(self, db, oven_capacity: int = DEFAULT_OVEN_CAPACITY, bake_minutes: int = DEFAULT_BAKE_MINUTES):
+        self.db = db
+        self.oven_capacity = oven_capacity
+        self.bake_minutes = bake_minutes
+        self.heap: List[QueueItem] = []
+        # order_id -> (its live heap item, IncomingOrder)
+        self.entries: Dict[int, Tuple[QueueItem, IncomingOrder]] = {}
+        self.stale = 0
+        self.seen_version: Optional[int] = None
+    
+    def _select(self, where: str, params: Iterable) -> List[tuple]:
+        cursor = self.db.conn.cursor()
+        cursor.execute(f"SELECT * FROM orders WHERE {where}", list(params))
+        return cursor.fetchall()
+    
+    def load(self) -> None:
+        self.seen_version = self.db.conn.execute("PRAGMA data_version").fetchone()[0]
+        self.entries.clear()
+        for order in self._select("status = ?", [INCOMING_STATUS]):
+            self.entries[order[0]] = self._entry(order)
+        self.heap = [item for item, _ in self.entries.values()]
+        heapq.heapify(self.heap)
+        self.stale = 0
+    
+    def _entry(self, order: tuple) -> Tuple[QueueItem, IncomingOrder]:
+        due = parse_delivery_date(order[8])   # delivery_date
+        start_by = due - prep_time(order[4], self.oven_capacity, self.bake_minutes) if due else None
+        item = (start_by or datetime.datetime.max, order[7] or "", order[0])
+        return item, IncomingOrder(start_by, due, order)
+    
+    def _discard(self, order_id: int) -> None:
+        if self.entries.pop(order_id, None) is not None:
+            self.stale += 1
+    
+    def on_orders_changed(self, order_ids: Iterable[int]) -> None:
+        # Order listener: new pending orders are pushed, accepted or declined ones dropped
+        order_ids = list(order_ids)
+        for order_id in order_ids:
+            self._discard(order_id)
+        for start in range(0, len(order_ids), 500):
+            chunk = order_ids[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            for order in self._select(f"id IN ({placeholders}) AND status = ?", chunk + [INCOMING_STATUS]):
+                item, incoming = self._entry(order)
+                self.entries[order[0]] = (item, incoming)
+                heapq.heappush(self.heap, item)
+        
+        if self.stale > len(self.entries):
+            self.heap = [item for item, _ in self.entries.values()]
+            heapq.heapify(self.heap)
+            self.stale = 0
+    
+    def __len__(self) -> int:
+        return len(self.entries)
+    
+    def upcoming(self, limit: Optional[int] = None) -> List[IncomingOrder]:
+        # The next orders to start, in order. Pops only as far as needed and
+        # pushes them back, so a short list costs O(limit log n)
+        if self.db.conn.execute("PRAGMA data_version").fetchone()[0] != self.seen_version:
+            self.load()
+        taken = []
+        while self.heap and (limit is None or len(taken) < limit):
+            item = heapq.heappop(self.heap)
+            entry = self.entries.get(item[2])
+            if entry is not None and entry[0] is item:
+                taken.append(entry)
+            else:
+                self.stale -= 1
+        for item, _ in taken:
+            heapq.heappush(self.heap, item)
+        return [incoming for _, incoming in taken]
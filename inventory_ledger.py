@@ -0,0 +1,153 @@
+import datetime
+from collections import namedtuple
+from typing import Dict, List, Optional
+
+MOVEMENT_KINDS = ("receipt", "consumption", "waste", "adjustment")
+# Kinds entered as a positive amount that takes stock away
+OUTGOING_KINDS = ("consumption", "waste")
+SNAPSHOT_TIME = datetime.time(0, 15)
+
+Movement = namedtuple("Movement", "id item_id kind delta moved_at actor note")
+
+
+class InventoryError(ValueError):
+    pass
+
+
+def create_inventory_ledger_tables(cursor) -> None:
+    # Every stock change is a movement row; inventory.quantity is their running
+    # total, kept by the trigger in the same statement that appends the movement
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS inventory_movements (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            item_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            delta REAL NOT NULL,
+            moved_at TEXT NOT NULL,
+            actor TEXT,
+            note TEXT,
+            FOREIGN KEY (item_id) REFERENCES inventory (id)
+        )
+    ''')
+    # Covers the movements of one item between two times, for as-of balances and history
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_inventory_movements_item ON inventory_movements (item_id, moved_at, delta)"
+    )
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_inventory_movement_balance
+        AFTER INSERT ON inventory_movements
+        BEGIN
+            UPDATE inventory SET quantity = quantity + NEW.delta, last_updated = NEW.moved_at
+            WHERE id = NEW.item_id;
+        END
+    ''')
+    
+    # An item's balance at taken_at, i.e. after its movements up to that time.
+    # Each item starts with one for the quantity it was created with.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS inventory_snapshots (
+            item_id INTEGER NOT NULL,
+            taken_at TEXT NOT NULL,
+            balance REAL NOT NULL,
+            PRIMARY KEY (item_id, taken_at)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_inventory_opening_snapshot
+        AFTER INSERT ON inventory
+        BEGIN
+            INSERT OR IGNORE INTO inventory_snapshots (item_id, taken_at, balance)
+            VALUES (NEW.id, NEW.last_updated, NEW.quantity);
+        END
+    ''')
+    # Items from before the ledger open at their current quantity
+    cursor.execute('''
+        INSERT OR IGNORE INTO inventory_snapshots (item_id, taken_at, balance)
+        SELECT id, last_updated, quantity FROM inventory
+        WHERE id NOT IN (SELECT item_id FROM inventory_snapshots)
+    ''')
+
+
+# Per item: its latest snapshot at or before :as_of plus the movements after it
+_AS_OF = """
+    WITH latest AS (
+        SELECT id AS item_id, (SELECT MAX(taken_at) FROM inventory_snapshots
+                               WHERE item_id = inventory.id AND taken_at <= :as_of) AS taken_at
+        FROM inventory
+    )
+    SELECT s.item_id, s.balance + COALESCE(SUM(m.delta), 0) AS balance, COUNT(m.delta) AS moved
+    FROM latest l
+    CROSS JOIN inventory_snapshots s ON s.item_id = l.item_id AND s.taken_at = l.taken_at
+    LEFT JOIN inventory_movements m
+        ON m.item_id = s.item_id AND m.moved_at > s.taken_at AND m.moved_at <= :as_of
+    GROUP BY s.item_id
+"""
+
+
+def movement_delta(kind: str, amount: float) -> float:
+    # Receipts add, consumption and waste take away; adjustments carry their own sign
+    if kind not in MOVEMENT_KINDS:
+        raise InventoryError(f"Unknown inventory movement: {kind}")
+    if kind == "adjustment":
+        if amount == 0:
+            raise InventoryError("An adjustment must change the quantity.")
+        return amount
+    if amount <= 0:
+        raise InventoryError("Please enter a quantity greater than zero.")
+    return -amount if kind in OUTGOING_KINDS else amount
+
+
+def record_movement(conn, item_id: int, kind: str, amount: float, actor: Optional[str] = None,
+                    note: Optional[str] = None) -> float:
+    # Appends one movement and returns the new balance. The stock check and the
+    # append are one statement, so concurrent movements each apply in full and
+    # none can take the balance below zero.
+    delta = movement_delta(kind, amount)
+    cursor = conn.cursor()
+    cursor.execute(
+        """INSERT INTO inventory_movements (item_id, kind, delta, moved_at, actor, note)
+        SELECT id, ?, ?, ?, ?, ? FROM inventory WHERE id = ? AND quantity + ? >= 0""",
+        (kind, delta, datetime.datetime.now().isoformat(), actor, note, item_id, delta)
+    )
+    if cursor.rowcount != 1:
+        conn.rollback()
+        cursor.execute("SELECT quantity, unit FROM inventory WHERE id = ?", (item_id,))
+        row = cursor.fetchone()
+        if row is None:
+            raise InventoryError("That inventory item no longer exists.")
+        raise InventoryError(f"Only {row[0]:g} {row[1]} left in stock.")
+    cursor.execute("SELECT quantity FROM inventory WHERE id = ?", (item_id,))
+    balance = cursor.fetchone()[0]
+    conn.commit()
+    return balance
+
+
+def take_snapshots(conn, upto: Optional[datetime.datetime] = None) -> int:
+    # Snapshots every item that moved since its latest snapshot as of upto (the
+    # start of today by default, run shortly after midnight so no write for the
+    # day before is still in flight). Returns how many were taken.
+    upto = upto or datetime.datetime.combine(datetime.date.today(), datetime.time())
+    taken = conn.execute(
+        f"""INSERT OR IGNORE INTO inventory_snapshots (item_id, taken_at, balance)
+        SELECT item_id, :as_of, balance FROM ({_AS_OF}) WHERE moved > 0""",
+        {"as_of": upto.isoformat()}
+    ).rowcount
+    conn.commit()
+    return taken
+
+
+def balances_as_of(conn, as_of: str) -> Dict[int, float]:
+    # item_id -> quantity at the ISO timestamp as_of. Reads one snapshot and at
+    # most a snapshot period of movements per item; items created later are left out.
+    cursor = conn.execute(_AS_OF, {"as_of": as_of})
+    return {item_id: balance for item_id, balance, _ in cursor.fetchall()}
+
+
+def get_movements(conn, item_id: int, limit: int = 100) -> List[Movement]:
+    # Newest first
+    cursor = conn.execute(
+        """SELECT id, item_id, kind, delta, moved_at, actor, note FROM inventory_movements
+        WHERE item_id = ? ORDER BY moved_at DESC, id DESC LIMIT ?""",
+        (item_id, limit)
+    )
+    return [Movement(*row) for row in cursor.fetchall()]
@@ -0,0 +1,140 @@
+import calendar
+import os
+from collections import OrderedDict, namedtuple
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from order_archive import ARCHIVE_DIR, archive_path, archived_years
+from order_dates import WALL_CLOCK_TS
+
+# Stage label -> (status it starts at, status it ends at); the last spans the whole order
+STAGES = OrderedDict([
+    ("Pending → Preparing", ("pending", "preparing")),
+    ("Preparing → Ready", ("preparing", "ready")),
+    ("Ready → Completed", ("ready", "completed")),
+    ("Order → Completed", ("pending", "completed")),
+])
+TOTAL = "Order → Completed"
+TRACKED_STATUSES = ("pending", "preparing", "ready", "completed")
+PERCENTILES = (0.5, 0.9, 0.99)
+NO_NOTE = "(no note)"
+
+# Seconds, nearest-rank
+Percentiles = namedtuple("Percentiles", "count p50 p90 p99")
+# overall: stage -> Percentiles; by_cake / by_weekday / by_note: key -> stage -> Percentiles.
+# A stage's note is the one staff left on the change that ended it.
+LeadTimes = namedtuple("LeadTimes", "start end orders overall by_cake by_weekday by_note")
+
+
+def create_lead_time_index(cursor) -> None:
+    # Covers the per-order history lookups below, and get_order_history
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_order_status_history_order "
+        "ON order_status_history (order_id, status, changed_ts)"
+    )
+
+
+def _first_reached(conn, schema: str, day: str, ts: str, start: str, end: str) -> List[tuple]:
+    # One row per order placed in [start, end]: cake, weekday (0 = Sunday), when it
+    # first reached each tracked status, and the note left on each of those changes.
+    # Statuses only move forward, so an order reaches each one at most once.
+    reached = ", ".join(f"MIN(CASE WHEN h.status = '{status}' THEN {ts} END)" for status in TRACKED_STATUSES)
+    notes = ", ".join(f"MAX(CASE WHEN h.status = '{status}' THEN h.notes END)" for status in TRACKED_STATUSES)
+    cursor = conn.execute(
+        f"""SELECT o.id, COALESCE(o.cake_id, -1), CAST(strftime('%w', {day}) AS INTEGER), {reached}, {notes}
+        FROM {schema}.orders o
+        JOIN {schema}.order_status_history h ON h.order_id = o.id
+        WHERE {day} BETWEEN ? AND ?
+        GROUP BY o.id""",
+        (start, end)
+    )
+    return cursor.fetchall()
+
+
+def _grouped_percentiles(keys: np.ndarray, durations: np.ndarray) -> Dict[int, Percentiles]:
+    # Sorts once by (key, duration) and reads each group's ranks by offset
+    if not len(durations):
+        return {}
+    order = np.lexsort((durations, keys))
+    keys, durations = keys[order], durations[order]
+    groups, starts, counts = np.unique(keys, return_index=True, return_counts=True)
+    ranks = [durations[starts + np.ceil(p * counts).astype(np.int64) - 1] for p in PERCENTILES]
+    return {int(group): Percentiles(int(counts[i]), *(float(rank[i]) for rank in ranks))
+            for i, group in enumerate(groups)}
+
+
+def _by_stage(keys: Dict[str, np.ndarray], durations: Dict[str, Tuple[np.ndarray, np.ndarray]],
+              names: Dict[int, object]) -> Dict[object, Dict[str, Percentiles]]:
+    # keys: stage -> one group key per order
+    result: Dict[object, Dict[str, Percentiles]] = {}
+    for stage, (valid, values) in durations.items():
+        for key, percentiles in _grouped_percentiles(keys[stage][valid], values).items():
+            result.setdefault(names.get(key, key), OrderedDict())[stage] = percentiles
+    return result
+
+
+def compute_lead_times(conn, start: str, end: str, archive_dir: str = ARCHIVE_DIR) -> LeadTimes:
+    # start and end are inclusive days of when orders were placed. Archived years
+    # are attached read-only by URI, so conn must be opened with uri=True; rows
+    # archived before the epoch columns existed fall back to the text timestamps
+    rows = _first_reached(conn, "main", "o.order_day", "h.changed_ts", start, end)
+    for year in archived_years(archive_dir):
+        if not (start[:4] <= str(year) <= end[:4]):
+            continue
+        conn.execute("ATTACH DATABASE ? AS lead_archive",
+                     (f"file:{os.path.abspath(archive_path(year, archive_dir))}?mode=ro",))
+        try:
+            rows += _first_reached(conn, "lead_archive", "substr(o.order_date, 1, 10)",
+                                   f"COALESCE(h.changed_ts, {WALL_CLOCK_TS.format('h.changed_at')})", start, end)
+        finally:
+            conn.execute("DETACH DATABASE lead_archive")
+    
+    tracked = len(TRACKED_STATUSES)
+    reached = np.array([row[3:3 + tracked] for row in rows], dtype=float).reshape(-1, tracked)
+    cakes = np.array([row[1] for row in rows], dtype=np.int64)
+    weekdays = np.array([row[2] for row in rows], dtype=np.int64)
+    # Notes become integer codes so they group like the other keys
+    codes: Dict[str, int] = {}
+    note_codes = np.fromiter((codes.setdefault(note or NO_NOTE, len(codes)) for row in rows for note in row[3 + tracked:]),
+                             dtype=np.int64, count=len(rows) * tracked).reshape(-1, tracked)
+    
+    durations = OrderedDict()
+    cake_keys, weekday_keys, note_keys = {}, {}, {}
+    for stage, (begin, finish) in STAGES.items():
+        first, last = TRACKED_STATUSES.index(begin), TRACKED_STATUSES.index(finish)
+        spans = reached[:, last] - reached[:, first]
+        valid = ~np.isnan(spans) & (spans >= 0)   # skipped stages and clock steps back are left out
+        durations[stage] = (valid, spans[valid])
+        cake_keys[stage], weekday_keys[stage], note_keys[stage] = cakes, weekdays, note_codes[:, last]
+    
+    overall = OrderedDict()
+    for stage, (_, values) in durations.items():
+        if len(values):
+            overall[stage] = _grouped_percentiles(np.zeros(len(values), dtype=np.int64), values)[0]
+    # strftime('%w') counts from Sunday; calendar.day_name from Monday
+    weekday_names = {day: calendar.day_name[(day - 1) % 7] for day in range(7)}
+    return LeadTimes(
+        start, end, len(rows), overall,
+        _by_stage(cake_keys, durations, {}),
+        _by_stage(weekday_keys, durations, weekday_names),
+        _by_stage(note_keys, durations, {code: note for note, code in codes.items()})
+    )
+
+
+def format_duration(seconds: float) -> str:
+    minutes = int(round(seconds / 60))
+    if minutes < 60:
+        return f"{minutes}m"
+    hours, minutes = divmod(minutes, 60)
+    if hours < 48:
+        return f"{hours}h {minutes:02d}m"
+    days, hours = divmod(hours, 24)
+    return f"{days}d {hours}h"
+
+
+def slowest(groups: Dict[object, Dict[str, Percentiles]], stage: str = TOTAL,
+            limit: int = 5) -> List[Tuple[object, Percentiles]]:
+    # Groups by p90 of one stage, slowest first
+    rows = [(key, stages[stage]) for key, stages in groups.items() if stage in stages]
+    return sorted(rows, key=lambda row: -row[1].p90)[:limit]
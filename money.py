@@ -0,0 +1,136 @@
+import functools
+import math
+import sqlite3
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Union
+
+# REAL column -> integer cents column kept beside it
+MONEY_COLUMNS = (("cakes", "price", "price_cents"),
+                 ("orders", "total_price", "total_cents"),
+                 ("order_items", "unit_price", "unit_price_cents"))
+
+
+def to_cents(value: Union[int, float, "Money", None]) -> int:
+    # Rounds half away from zero like SQLite's ROUND, so Python and the
+    # triggers below agree on every stored amount
+    if value is None:
+        return 0
+    if isinstance(value, Money):
+        return value.cents
+    scaled = float(value) * 100
+    return int(math.copysign(math.floor(abs(scaled) + 0.5), scaled))
+
+
+@functools.total_ordering
+class Money:
+    # An amount in whole cents. Sums and discounts stay exact; it formats and
+    # converts like the dollar floats the screens already print with :.2f
+    __slots__ = ("cents",)
+    
+    def __init__(self, cents: int = 0):
+        self.cents = int(cents)
+    
+    @classmethod
+    def from_dollars(cls, value: Union[int, float, "Money", None]) -> "Money":
+        return cls(to_cents(value))
+    
+    @property
+    def dollars(self) -> float:
+        return self.cents / 100
+    
+    def scale(self, factor: Union[int, float, Decimal]) -> "Money":
+        # Percent discounts and the like, rounded half up to the cent
+        cents = (Decimal(self.cents) * Decimal(str(factor))).quantize(Decimal(1), rounding=ROUND_HALF_UP)
+        return Money(int(cents))
+    
+    def __add__(self, other):
+        if isinstance(other, Money):
+            return Money(self.cents + other.cents)
+        if other == 0:
+            return self
+        return NotImplemented
+    
+    __radd__ = __add__   # so sum() works from its 0 start
+    
+    def __sub__(self, other):
+        if isinstance(other, Money):
+            return Money(self.cents - other.cents)
+        return NotImplemented
+    
+    def __mul__(self, other):
+        if isinstance(other, int):
+            return Money(self.cents * other)
+        return NotImplemented
+    
+    __rmul__ = __mul__
+    
+    def __truediv__(self, other):
+        if isinstance(other, int) and other:
+            return self.scale(Decimal(1) / Decimal(other))
+        return NotImplemented
+    
+    def __neg__(self):
+        return Money(-self.cents)
+    
+    def __eq__(self, other):
+        if isinstance(other, Money):
+            return self.cents == other.cents
+        return NotImplemented
+    
+    def __lt__(self, other):
+        if isinstance(other, Money):
+            return self.cents < other.cents
+        return NotImplemented
+    
+    def __hash__(self):
+        return hash(self.cents)
+    
+    def __bool__(self):
+        return self.cents != 0
+    
+    def __float__(self):
+        return self.dollars
+    
+    def __format__(self, spec: str) -> str:
+        return format(self.dollars, spec) if spec else str(self)
+    
+    def __str__(self):
+        sign = "-" if self.cents < 0 else ""
+        return f"{sign}{abs(self.cents) // 100}.{abs(self.cents) % 100:02d}"
+    
+    def __repr__(self):
+        return f"Money('{self}')"
+
+
+ZERO = Money(0)
+
+# Money written into the REAL columns lands as dollars; the cents columns get .cents
+sqlite3.register_adapter(Money, lambda money: money.dollars)
+
+
+def create_money_columns(cursor) -> None:
+    # Integer-cents copies of the REAL amounts. Revenue and reports sum these, so
+    # totals are exact however many orders they cover. Writers fill them directly;
+    # the triggers cover rows written by older clients or without the column.
+    for table, real_column, cents_column in MONEY_COLUMNS:
+        columns = [row[1] for row in cursor.execute(f"PRAGMA table_info({table})").fetchall()]
+        if cents_column not in columns:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {cents_column} INTEGER")
+        cursor.execute(
+            f"UPDATE {table} SET {cents_column} = CAST(ROUND({real_column} * 100) AS INTEGER) "
+            f"WHERE {cents_column} IS NULL AND {real_column} IS NOT NULL"
+        )
+        
+        sync = f'''
+            WHEN NEW.{real_column} IS NOT NULL AND (NEW.{cents_column} IS NULL
+                 OR NEW.{cents_column} <> CAST(ROUND(NEW.{real_column} * 100) AS INTEGER))
+            BEGIN
+                UPDATE {table} SET {cents_column} = CAST(ROUND(NEW.{real_column} * 100) AS INTEGER)
+                WHERE rowid = NEW.rowid;
+            END
+        '''
+        cursor.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{table}_{cents_column}_insert AFTER INSERT ON {table} {sync}")
+        cursor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS trg_{table}_{cents_column}_update "
+            f"AFTER UPDATE OF {real_column} ON {table} {sync}"
+        )
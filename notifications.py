@@ -0,0 +1,323 @@
+import datetime
+import queue
+import smtplib
+import string
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import Future
+from email.mime.text import MIMEText
+from email.policy import SMTP as SMTP_POLICY
+from typing import List, Optional
+
+from money import Money
+from stock_alerts import get_stock_alerts
+
+COALESCE_SECONDS = 120      # status changes for one customer inside this window go out as one email
+SMTP_IDLE_SECONDS = 300     # the shared connection is closed after this long without mail
+DIGEST_TIME = datetime.time(21, 0)
+SIGNATURE = "Thank you for choosing Sweet Dreams Bakery!"
+
+# Wording for the statuses customers hear about
+STATUS_MESSAGES = {
+    "preparing": "has been accepted and is now being prepared",
+    "ready": "is ready",
+    "completed": "has been completed",
+    "cancelled": "has been cancelled. Please contact us if you have any questions",
+}
+
+Email = namedtuple("Email", "to subject body")
+
+
+class Template:
+    # Parsed once at import; rendering is a join over the literal and field parts
+    def __init__(self, subject: str, body: str):
+        self.subject = list(string.Formatter().parse(subject))
+        self.body = list(string.Formatter().parse(body))
+    
+    @staticmethod
+    def _render(parts, fields: dict) -> str:
+        out = []
+        for literal, field, spec, _ in parts:
+            out.append(literal)
+            if field is not None:
+                out.append(format(fields[field], spec or ""))
+        return "".join(out)
+    
+    def render(self, to: str, **fields) -> Email:
+        return Email(to, self._render(self.subject, fields), self._render(self.body, fields))
+
+
+TEMPLATES = {
+    "order_confirmation": Template(
+        "Sweet Dreams Bakery - Order Confirmation #{order_id}",
+        "Dear {name},\n\nThank you for your order!\n\nOrder Details:\n{items}\n- Total: ${total:.2f}\n"
+        "- Delivery Type: {service}\n- Expected Date: {expected}\n\n"
+        "We will notify you when your order status changes.\n\n" + SIGNATURE
+    ),
+    "status_update": Template(
+        "Sweet Dreams Bakery - Order #{order_id} Status Update",
+        "Dear {name},\n\nYour order #{order_id} {message}.\n\n" + SIGNATURE
+    ),
+    "status_updates": Template(
+        "Sweet Dreams Bakery - Updates on {count} Orders",
+        "Dear {name},\n\nThere is news about several of your orders:\n\n{updates}\n\n" + SIGNATURE
+    ),
+    "order_notice": Template(
+        "Sweet Dreams Bakery - Order #{order_id} Notification",
+        "Dear {name},\n\nThis is a notification about your order #{order_id}.\n\n"
+        "Current status: {status}\n\n" + SIGNATURE
+    ),
+    "staff_digest": Template(
+        "Sweet Dreams Bakery - Daily Digest for {day}",
+        "Hello {name},\n\nHere is the summary for {day}.\n\n"
+        "New orders: {new_orders}\nRevenue: ${revenue:.2f}\n\n"
+        "Open orders by status:\n{statuses}\n\n"
+        "Due tomorrow ({tomorrow}):\n{due}\n\n"
+        "Low stock:\n{low_stock}\n"
+    ),
+    "sla_alert": Template(
+        "Sweet Dreams Bakery - Order #{order_id} {headline}",
+        "Hello {name},\n\nOrder #{order_id} for {customer} is still {status} and {message}.\n"
+        "Due: {due}\n"
+    ),
+}
+
+
+def create_notification_tables(cursor) -> None:
+    # One row per digest day, so a restart never sends the same digest twice
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS notification_digests (
+            digest_date TEXT PRIMARY KEY,
+            sent_at TEXT NOT NULL,
+            recipients INTEGER NOT NULL
+        )
+    ''')
+
+
+def digest_sent(conn, day: datetime.date) -> bool:
+    return conn.execute(
+        "SELECT 1 FROM notification_digests WHERE digest_date = ?", (day.isoformat(),)
+    ).fetchone() is not None
+
+
+def record_digest(conn, day: datetime.date, recipients: int) -> None:
+    conn.execute(
+        "INSERT OR REPLACE INTO notification_digests (digest_date, sent_at, recipients) VALUES (?, ?, ?)",
+        (day.isoformat(), datetime.datetime.now().isoformat(), recipients)
+    )
+    conn.commit()
+
+
+def status_message(status: str) -> str:
+    return STATUS_MESSAGES.get(status, f"status has been updated to: {status}")
+
+
+def _bullets(lines: List[str], empty: str = "- none") -> str:
+    return "\n".join(f"- {line}" for line in lines) if lines else empty
+
+
+def build_staff_digest(conn, day: datetime.date) -> dict:
+    # Template fields for one day's digest, gathered with a handful of aggregate queries
+    start = day.isoformat()
+    end = (day + datetime.timedelta(days=1)).isoformat()
+    tomorrow_end = (day + datetime.timedelta(days=2)).isoformat()
+    cursor = conn.cursor()
+    
+    cursor.execute(
+        "SELECT COUNT(*), COALESCE(SUM(total_cents), 0) FROM orders WHERE order_day = ? AND status <> 'cancelled'",
+        (start,)
+    )
+    new_orders, revenue = cursor.fetchone()
+    
+    cursor.execute(
+        "SELECT status, COUNT(*) FROM orders WHERE status IN ('pending', 'preparing', 'ready') GROUP BY status"
+    )
+    statuses = [f"{status}: {count}" for status, count in cursor.fetchall()]
+    
+    cursor.execute(
+        "SELECT id, customer_name, delivery_type, delivery_date FROM orders "
+        "WHERE delivery_date >= ? AND delivery_date < ? AND status IN ('pending', 'preparing', 'ready') "
+        "ORDER BY delivery_date",
+        (end, tomorrow_end)
+    )
+    due = [f"#{order_id} {name} ({delivery_type}, {(when or '')[11:16]})"
+           for order_id, name, delivery_type, when in cursor.fetchall()]
+    
+    low_stock = [f"{alert.name}: {alert.quantity:g} {alert.unit}" for alert in get_stock_alerts(conn)]
+    
+    return {
+        "day": start,
+        "tomorrow": end,
+        "new_orders": new_orders,
+        "revenue": Money(revenue),
+        "statuses": _bullets(statuses),
+        "due": _bullets(due),
+        "low_stock": _bullets(low_stock),
+    }
+
+
+def digest_recipients(conn) -> List[tuple]:
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT name, email FROM users WHERE role IN ('admin', 'staff') AND status = 'active' "
+        "AND email IS NOT NULL AND email <> ''"
+    )
+    return cursor.fetchall()
+
+
+def seconds_until_digest(now: Optional[datetime.datetime] = None, at: datetime.time = DIGEST_TIME) -> float:
+    now = now or datetime.datetime.now()
+    next_run = datetime.datetime.combine(now.date(), at)
+    if next_run <= now:
+        next_run += datetime.timedelta(days=1)
+    return (next_run - now).total_seconds()
+
+
+class Notifier:
+    # Every email goes through one worker thread holding one SMTP connection,
+    # opened on demand and closed after SMTP_IDLE_SECONDS without mail
+    def __init__(self, smtp_server: str, smtp_port: int, username: str, password: str,
+                 window: float = COALESCE_SECONDS, idle_timeout: float = SMTP_IDLE_SECONDS):
+        self.smtp_server = smtp_server
+        self.smtp_port = smtp_port
+        self.username = username
+        self.password = password
+        self.window = window
+        self.idle_timeout = idle_timeout
+        
+        self.queue: "queue.Queue[tuple]" = queue.Queue()
+        # Worker-thread state: recipient -> [due time, name, {order id: status}]
+        self.pending: "OrderedDict[str, list]" = OrderedDict()
+        self.server: Optional[smtplib.SMTP] = None
+        self.last_used = 0.0
+        self.stats = {"sent": 0, "failed": 0, "connections": 0, "coalesced": 0}
+        
+        self.thread = threading.Thread(target=self._run, name="notifier", daemon=True)
+        self.thread.start()
+    
+    def send(self, to: str, template: str, **fields) -> Future:
+        # Rendered now, delivered by the worker; the future resolves to True/False
+        future: Future = Future()
+        self.queue.put(("send", TEMPLATES[template].render(to, **fields), future))
+        return future
+    
+    def order_status_changed(self, to: Optional[str], name: str, order_id: int, status: str) -> None:
+        if to and status in STATUS_MESSAGES:
+            self.queue.put(("status", (to, name, order_id, status), None))
+    
+    def flush(self) -> Future:
+        # Sends every coalesced update now instead of waiting out its window
+        future: Future = Future()
+        self.queue.put(("flush", None, future))
+        return future
+    
+    def close(self) -> None:
+        self.queue.put(("close", None, None))
+        self.thread.join(timeout=10)
+    
+    def _run(self) -> None:
+        while True:
+            now = time.monotonic()
+            wakeups = [entry[0] for entry in self.pending.values()]
+            if self.server is not None:
+                wakeups.append(self.last_used + self.idle_timeout)
+            timeout = max(min(wakeups) - now, 0) if wakeups else None
+            
+            try:
+                kind, payload, future = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                kind, payload, future = "tick", None, None
+            
+            # This is the only thread that sends, so no error may end it
+            try:
+                if kind == "send":
+                    future.set_result(self._deliver(payload))
+                elif kind == "status":
+                    self._coalesce(*payload)
+                elif kind in ("flush", "close"):
+                    self._send_due(force=True)
+                    if kind != "close":
+                        future.set_result(True)
+                
+                self._send_due()
+            except Exception as e:
+                print(f"Error sending email: {e}")
+                self.stats["failed"] += 1
+                self._disconnect()
+                if future is not None and not future.done():
+                    future.set_result(False)
+            
+            if kind == "close":
+                self._disconnect()
+                return
+            if self.server is not None and time.monotonic() - self.last_used >= self.idle_timeout:
+                self._disconnect()
+    
+    def _coalesce(self, to: str, name: str, order_id: int, status: str) -> None:
+        entry = self.pending.get(to)
+        if entry is None:
+            self.pending[to] = [time.monotonic() + self.window, name, OrderedDict([(order_id, status)])]
+            return
+        # Only the latest status of each order is worth telling
+        self.stats["coalesced"] += 1
+        entry[2].pop(order_id, None)
+        entry[2][order_id] = status
+    
+    def _send_due(self, force: bool = False) -> None:
+        now = time.monotonic()
+        for to in [to for to, entry in self.pending.items() if force or entry[0] <= now]:
+            _, name, updates = self.pending.pop(to)
+            if len(updates) == 1:
+                order_id, status = next(iter(updates.items()))
+                email = TEMPLATES["status_update"].render(to, name=name, order_id=order_id,
+                                                          message=status_message(status))
+            else:
+                lines = [f"Order #{order_id} {status_message(status)}." for order_id, status in updates.items()]
+                email = TEMPLATES["status_updates"].render(to, name=name, count=len(updates),
+                                                           updates=_bullets(lines))
+            self._deliver(email)
+    
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=30)
+        server.ehlo()
+        if server.has_extn("starttls"):
+            server.starttls()
+            server.ehlo()
+        if self.username and self.password:
+            server.login(self.username, self.password)
+        self.stats["connections"] += 1
+        return server
+    
+    def _disconnect(self) -> None:
+        if self.server is not None:
+            try:
+                self.server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self.server = None
+    
+    def _deliver(self, email: Email) -> bool:
+        # The SMTP policy encodes non-ASCII names and subjects as RFC 2047 headers
+        msg = MIMEText(email.body, "plain", "utf-8", policy=SMTP_POLICY)
+        msg["From"] = self.username
+        msg["To"] = email.to
+        msg["Subject"] = email.subject
+        
+        # A connection the server dropped while idle gets one fresh retry
+        for attempt in range(2):
+            try:
+                if self.server is None:
+                    self.server = self._connect()
+                self.server.send_message(msg, self.username, [email.to])
+                self.last_used = time.monotonic()
+                self.stats["sent"] += 1
+                return True
+            except smtplib.SMTPServerDisconnected:
+                self.server = None
+            except (smtplib.SMTPException, OSError) as e:
+                print(f"Error sending email: {e}")
+                self._disconnect()
+                break
+        self.stats["failed"] += 1
+        return False
@@ -0,0 +1,182 @@
+import datetime
+import os
+import re
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from order_items import OrderItem
+
+ARCHIVE_DIR = "archive"
+ARCHIVE_AFTER_DAYS = 365
+ARCHIVE_TIME = datetime.time(3, 30)   # nightly archive run from the admin app's scheduler
+ARCHIVED_STATUSES = ("completed", "cancelled")
+
+# Child tables moved along with their orders, and the column that links them
+ARCHIVED_CHILD_TABLES = (("order_status_history", "order_id"), ("order_items", "order_id"))
+
+# Compact the hot file when this share of its pages is free after archiving
+VACUUM_FREE_RATIO = 0.25
+
+_ARCHIVE_FILE = re.compile(r"^orders_(\d{4})\.db$")
+
+
+def archive_path(year: int, archive_dir: str = ARCHIVE_DIR) -> str:
+    return os.path.join(archive_dir, f"orders_{year}.db")
+
+
+def archived_years(archive_dir: str = ARCHIVE_DIR) -> List[int]:
+    if not os.path.isdir(archive_dir):
+        return []
+    years = []
+    for name in os.listdir(archive_dir):
+        match = _ARCHIVE_FILE.match(name)
+        if match:
+            years.append(int(match.group(1)))
+    return sorted(years, reverse=True)
+
+
+@contextmanager
+def attached(conn, year: int, archive_dir: str = ARCHIVE_DIR) -> Iterator[str]:
+    # ATTACH is only allowed outside a transaction, so settle any open one first
+    conn.commit()
+    alias = f"archive_{year}"
+    os.makedirs(archive_dir, exist_ok=True)
+    conn.execute("ATTACH DATABASE ? AS " + alias, (archive_path(year, archive_dir),))
+    try:
+        yield alias
+    finally:
+        conn.commit()
+        conn.execute("DETACH DATABASE " + alias)
+
+
+def _ensure_archive_tables(cursor, alias: str) -> Dict[str, str]:
+    # Same columns as the hot tables; created empty from them the first time and
+    # widened when the hot schema gains columns. Returns table -> column list.
+    columns = {}
+    for table in ("orders",) + tuple(table for table, _ in ARCHIVED_CHILD_TABLES):
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {alias}.{table} AS SELECT * FROM main.{table} WHERE 0")
+        hot = [row[1] for row in cursor.execute(f"PRAGMA main.table_info({table})").fetchall()]
+        cold = {row[1] for row in cursor.execute(f"PRAGMA {alias}.table_info({table})").fetchall()}
+        for column in hot:
+            if column not in cold:
+                cursor.execute(f"ALTER TABLE {alias}.{table} ADD COLUMN {column}")
+        columns[table] = ", ".join(hot)
+    
+    cursor.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {alias}.idx_orders_id ON orders (id)")
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS {alias}.idx_orders_customer ON orders (customer_id, order_date)")
+    for table, column in ARCHIVED_CHILD_TABLES:
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {alias}.idx_{table}_{column} ON {table} ({column})")
+    return columns
+
+
+def archive_orders(conn, older_than_days: int = ARCHIVE_AFTER_DAYS, now: Optional[datetime.datetime] = None,
+                   archive_dir: str = ARCHIVE_DIR) -> List[int]:
+    # Moves closed orders placed before the cutoff, with their history and line
+    # items, into one archive file per order year. Each year is one transaction
+    # across both files. Returns the archived order ids.
+    now = now or datetime.datetime.now()
+    cutoff = (now - datetime.timedelta(days=older_than_days)).isoformat()
+    placeholders = ",".join("?" * len(ARCHIVED_STATUSES))
+    
+    cursor = conn.cursor()
+    cursor.execute(
+        f"""SELECT substr(order_date, 1, 4), id FROM orders
+        WHERE order_date < ? AND status IN ({placeholders})""",
+        (cutoff, *ARCHIVED_STATUSES)
+    )
+    by_year: Dict[int, List[int]] = {}
+    for year, order_id in cursor.fetchall():
+        by_year.setdefault(int(year), []).append(order_id)
+    
+    archived = []
+    for year, order_ids in sorted(by_year.items()):
+        with attached(conn, year, archive_dir) as alias:
+            cursor = conn.cursor()
+            try:
+                columns = _ensure_archive_tables(cursor, alias)
+                cursor.execute("CREATE TEMP TABLE IF NOT EXISTS archive_ids (id INTEGER PRIMARY KEY)")
+                cursor.execute("DELETE FROM temp.archive_ids")
+                cursor.executemany("INSERT INTO temp.archive_ids (id) VALUES (?)", [(oid,) for oid in order_ids])
+                
+                cursor.execute(
+                    f"""INSERT INTO {alias}.orders ({columns['orders']})
+                    SELECT {columns['orders']} FROM main.orders WHERE id IN temp.archive_ids"""
+                )
+                for table, column in ARCHIVED_CHILD_TABLES:
+                    cursor.execute(
+                        f"""INSERT INTO {alias}.{table} ({columns[table]})
+                        SELECT {columns[table]} FROM main.{table} WHERE {column} IN temp.archive_ids"""
+                    )
+                    cursor.execute(f"DELETE FROM main.{table} WHERE {column} IN temp.archive_ids")
+                # Bookings of past slots and spent points are settled once the order is closed
+                cursor.execute("DELETE FROM main.slot_bookings WHERE order_id IN temp.archive_ids")
+                cursor.execute("DELETE FROM main.loyalty_redemptions WHERE order_id IN temp.archive_ids")
+                cursor.execute("DELETE FROM main.orders WHERE id IN temp.archive_ids")
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        archived.extend(order_ids)
+    
+    if archived:
+        _compact(conn)
+    return archived
+
+
+def _compact(conn) -> None:
+    # Keep the hot file small so its pages stay in the page cache
+    free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    total_pages = conn.execute("PRAGMA page_count").fetchone()[0]
+    if total_pages and free_pages / total_pages >= VACUUM_FREE_RATIO:
+        conn.commit()
+        conn.execute("VACUUM")
+
+
+def _archived_items(cursor, alias: str, where: str, params: tuple) -> List[OrderItem]:
+    cursor.execute(
+        f"""SELECT i.order_id, i.cake_id, COALESCE(c.name, 'Unknown Cake'), i.quantity, i.unit_price
+        FROM {alias}.order_items i
+        JOIN {alias}.orders o ON i.order_id = o.id
+        LEFT JOIN main.cakes c ON i.cake_id = c.id
+        WHERE {where}
+        ORDER BY i.order_id, i.id""",
+        params
+    )
+    return [OrderItem(*row) for row in cursor.fetchall()]
+
+
+def get_archived_orders(conn, customer_id: int, archive_dir: str = ARCHIVE_DIR
+                        ) -> Tuple[List[tuple], Dict[int, List[OrderItem]]]:
+    # Rows have the orders table shape, newest year and newest order first
+    orders = []
+    items: Dict[int, List[OrderItem]] = {}
+    for year in archived_years(archive_dir):
+        with attached(conn, year, archive_dir) as alias:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"SELECT * FROM {alias}.orders WHERE customer_id = ? ORDER BY order_date DESC",
+                (customer_id,)
+            )
+            orders.extend(cursor.fetchall())
+            for item in _archived_items(cursor, alias, "o.customer_id = ?", (customer_id,)):
+                items.setdefault(item.order_id, []).append(item)
+    return orders, items
+
+
+def get_archived_order_details(conn, order_id: int, archive_dir: str = ARCHIVE_DIR
+                               ) -> Optional[Tuple[tuple, List[OrderItem], List[tuple]]]:
+    # (order row, line items, history rows) or None if no archive holds the order
+    for year in archived_years(archive_dir):
+        with attached(conn, year, archive_dir) as alias:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT * FROM {alias}.orders WHERE id = ?", (order_id,))
+            order = cursor.fetchone()
+            if order is None:
+                continue
+            items = _archived_items(cursor, alias, "o.id = ?", (order_id,))
+            cursor.execute(
+                f"SELECT * FROM {alias}.order_status_history WHERE order_id = ? ORDER BY changed_at DESC",
+                (order_id,)
+            )
+            return order, items, cursor.fetchall()
+    return None
@@ -0,0 +1,210 @@
+import datetime
+import json
+import os
+from collections import OrderedDict
+from typing import Dict, List
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+from order_status import ORDER_STATUSES
+
+COLUMN_DIR = "columns"
+# Bumped when the column layout changes; older files are rebuilt from scratch
+COLUMN_FORMAT = 1
+GROW_ROWS = 65536      # files are preallocated in chunks so appends rarely remap
+FETCH_ROWS = 50000     # rows pulled from SQLite per fetchmany during an export
+
+EPOCH_DAY = datetime.date(1970, 1, 1)
+CANCELLED = ORDER_STATUSES.index("cancelled")
+
+_status_code = " ".join(f"WHEN '{status}' THEN {code}" for code, status in enumerate(ORDER_STATUSES))
+
+# column -> (dtype, SQL expression over orders). Unknown or NULL values become -1.
+# day counts whole days since 1970-01-01 on the same wall clock as order_day.
+COLUMNS = OrderedDict([
+    ("id", ("<i8", "id")),
+    ("day", ("<i4", "COALESCE(order_ts / 86400, -1)")),
+    ("cake_id", ("<i4", "COALESCE(cake_id, -1)")),
+    ("quantity", ("<i4", "COALESCE(quantity, 0)")),
+    ("cents", ("<i8", "COALESCE(total_cents, 0)")),
+    ("status", ("<i1", f"CASE status {_status_code} ELSE -1 END")),
+    ("customer_id", ("<i4", "COALESCE(customer_id, -1)")),
+    ("delivery", ("<i1", "CASE delivery_type WHEN 'delivery' THEN 1 WHEN 'pickup' THEN 0 ELSE -1 END")),
+])
+_SELECT = "SELECT " + ", ".join(expression for _, expression in COLUMNS.values()) + " FROM orders"
+
+
+def create_order_column_tables(cursor) -> None:
+    # Orders whose exported columns changed after they were written; the exporter
+    # patches those rows in place and then drops the entries it has applied
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS order_column_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            order_id INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_order_column_changes
+        AFTER UPDATE OF order_ts, cake_id, quantity, total_cents, status, customer_id, delivery_type ON orders
+        BEGIN
+            INSERT INTO order_column_changes (order_id) VALUES (NEW.id);
+        END
+    ''')
+
+
+def day_number(day: str) -> int:
+    return (datetime.date.fromisoformat(day) - EPOCH_DAY).days
+
+
+class OrderColumns:
+    # The orders table as one .npy file per column, memory-mapped, for analytics
+    # that scan every order. sync() appends orders past the last exported id and
+    # patches rows listed in order_column_changes, so it only reads what moved.
+    # Archived orders stay in the files: they are still part of the history.
+    # One exporting process per directory.
+    def __init__(self, conn, directory: str = COLUMN_DIR):
+        self.conn = conn
+        self.directory = directory
+        self.meta_path = os.path.join(directory, "meta.json")
+        self.arrays: Dict[str, np.memmap] = {}
+        self.rows = 0
+        self.last_id = 0
+        self.seq = 0
+        self.capacity = 0
+        os.makedirs(directory, exist_ok=True)
+        self._open()
+    
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, f"{name}.npy")
+    
+    def _open(self) -> None:
+        meta = None
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path) as f:
+                meta = json.load(f)
+        if (meta and meta.get("format") == COLUMN_FORMAT
+                and all(os.path.exists(self._path(name)) for name in COLUMNS)):
+            self.arrays = {name: np.load(self._path(name), mmap_mode="r+") for name in COLUMNS}
+            self.capacity = min(len(array) for array in self.arrays.values())
+            self.rows, self.last_id, self.seq = meta["rows"], meta["last_id"], meta["seq"]
+            if self.rows <= self.capacity:
+                return
+        # Missing, torn or from an older layout: start over from the table
+        self.arrays = {}
+        self.rows = self.last_id = self.capacity = 0
+        self.seq = self.conn.execute("SELECT COALESCE(MAX(seq), 0) FROM order_column_changes").fetchone()[0]
+        self._grow(GROW_ROWS)
+    
+    def _grow(self, needed: int) -> None:
+        capacity = max(needed, self.capacity * 2, GROW_ROWS)
+        old, self.arrays = self.arrays, {}
+        for name, (dtype, _) in COLUMNS.items():
+            path = self._path(name)
+            grown = open_memmap(path + ".tmp", mode="w+", dtype=dtype, shape=(capacity,))
+            if name in old:
+                grown[:self.rows] = old[name][:self.rows]
+            grown.flush()
+            del grown
+            old.pop(name, None)   # the old map must be released before its file is replaced
+            os.replace(path + ".tmp", path)
+        self.arrays = {name: np.load(self._path(name), mmap_mode="r+") for name in COLUMNS}
+        self.capacity = capacity
+    
+    def _store(self, start: int, block: np.ndarray) -> None:
+        for position, (name, (dtype, _)) in enumerate(COLUMNS.items()):
+            self.arrays[name][start:start + len(block)] = block[:, position].astype(dtype)
+    
+    def _save_meta(self) -> None:
+        for array in self.arrays.values():
+            array.flush()
+        meta = {"format": COLUMN_FORMAT, "rows": self.rows, "last_id": self.last_id, "seq": self.seq}
+        with open(self.meta_path + ".tmp", "w") as f:
+            json.dump(meta, f)
+        os.replace(self.meta_path + ".tmp", self.meta_path)
+    
+    def sync(self) -> int:
+        # Returns how many rows were appended or patched
+        cursor = self.conn.cursor()
+        seq = cursor.execute("SELECT COALESCE(MAX(seq), 0) FROM order_column_changes").fetchone()[0]
+        touched = 0
+        
+        if seq > self.seq:
+            changed = [order_id for order_id, in cursor.execute(
+                "SELECT DISTINCT order_id FROM order_column_changes WHERE seq > ? AND seq <= ? AND order_id <= ?",
+                (self.seq, seq, self.last_id)
+            )]
+            ids = self.arrays["id"][:self.rows]
+            for start in range(0, len(changed), 500):
+                chunk = changed[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = cursor.execute(f"{_SELECT} WHERE id IN ({placeholders})", chunk).fetchall()
+                for row in rows:
+                    position = int(np.searchsorted(ids, row[0]))
+                    if position < self.rows and ids[position] == row[0]:
+                        self._store(position, np.array([row], dtype=np.int64))
+                        touched += 1
+        
+        # Orders committed after the last export; ids only grow, so they go at the end
+        cursor.execute(f"{_SELECT} WHERE id > ? ORDER BY id", (self.last_id,))
+        while True:
+            rows = cursor.fetchmany(FETCH_ROWS)
+            if not rows:
+                break
+            if self.rows + len(rows) > self.capacity:
+                self._grow(self.rows + len(rows))
+            block = np.array(rows, dtype=np.int64)
+            self._store(self.rows, block)
+            self.rows += len(rows)
+            self.last_id = int(block[-1, 0])
+            touched += len(rows)
+        
+        if touched or seq != self.seq:
+            self.seq = seq
+            self._save_meta()
+            self.conn.execute("DELETE FROM order_column_changes WHERE seq <= ?", (seq,))
+            self.conn.commit()
+        return touched
+    
+    def columns(self) -> Dict[str, np.ndarray]:
+        # Read-only views of the exported rows, current as of this call
+        self.sync()
+        views = {}
+        for name, array in self.arrays.items():
+            view = array[:self.rows].view(np.ndarray)
+            view.flags.writeable = False
+            views[name] = view
+        return views
+    
+    def _in_range(self, columns: Dict[str, np.ndarray], start: str, end: str) -> np.ndarray:
+        day = columns["day"]
+        return (day >= day_number(start)) & (day <= day_number(end))
+    
+    def daily_revenue(self, start: str, end: str) -> List[tuple]:
+        # Same rows as Database.get_daily_revenue: (day, orders, dollars), cancelled left out
+        columns = self.columns()
+        selected = self._in_range(columns, start, end) & (columns["status"] != CANCELLED)
+        first = day_number(start)
+        days = columns["day"][selected] - first
+        span = day_number(end) - first + 1
+        orders = np.bincount(days, minlength=span)
+        cents = np.bincount(days, weights=columns["cents"][selected], minlength=span)
+        return [((EPOCH_DAY + datetime.timedelta(days=first + int(offset))).isoformat(),
+                 int(orders[offset]), int(cents[offset]) / 100)
+                for offset in np.flatnonzero(orders)]
+    
+    def status_totals(self, start: str, end: str) -> List[tuple]:
+        # Same rows as Database.get_sales_report:
+        # (orders, dollars, average dollars, status, delivery orders, pickup orders)
+        columns = self.columns()
+        selected = self._in_range(columns, start, end)
+        status = columns["status"][selected].astype(np.int64) + 1   # unknown (-1) lands in slot 0
+        slots = len(ORDER_STATUSES) + 1
+        delivery = columns["delivery"][selected]
+        orders = np.bincount(status, minlength=slots)
+        cents = np.bincount(status, weights=columns["cents"][selected], minlength=slots)
+        deliveries = np.bincount(status, weights=delivery == 1, minlength=slots)
+        pickups = np.bincount(status, weights=delivery == 0, minlength=slots)
+        return [(int(orders[slot]), int(cents[slot]) / 100, int(cents[slot]) / 100 / int(orders[slot]),
+                 ORDER_STATUSES[slot - 1], int(deliveries[slot]), int(pickups[slot]))
+                for slot in range(1, slots) if orders[slot]]
@@ -0,0 +1,73 @@
+import calendar
+import datetime
+from typing import Optional, Tuple
+
+# Derived columns: table -> [(column, SQL type, expression over the ISO text column)].
+# order_day is "YYYY-MM-DD", so inclusive day ranges are plain BETWEENs on an
+# index. The *_ts columns are wall-clock seconds: the naive local timestamp
+# read as UTC, which is what strftime('%s') does, so whole days are 86400 apart.
+# Fractions are cut off first: strftime rounds them to milliseconds, which can
+# land a second later than wall_clock_ts and make the triggers rewrite the row.
+WALL_CLOCK_TS = "CAST(strftime('%s', substr({}, 1, 19)) AS INTEGER)"
+
+DATE_COLUMNS = {
+    ("orders", "order_date"): [
+        ("order_day", "TEXT", "substr({}, 1, 10)"),
+        ("order_ts", "INTEGER", WALL_CLOCK_TS),
+    ],
+    ("order_status_history", "changed_at"): [
+        ("changed_ts", "INTEGER", WALL_CLOCK_TS),
+    ],
+}
+
+
+def wall_clock_ts(moment: datetime.datetime) -> int:
+    # Same value WALL_CLOCK_TS gives for moment.isoformat()
+    return calendar.timegm(moment.timetuple())
+
+
+def order_date_fields(moment: Optional[datetime.datetime] = None) -> Tuple[str, str, int]:
+    # (order_date, order_day, order_ts) for a new order
+    moment = moment or datetime.datetime.now()
+    return moment.isoformat(), moment.date().isoformat(), wall_clock_ts(moment)
+
+
+def create_order_date_columns(cursor) -> None:
+    # Adds and backfills the derived columns; triggers fill them for writers
+    # that only set the ISO text, so every row can be filtered through the index
+    for (table, source), derived in DATE_COLUMNS.items():
+        stale = " OR ".join(f"NEW.{column} IS NOT {expression.format('NEW.' + source)}"
+                            for column, _, expression in derived)
+        assignments = ", ".join(f"{column} = {expression.format('NEW.' + source)}" for column, _, expression in derived)
+        
+        # Triggers from an older expression are replaced, and the rows they
+        # filled are recomputed with the current one
+        row = cursor.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = ?", (f"trg_{table}_dates_insert",)
+        ).fetchone()
+        outdated = row is not None and assignments not in row[0]
+        if outdated:
+            cursor.execute(f"DROP TRIGGER trg_{table}_dates_insert")
+            cursor.execute(f"DROP TRIGGER IF EXISTS trg_{table}_dates_update")
+        
+        existing = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})").fetchall()}
+        for column, sql_type, expression in derived:
+            if column not in existing:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {sql_type}")
+            missing = f"{column} IS NOT {expression.format(source)}" if outdated else f"{column} IS NULL"
+            cursor.execute(
+                f"UPDATE {table} SET {column} = {expression.format(source)} "
+                f"WHERE {missing} AND {source} IS NOT NULL"
+            )
+        
+        sync = f'''
+            WHEN {stale}
+            BEGIN
+                UPDATE {table} SET {assignments} WHERE rowid = NEW.rowid;
+            END
+        '''
+        cursor.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{table}_dates_insert AFTER INSERT ON {table} {sync}")
+        cursor.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{table}_dates_update AFTER UPDATE OF {source} ON {table} {sync}")
+    
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_order_day ON orders (order_day, status)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_order_status_history_changed ON order_status_history (changed_ts)")
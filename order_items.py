@@ -0,0 +1,141 @@
+from collections import namedtuple
+from typing import Dict, Iterable, List, Optional
+
+from money import to_cents
+
+# What the customer asked for; unit_price is captured at order time
+OrderLine = namedtuple("OrderLine", "cake_id quantity unit_price")
+OrderItem = namedtuple("OrderItem", "order_id cake_id cake_name quantity unit_price")
+
+_CHUNK_SIZE = 500
+
+
+class CartFullError(ValueError):
+    pass
+
+
+class OutOfStockError(ValueError):
+    pass
+
+
+def create_order_items_table(cursor) -> None:
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS order_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            order_id INTEGER NOT NULL,
+            cake_id INTEGER NOT NULL,
+            quantity INTEGER NOT NULL,
+            unit_price REAL NOT NULL,
+            FOREIGN KEY (order_id) REFERENCES orders (id),
+            FOREIGN KEY (cake_id) REFERENCES cakes (id)
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_order_items_order ON order_items (order_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_order_items_cake ON order_items (cake_id)")
+    
+    # Orders written before line items existed (or by an older client) become single-line orders
+    cursor.execute('''
+        INSERT INTO order_items (order_id, cake_id, quantity, unit_price)
+        SELECT o.id, o.cake_id, o.quantity,
+               COALESCE(c.price, o.total_price / NULLIF(o.quantity, 0), 0)
+        FROM orders o
+        LEFT JOIN cakes c ON o.cake_id = c.id
+        WHERE o.cake_id IS NOT NULL
+        AND NOT EXISTS (SELECT 1 FROM order_items i WHERE i.order_id = o.id)
+    ''')
+
+
+def insert_order_lines(cursor, order_id: int, lines: Iterable[OrderLine]) -> None:
+    cursor.executemany(
+        "INSERT INTO order_items (order_id, cake_id, quantity, unit_price, unit_price_cents) VALUES (?, ?, ?, ?, ?)",
+        [(order_id, line.cake_id, line.quantity, line.unit_price, to_cents(line.unit_price)) for line in lines]
+    )
+
+
+def take_stock(cursor, lines: Iterable[OrderLine]) -> None:
+    # Check and take each cake's stock in one statement, as reserve_slot does for
+    # slots, so two orders racing for the last cakes cannot both pass
+    needed: Dict[int, int] = {}
+    for line in lines:
+        needed[line.cake_id] = needed.get(line.cake_id, 0) + line.quantity
+    for cake_id, quantity in needed.items():
+        cursor.execute("UPDATE cakes SET stock = stock - ? WHERE id = ? AND stock >= ?", (quantity, cake_id, quantity))
+        if cursor.rowcount != 1:
+            cursor.execute("SELECT name, stock FROM cakes WHERE id = ?", (cake_id,))
+            row = cursor.fetchone()
+            if row is None:
+                raise OutOfStockError("A cake in this order is no longer available.")
+            raise OutOfStockError(f"Only {row[1]} {row[0]} left in stock.")
+
+
+def get_order_items(conn, order_ids: Iterable[int]) -> Dict[int, List[OrderItem]]:
+    order_ids = list(order_ids)
+    cursor = conn.cursor()
+    items: Dict[int, List[OrderItem]] = {}
+    for start in range(0, len(order_ids), _CHUNK_SIZE):
+        chunk = order_ids[start:start + _CHUNK_SIZE]
+        placeholders = ",".join("?" * len(chunk))
+        cursor.execute(
+            f"""SELECT i.order_id, i.cake_id, COALESCE(c.name, 'Unknown Cake'), i.quantity, i.unit_price
+            FROM order_items i
+            LEFT JOIN cakes c ON i.cake_id = c.id
+            WHERE i.order_id IN ({placeholders})
+            ORDER BY i.order_id, i.id""",
+            chunk
+        )
+        for row in cursor.fetchall():
+            items.setdefault(row[0], []).append(OrderItem(*row))
+    return items
+
+
+def describe_items(items: List[OrderItem]) -> str:
+    # One entry per cake; a cake can be spread over two lines priced a cent apart
+    quantities: Dict[str, int] = {}
+    for item in items:
+        quantities[item.cake_name] = quantities.get(item.cake_name, 0) + item.quantity
+    return ", ".join(f"{name} x{quantity}" for name, quantity in quantities.items())
+
+
+class Cart:
+    def __init__(self, limit: Optional[int] = None):
+        # cake_id -> [cake row, quantity], in the order cakes were added
+        self.entries: Dict[int, list] = {}
+        # Most cakes the cart may hold; raises CartFullError past it
+        self.limit = limit
+    
+    def _check_room(self, total: int) -> None:
+        if self.limit is not None and total > self.limit:
+            raise CartFullError(
+                f"An order can hold at most {self.limit} cakes, as the whole order is "
+                f"collected or delivered in one slot."
+            )
+    
+    def add(self, cake: tuple, quantity: int = 1) -> None:
+        self._check_room(self.total_quantity() + quantity)
+        entry = self.entries.setdefault(cake[0], [cake, 0])
+        entry[1] += quantity
+    
+    def set_quantity(self, cake_id: int, quantity: int) -> None:
+        if quantity <= 0:
+            self.remove(cake_id)
+        elif cake_id in self.entries:
+            self._check_room(self.total_quantity() - self.entries[cake_id][1] + quantity)
+            self.entries[cake_id][1] = quantity
+    
+    def remove(self, cake_id: int) -> None:
+        self.entries.pop(cake_id, None)
+    
+    def clear(self) -> None:
+        self.entries.clear()
+    
+    def items(self) -> List[tuple]:
+        return [(cake, quantity) for cake, quantity in self.entries.values()]
+    
+    def total_quantity(self) -> int:
+        return sum(quantity for _, quantity in self.entries.values())
+    
+    def subtotal(self) -> float:
+        return sum(cake[4] * quantity for cake, quantity in self.entries.values())
+    
+    def __len__(self) -> int:
+        return len(self.entries)
@@ -0,0 +1,107 @@
+import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+ORDER_STATUSES = ["pending", "preparing", "ready", "completed", "cancelled"]
+
+# Allowed moves for each status; any open order may also be cancelled
+STATUS_TRANSITIONS: Dict[str, Tuple[str, ...]] = {
+    "pending": ("preparing", "cancelled"),
+    "preparing": ("ready", "cancelled"),
+    "ready": ("completed", "cancelled"),
+    "completed": (),
+    "cancelled": (),
+}
+
+OPEN_STATUSES = tuple(status for status, moves in STATUS_TRANSITIONS.items() if moves)
+
+# Keep IN (...) lists well under SQLite's bound parameter limit
+_CHUNK_SIZE = 500
+
+
+class InvalidTransitionError(ValueError):
+    def __init__(self, rejected: List[Tuple[int, Optional[str], str]]):
+        self.rejected = rejected
+        details = ", ".join(f"#{order_id} ({current or 'missing'} -> {new})"
+                            for order_id, current, new in rejected[:5])
+        if len(rejected) > 5:
+            details += f" and {len(rejected) - 5} more"
+        super().__init__(f"Invalid status change: {details}")
+
+
+def can_transition(current_status: str, new_status: str) -> bool:
+    return new_status in STATUS_TRANSITIONS.get(current_status, ())
+
+
+def next_statuses(current_status: str) -> Tuple[str, ...]:
+    return STATUS_TRANSITIONS.get(current_status, ())
+
+
+def _chunks(items: List[int]) -> Iterable[List[int]]:
+    for start in range(0, len(items), _CHUNK_SIZE):
+        yield items[start:start + _CHUNK_SIZE]
+
+
+def get_current_statuses(conn, order_ids: Iterable[int]) -> Dict[int, str]:
+    cursor = conn.cursor()
+    statuses = {}
+    for chunk in _chunks(list(order_ids)):
+        placeholders = ",".join("?" * len(chunk))
+        cursor.execute(f"SELECT id, status FROM orders WHERE id IN ({placeholders})", chunk)
+        statuses.update(cursor.fetchall())
+    return statuses
+
+
+def transition_orders(conn, order_ids: Iterable[int], new_status: str,
+                      notes: Optional[str] = None, skip_invalid: bool = False
+                      ) -> Tuple[List[Tuple[int, str]], List[Tuple[int, Optional[str], str]]]:
+    # Moves every order in one transaction and returns (moved, rejected), where
+    # moved holds (order_id, previous_status). Unless skip_invalid is set, a
+    # single invalid transition aborts the whole batch and nothing is written.
+    if new_status not in STATUS_TRANSITIONS:
+        raise ValueError(f"Unknown order status: {new_status}")
+    
+    # De-duplicate while keeping the caller's order
+    order_ids = list(dict.fromkeys(int(order_id) for order_id in order_ids))
+    if not order_ids:
+        return [], []
+    
+    current = get_current_statuses(conn, order_ids)
+    
+    moved = []
+    rejected = []
+    for order_id in order_ids:
+        status = current.get(order_id)
+        if status is not None and can_transition(status, new_status):
+            moved.append((order_id, status))
+        else:
+            rejected.append((order_id, status, new_status))
+    
+    if rejected and not skip_invalid:
+        raise InvalidTransitionError(rejected)
+    
+    if not moved:
+        return moved, rejected
+    
+    changed_at = datetime.datetime.now().isoformat()
+    cursor = conn.cursor()
+    try:
+        # Guard on the previous status so a concurrent change is not overwritten
+        cursor.executemany(
+            "UPDATE orders SET status = ? WHERE id = ? AND status = ?",
+            [(new_status, order_id, status) for order_id, status in moved]
+        )
+        if cursor.rowcount != len(moved):
+            raise InvalidTransitionError(
+                [(order_id, status, new_status) for order_id, status in moved]
+            )
+        
+        cursor.executemany(
+            "INSERT INTO order_status_history (order_id, status, changed_at, notes) VALUES (?, ?, ?, ?)",
+            [(order_id, new_status, changed_at, notes) for order_id, _ in moved]
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    
+    return moved, rejected
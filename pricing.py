@@ -0,0 +1,297 @@
+import datetime
+from collections import namedtuple
+from decimal import Decimal
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from money import ZERO, Money
+from order_items import OrderLine
+
+DELIVERY_FEE = Money(500)
+POINTS_PER_DOLLAR = 1        # earned when an order is completed
+POINT_VALUE = Money(5)       # off per point redeemed
+MIN_REDEEM_POINTS = 100
+
+# percent: value % off; fixed: value $ off each cake; buy_n: buy min_quantity, get free_quantity free
+PROMOTION_KINDS = ("percent", "fixed", "buy_n")
+
+Promotion = namedtuple(
+    "Promotion", "id name kind value category cake_id min_quantity free_quantity starts_on ends_on active"
+)
+# Amounts are Money
+LineQuote = namedtuple("LineQuote", "cake_id quantity unit_price total promotion")
+Quote = namedtuple("Quote", "lines subtotal discount delivery_fee points_redeemed loyalty_discount total")
+
+
+class LoyaltyError(ValueError):
+    pass
+
+
+def create_pricing_tables(cursor) -> None:
+    # category / cake_id narrow a rule; NULL means it applies to every cake
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS promotions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            value REAL NOT NULL DEFAULT 0,
+            category TEXT,
+            cake_id INTEGER,
+            min_quantity INTEGER NOT NULL DEFAULT 1,
+            free_quantity INTEGER NOT NULL DEFAULT 0,
+            starts_on TEXT,
+            ends_on TEXT,
+            active INTEGER NOT NULL DEFAULT 1,
+            FOREIGN KEY (cake_id) REFERENCES cakes (id)
+        )
+    ''')
+    
+    # Running balances; the triggers below keep them current so nothing sums order history
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS loyalty_accounts (
+            customer_id INTEGER PRIMARY KEY,
+            points INTEGER NOT NULL DEFAULT 0,
+            lifetime_points INTEGER NOT NULL DEFAULT 0,
+            FOREIGN KEY (customer_id) REFERENCES users (id)
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS loyalty_redemptions (
+            order_id INTEGER PRIMARY KEY,
+            customer_id INTEGER NOT NULL,
+            points INTEGER NOT NULL,
+            FOREIGN KEY (order_id) REFERENCES orders (id)
+        )
+    ''')
+    
+    # Customers who completed orders before loyalty existed start with what they earned
+    cursor.execute(f'''
+        INSERT INTO loyalty_accounts (customer_id, points, lifetime_points)
+        SELECT customer_id, SUM(CAST(total_price * {POINTS_PER_DOLLAR} AS INTEGER)),
+               SUM(CAST(total_price * {POINTS_PER_DOLLAR} AS INTEGER))
+        FROM orders
+        WHERE status = 'completed' AND customer_id IS NOT NULL
+        AND customer_id NOT IN (SELECT customer_id FROM loyalty_accounts)
+        GROUP BY customer_id
+    ''')
+    
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_loyalty_earn_on_complete
+        AFTER UPDATE OF status ON orders
+        WHEN NEW.status = 'completed' AND OLD.status <> 'completed' AND NEW.customer_id IS NOT NULL
+        BEGIN
+            INSERT OR IGNORE INTO loyalty_accounts (customer_id) VALUES (NEW.customer_id);
+            UPDATE loyalty_accounts
+            SET points = points + CAST(NEW.total_price * {POINTS_PER_DOLLAR} AS INTEGER),
+                lifetime_points = lifetime_points + CAST(NEW.total_price * {POINTS_PER_DOLLAR} AS INTEGER)
+            WHERE customer_id = NEW.customer_id;
+        END
+    ''')
+    
+    # Cancelling an order gives back the points spent on it
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_loyalty_refund_on_cancel
+        AFTER UPDATE OF status ON orders
+        WHEN NEW.status = 'cancelled' AND OLD.status <> 'cancelled'
+        BEGIN
+            UPDATE loyalty_accounts
+            SET points = points + (SELECT points FROM loyalty_redemptions WHERE order_id = NEW.id)
+            WHERE customer_id = (SELECT customer_id FROM loyalty_redemptions WHERE order_id = NEW.id);
+            DELETE FROM loyalty_redemptions WHERE order_id = NEW.id;
+        END
+    ''')
+
+
+def get_loyalty_points(conn, customer_id: Optional[int]) -> int:
+    if customer_id is None:
+        return 0
+    row = conn.execute("SELECT points FROM loyalty_accounts WHERE customer_id = ?", (customer_id,)).fetchone()
+    return row[0] if row else 0
+
+
+def redeem_points(cursor, order_id: int, customer_id: int, points: int) -> None:
+    # Runs inside the order's transaction; the conditional UPDATE keeps two
+    # checkouts from spending the same points
+    cursor.execute(
+        "UPDATE loyalty_accounts SET points = points - ? WHERE customer_id = ? AND points >= ?",
+        (points, customer_id, points)
+    )
+    if cursor.rowcount != 1:
+        raise LoyaltyError("Not enough loyalty points for this order.")
+    cursor.execute(
+        "INSERT INTO loyalty_redemptions (order_id, customer_id, points) VALUES (?, ?, ?)",
+        (order_id, customer_id, points)
+    )
+
+
+def get_promotions(conn, include_inactive: bool = False) -> List[Promotion]:
+    query = "SELECT * FROM promotions"
+    if not include_inactive:
+        query += " WHERE active = 1"
+    return [Promotion(*row) for row in conn.execute(query + " ORDER BY id").fetchall()]
+
+
+def add_promotion(conn, name: str, kind: str, value: float = 0, category: Optional[str] = None,
+                  cake_id: Optional[int] = None, min_quantity: int = 1, free_quantity: int = 0,
+                  starts_on: Optional[str] = None, ends_on: Optional[str] = None) -> int:
+    if kind not in PROMOTION_KINDS:
+        raise ValueError(f"Unknown promotion kind '{kind}'")
+    if kind == "percent" and not 0 < value <= 100:
+        raise ValueError("A percentage discount must be between 0 and 100.")
+    if kind == "fixed" and value <= 0:
+        raise ValueError("A fixed discount must be more than $0.")
+    if kind == "buy_n" and (min_quantity < 1 or free_quantity < 1):
+        raise ValueError("A buy-N deal needs at least 1 cake to buy and 1 free.")
+    
+    cursor = conn.cursor()
+    cursor.execute(
+        """INSERT INTO promotions
+        (name, kind, value, category, cake_id, min_quantity, free_quantity, starts_on, ends_on)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+        (name, kind, value, category, cake_id, min_quantity, free_quantity, starts_on, ends_on)
+    )
+    conn.commit()
+    return cursor.lastrowid
+
+
+def set_promotion_active(conn, promotion_id: int, active: bool) -> None:
+    conn.execute("UPDATE promotions SET active = ? WHERE id = ?", (int(active), promotion_id))
+    conn.commit()
+
+
+def describe_promotion(promotion: Promotion) -> str:
+    if promotion.kind == "percent":
+        deal = f"{promotion.value:g}% off"
+    elif promotion.kind == "fixed":
+        deal = f"${promotion.value:.2f} off each"
+    else:
+        deal = f"buy {promotion.min_quantity}, get {promotion.free_quantity} free"
+    if promotion.kind != "buy_n" and promotion.min_quantity > 1:
+        deal += f" from {promotion.min_quantity} cakes"
+    return deal
+
+
+def _line_total(price: Money, quantity: int, promotion: Promotion) -> Money:
+    if quantity < promotion.min_quantity:
+        return price * quantity
+    if promotion.kind == "percent":
+        return (price * quantity).scale((100 - promotion.value) / 100)
+    if promotion.kind == "fixed":
+        return max(price - Money.from_dollars(promotion.value), ZERO) * quantity
+    group = promotion.min_quantity + promotion.free_quantity
+    free = (quantity // group) * promotion.free_quantity
+    return price * (quantity - free)
+
+
+class PriceBook:
+    # Active rules compiled per cake, so a quote only looks at the handful of
+    # rules that can apply to that cake and never at the promotions table
+    def __init__(self, conn, sync: Optional[Callable[[], None]] = None):
+        self.conn = conn
+        # Called before each quote to pick up cake changes made by the other app
+        # (CatalogIndex.sync, whose listener reloads this book)
+        self.sync = sync
+        self.prices: Dict[int, Money] = {}
+        # cake id -> rules that can apply to it, only the best one of each shape
+        self.rules: Dict[int, Tuple[Promotion, ...]] = {}
+        self.compiled_for: Optional[datetime.date] = None
+        self.load()
+    
+    def load(self, today: Optional[datetime.date] = None) -> None:
+        today = today or datetime.date.today()
+        day = today.isoformat()
+        cakes = self.conn.execute("SELECT id, price_cents, category FROM cakes").fetchall()
+        promotions = [
+            promotion for promotion in get_promotions(self.conn)
+            if (promotion.starts_on or "") <= day and (not promotion.ends_on or day <= promotion.ends_on)
+        ]
+        
+        self.prices = {cake_id: Money(cents or 0) for cake_id, cents, _ in cakes}
+        self.rules = {}
+        for cake_id, price, category in cakes:
+            best: Dict[Tuple[str, int], Promotion] = {}
+            for promotion in promotions:
+                if promotion.cake_id is not None and promotion.cake_id != cake_id:
+                    continue
+                if promotion.category and promotion.category != category:
+                    continue
+                key = (promotion.kind, promotion.min_quantity, promotion.free_quantity)
+                # Among rules of one shape only the most generous can ever win
+                current = best.get(key)
+                if current is None or promotion.value > current.value:
+                    best[key] = promotion
+            if best:
+                self.rules[cake_id] = tuple(best.values())
+        self.compiled_for = today
+    
+    def on_cakes_changed(self, cake_ids: List[int]) -> None:
+        # Catalog listener: prices and categories live on the cakes rows
+        self.load(self.compiled_for)
+    
+    def quote_line(self, cake_id: int, quantity: int) -> LineQuote:
+        if self.compiled_for != datetime.date.today():
+            self.load()
+        price = self.prices.get(cake_id, ZERO)
+        total, applied = price * quantity, None
+        for promotion in self.rules.get(cake_id, ()):
+            candidate = _line_total(price, quantity, promotion)
+            if candidate < total:
+                total, applied = candidate, promotion
+        return LineQuote(cake_id, quantity, price, total, applied)
+    
+    def quote(self, lines: Iterable[Tuple[int, int]], service: str = "pickup", points: int = 0) -> Quote:
+        # lines are (cake_id, quantity); points is what the customer wants to spend
+        # and is trimmed to what the order can absorb
+        if self.sync:
+            self.sync()
+        line_quotes = [self.quote_line(cake_id, quantity) for cake_id, quantity in lines]
+        subtotal = sum((line.unit_price * line.quantity for line in line_quotes), ZERO)
+        discounted = sum((line.total for line in line_quotes), ZERO)
+        
+        points_redeemed = 0
+        if points >= MIN_REDEEM_POINTS:
+            points_redeemed = min(points, discounted.cents // POINT_VALUE.cents)
+        loyalty_discount = POINT_VALUE * points_redeemed
+        
+        delivery_fee = DELIVERY_FEE if service == "delivery" else ZERO
+        total = discounted - loyalty_discount + delivery_fee
+        return Quote(line_quotes, subtotal, subtotal - discounted, delivery_fee,
+                     points_redeemed, loyalty_discount, total)
+
+
+def quote_order_lines(quote: Quote) -> List[OrderLine]:
+    # Lines at what the customer pays per cake: promotions applied and the loyalty
+    # discount spread over the lines by value, so the stored lines add up to the
+    # order total less the delivery fee. Unit prices are whole cents; when a line
+    # does not divide evenly, the cakes carrying the leftover cents get their own line.
+    discounted = sum((line.total for line in quote.lines), ZERO)
+    remaining = quote.loyalty_discount
+    lines = []
+    for index, line in enumerate(quote.lines):
+        if index == len(quote.lines) - 1:
+            share = remaining
+        elif discounted:
+            share = quote.loyalty_discount.scale(Decimal(line.total.cents) / Decimal(discounted.cents))
+        else:
+            share = ZERO
+        remaining -= share
+        paid = line.total - share
+        unit_cents, extra = divmod(paid.cents, line.quantity)
+        if extra:
+            lines.append(OrderLine(line.cake_id, extra, (unit_cents + 1) / 100))
+        if line.quantity > extra:
+            lines.append(OrderLine(line.cake_id, line.quantity - extra, unit_cents / 100))
+    return lines
+
+
+def describe_quote(quote: Quote) -> str:
+    # Adjustments between the list price and the total, for the price preview
+    parts = []
+    if quote.discount:
+        names = ", ".join(sorted({line.promotion.name for line in quote.lines if line.promotion}))
+        parts.append(f"- ${quote.discount:.2f} {names}")
+    if quote.loyalty_discount:
+        parts.append(f"- ${quote.loyalty_discount:.2f} points")
+    if quote.delivery_fee:
+        parts.append(f"+ ${quote.delivery_fee:.2f} delivery")
+    return "  ".join(parts)
@@ -0,0 +1,198 @@
+import datetime
+import heapq
+import math
+from collections import namedtuple
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Orders the kitchen has accepted and still has to bake
+PLANNED_STATUSES = ("preparing",)
+
+DEFAULT_OVEN_CAPACITY = 6   # cakes per oven load
+DEFAULT_OVENS = 2
+DEFAULT_BAKE_MINUTES = 90   # bake + cool per load
+DEFAULT_DAY_START = datetime.time(6, 0)
+
+BakeBatch = namedtuple("BakeBatch", "cake_id cake_name size quantity due order_ids")
+BakeSlot = namedtuple("BakeSlot", "start end oven batch late")
+
+# (cake_id, size, due day)
+GroupKey = Tuple[int, str, datetime.date]
+
+
+def parse_delivery_date(value: Optional[str]) -> Optional[datetime.datetime]:
+    # Accepts "YYYY-MM-DD HH:MM" from the order form and full ISO timestamps
+    if not value:
+        return None
+    try:
+        return datetime.datetime.fromisoformat(value.strip())
+    except ValueError:
+        pass
+    try:
+        return datetime.datetime.strptime(value.strip(), "%Y-%m-%d")
+    except ValueError:
+        return None
+
+
+def prep_time(quantity: int, oven_capacity: int = DEFAULT_OVEN_CAPACITY,
+              bake_minutes: int = DEFAULT_BAKE_MINUTES) -> datetime.timedelta:
+    # Oven loads an order needs, back to back
+    loads = max(math.ceil((quantity or 1) / oven_capacity), 1)
+    return datetime.timedelta(minutes=loads * bake_minutes)
+
+
+class ProductionPlanner:
+    def __init__(self, db, oven_capacity: int = DEFAULT_OVEN_CAPACITY, ovens: int = DEFAULT_OVENS,
+                 bake_minutes: int = DEFAULT_BAKE_MINUTES, day_start: datetime.time = DEFAULT_DAY_START):
+        self.db = db
+        self.oven_capacity = oven_capacity
+        self.ovens = ovens
+        self.bake_minutes = bake_minutes
+        self.day_start = day_start
+        
+        # order_id -> group keys its line items fall into
+        self.orders: Dict[int, Set[GroupKey]] = {}
+        # group key -> {order_id: (quantity, due, cake name)}
+        self.groups: Dict[GroupKey, Dict[int, Tuple[int, datetime.datetime, str]]] = {}
+        # due day -> group keys on that day
+        self.days: Dict[datetime.date, Set[GroupKey]] = {}
+        # Orders without a usable delivery date
+        self.unscheduled: Set[int] = set()
+        
+        # Cached results, invalidated per group / per day
+        self.batch_cache: Dict[GroupKey, List[BakeBatch]] = {}
+        self.plan_cache: Dict[datetime.date, List[BakeSlot]] = {}
+    
+    def _select_orders(self, where: str, params: Iterable) -> List[tuple]:
+        # One row per line item, so a mixed cart lands in several groups
+        cursor = self.db.conn.cursor()
+        cursor.execute(
+            f"""SELECT o.id, i.cake_id, c.name, c.size, i.quantity, o.delivery_date, o.status
+            FROM orders o
+            JOIN order_items i ON i.order_id = o.id
+            LEFT JOIN cakes c ON i.cake_id = c.id
+            WHERE {where}""",
+            list(params)
+        )
+        return cursor.fetchall()
+    
+    def load(self) -> None:
+        # Seed from the database once; later changes arrive through on_orders_changed
+        self.orders.clear()
+        self.groups.clear()
+        self.days.clear()
+        self.unscheduled.clear()
+        self.batch_cache.clear()
+        self.plan_cache.clear()
+        
+        placeholders = ",".join("?" * len(PLANNED_STATUSES))
+        for row in self._select_orders(f"o.status IN ({placeholders})", PLANNED_STATUSES):
+            self._add(row)
+    
+    def on_orders_changed(self, order_ids: Iterable[int]) -> None:
+        order_ids = list(order_ids)
+        if not order_ids:
+            return
+        
+        rows = {}
+        for start in range(0, len(order_ids), 500):
+            chunk = order_ids[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            for row in self._select_orders(f"o.id IN ({placeholders})", chunk):
+                rows.setdefault(row[0], []).append(row)
+        
+        for order_id in order_ids:
+            self._remove(order_id)
+            for row in rows.get(order_id, ()):
+                if row[6] in PLANNED_STATUSES:
+                    self._add(row)
+    
+    def _invalidate(self, key: GroupKey) -> None:
+        self.batch_cache.pop(key, None)
+        self.plan_cache.pop(key[2], None)
+    
+    def _add(self, row: tuple) -> None:
+        order_id, cake_id, cake_name, size, quantity, delivery_date, _ = row
+        due = parse_delivery_date(delivery_date)
+        if due is None:
+            self.unscheduled.add(order_id)
+            return
+        
+        key = (cake_id, size or "", due.date())
+        self.orders.setdefault(order_id, set()).add(key)
+        group = self.groups.setdefault(key, {})
+        previous = group.get(order_id, (0,))[0]
+        group[order_id] = (previous + quantity, due, cake_name or "Unknown Cake")
+        self.days.setdefault(key[2], set()).add(key)
+        self._invalidate(key)
+    
+    def _remove(self, order_id: int) -> None:
+        self.unscheduled.discard(order_id)
+        for key in self.orders.pop(order_id, ()):
+            group = self.groups[key]
+            group.pop(order_id, None)
+            if not group:
+                del self.groups[key]
+                self.days[key[2]].discard(key)
+                if not self.days[key[2]]:
+                    del self.days[key[2]]
+            self._invalidate(key)
+    
+    def batches_for(self, key: GroupKey) -> List[BakeBatch]:
+        if key in self.batch_cache:
+            return self.batch_cache[key]
+        
+        # Fill oven loads in due order; a large order may span several loads
+        group = self.groups.get(key, {})
+        order_ids = sorted(group, key=lambda oid: group[oid][1])
+        batches = []
+        load_qty, load_due, load_orders = 0, None, []
+        cake_name = ""
+        
+        for order_id in order_ids:
+            quantity, due, cake_name = group[order_id]
+            remaining = quantity
+            while remaining > 0:
+                take = min(remaining, self.oven_capacity - load_qty)
+                load_qty += take
+                remaining -= take
+                load_due = due if load_due is None else min(load_due, due)
+                if order_id not in load_orders:
+                    load_orders.append(order_id)
+                if load_qty == self.oven_capacity:
+                    batches.append(BakeBatch(key[0], cake_name, key[1], load_qty, load_due, tuple(load_orders)))
+                    load_qty, load_due, load_orders = 0, None, []
+        
+        if load_qty:
+            batches.append(BakeBatch(key[0], cake_name, key[1], load_qty, load_due, tuple(load_orders)))
+        
+        self.batch_cache[key] = batches
+        return batches
+    
+    def plan(self, day: datetime.date) -> List[BakeSlot]:
+        if day in self.plan_cache:
+            return self.plan_cache[day]
+        
+        batches = []
+        for key in self.days.get(day, ()):
+            batches.extend(self.batches_for(key))
+        batches.sort(key=lambda batch: batch.due)
+        
+        # Earliest-due batch goes into the first free oven
+        day_start = datetime.datetime.combine(day, self.day_start)
+        ovens = [(day_start, oven) for oven in range(1, self.ovens + 1)]
+        heapq.heapify(ovens)
+        bake_time = datetime.timedelta(minutes=self.bake_minutes)
+        
+        slots = []
+        for batch in batches:
+            available, oven = heapq.heappop(ovens)
+            end = available + bake_time
+            slots.append(BakeSlot(available, end, oven, batch, end > batch.due))
+            heapq.heappush(ovens, (end, oven))
+        
+        self.plan_cache[day] = slots
+        return slots
+    
+    def upcoming_days(self, start: Optional[datetime.date] = None) -> List[datetime.date]:
+        start = start or datetime.date.today()
+        return sorted(day for day in self.days if day >= start)
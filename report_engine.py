@@ -0,0 +1,296 @@
+import datetime
+import json
+import multiprocessing
+import os
+import sqlite3
+from collections import namedtuple
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from lead_times import LeadTimes, compute_lead_times
+from money import Money
+from order_archive import ARCHIVE_DIR, archive_path
+
+DB_PATH = "bakery.db"
+MAX_WORKERS = min(os.cpu_count() or 1, 4)
+TOP_ITEMS = 10
+# Bumped when the stored aggregate layout changes; older rows are recomputed
+PARTITION_FORMAT = 2
+# Nightly, the closed months of the last year are aggregated ahead of any report
+PRECOMPUTE_MONTHS = 12
+PRECOMPUTE_TIME = datetime.time(3, 0)
+
+# One month of a report: [start, end) as ISO dates; month is "YYYY-MM"
+Partition = namedtuple("Partition", "month start end")
+# Revenue figures are Money; partitions add them up as integer cents
+Report = namedtuple(
+    "Report",
+    "start end total_orders total_revenue statuses delivery_orders pickup_orders popular computed cached"
+)
+
+
+def create_report_tables(cursor) -> None:
+    # Aggregates of whole closed months. version is bumped by the triggers
+    # below whenever an order in that month changes, from any connection, so a
+    # stale row is never served and a result computed across a change is never stored
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS report_partitions (
+            month TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0,
+            data TEXT,
+            computed_at TEXT
+        )
+    ''')
+    
+    for event, months in (("INSERT", ("NEW",)), ("DELETE", ("OLD",)), ("UPDATE", ("OLD", "NEW"))):
+        months_sql = ", ".join(f"substr({row}.order_date, 1, 7)" for row in months)
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_report_partitions_{event.lower()}
+            AFTER {event} ON orders
+            BEGIN
+                UPDATE report_partitions SET data = NULL, version = version + 1
+                WHERE month IN ({months_sql});
+            END
+        ''')
+
+
+def month_partitions(start: datetime.date, end: datetime.date) -> List[Partition]:
+    # start and end are inclusive days; edge months are cut to the range
+    partitions = []
+    day = start
+    while day <= end:
+        next_month = (day.replace(day=1) + datetime.timedelta(days=32)).replace(day=1)
+        stop = min(next_month, end + datetime.timedelta(days=1))
+        partitions.append(Partition(day.strftime("%Y-%m"), day.isoformat(), stop.isoformat()))
+        day = next_month
+    return partitions
+
+
+def is_whole_month(partition: Partition) -> bool:
+    start = datetime.date.fromisoformat(partition.start)
+    end = datetime.date.fromisoformat(partition.end)
+    return start.day == 1 and end.day == 1 and (end - start).days >= 28
+
+
+# Worker-process state: one read-only connection per process, opened once
+_worker_conn: Optional[sqlite3.Connection] = None
+
+
+def _init_worker(db_path: str) -> None:
+    global _worker_conn
+    _worker_conn = sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True)
+
+
+def _aggregate(conn, schema: str, start: str, end: str, result: dict, day_column: str = "order_day") -> None:
+    # start and end are days; archive files written before order_day existed pass order_date
+    cursor = conn.cursor()
+    cursor.execute(
+        f"""SELECT status, COUNT(*), SUM(COALESCE(total_cents, CAST(ROUND(total_price * 100) AS INTEGER))),
+            COUNT(CASE WHEN delivery_type = 'delivery' THEN 1 END),
+            COUNT(CASE WHEN delivery_type = 'pickup' THEN 1 END)
+        FROM {schema}.orders
+        WHERE {day_column} >= ? AND {day_column} < ?
+        GROUP BY status""",
+        (start, end)
+    )
+    for status, count, revenue, delivery, pickup in cursor.fetchall():
+        totals = result["statuses"].setdefault(status, [0, 0])
+        totals[0] += count
+        totals[1] += revenue or 0
+        result["delivery"] += delivery
+        result["pickup"] += pickup
+    
+    # An order falls in exactly one month, so per-cake order counts add up across partitions.
+    # Rows archived before the cents columns existed have them NULL.
+    cursor.execute(
+        f"""SELECT i.cake_id, COUNT(DISTINCT i.order_id), SUM(i.quantity),
+            SUM(i.quantity * COALESCE(i.unit_price_cents, CAST(ROUND(i.unit_price * 100) AS INTEGER)))
+        FROM {schema}.orders o
+        JOIN {schema}.order_items i ON i.order_id = o.id
+        WHERE o.{day_column} >= ? AND o.{day_column} < ?
+        GROUP BY i.cake_id""",
+        (start, end)
+    )
+    for cake_id, orders, quantity, revenue in cursor.fetchall():
+        totals = result["cakes"].setdefault(str(cake_id), [0, 0, 0])
+        totals[0] += orders
+        totals[1] += quantity
+        totals[2] += revenue or 0
+
+
+def compute_partition(partition: Partition, archive_dir: str = ARCHIVE_DIR) -> dict:
+    # Runs in a worker process. Reads the hot orders plus that year's archive file
+    # if there is one; archived orders keep counting towards their month.
+    conn = _worker_conn
+    result = {"format": PARTITION_FORMAT, "statuses": {}, "delivery": 0, "pickup": 0, "cakes": {}}
+    _aggregate(conn, "main", partition.start, partition.end, result)
+    
+    path = archive_path(int(partition.month[:4]), archive_dir)
+    if os.path.exists(path):
+        conn.execute("ATTACH DATABASE ? AS archive", (f"file:{os.path.abspath(path)}?mode=ro",))
+        try:
+            has_items = conn.execute(
+                "SELECT 1 FROM archive.sqlite_master WHERE name IN ('orders', 'order_items')"
+            ).fetchall()
+            if len(has_items) == 2:
+                _aggregate(conn, "archive", partition.start, partition.end, result, "order_date")
+        finally:
+            conn.execute("DETACH DATABASE archive")
+    return result
+
+
+def lead_times_task(start: str, end: str, archive_dir: str = ARCHIVE_DIR) -> LeadTimes:
+    # Runs in a worker process, on the same read-only connection as the partitions
+    return compute_lead_times(_worker_conn, start, end, archive_dir)
+
+
+def merge_partitions(start: str, end: str, parts: List[dict], computed: int, cached: int) -> Report:
+    statuses: Dict[str, List[int]] = {}
+    cakes: Dict[int, List[int]] = {}
+    delivery = pickup = 0
+    for part in parts:
+        for status, (count, revenue) in part["statuses"].items():
+            totals = statuses.setdefault(status, [0, 0])
+            totals[0] += count
+            totals[1] += revenue
+        for cake_id, (orders, quantity, revenue) in part["cakes"].items():
+            totals = cakes.setdefault(int(cake_id), [0, 0, 0])
+            totals[0] += orders
+            totals[1] += quantity
+            totals[2] += revenue
+        delivery += part["delivery"]
+        pickup += part["pickup"]
+    
+    popular = sorted(((cake_id, orders, quantity, Money(revenue))
+                      for cake_id, (orders, quantity, revenue) in cakes.items()), key=lambda row: -row[3].cents)
+    return Report(
+        start, end,
+        sum(count for count, _ in statuses.values()),
+        Money(sum(revenue for _, revenue in statuses.values())),
+        {status: (count, Money(revenue)) for status, (count, revenue) in statuses.items()},
+        delivery, pickup, popular[:TOP_ITEMS], computed, cached
+    )
+
+
+def precompute_closed_months(conn, months: int = PRECOMPUTE_MONTHS, today: Optional[datetime.date] = None) -> Report:
+    # Blocking; for the scheduler's job thread, with that thread's connection
+    today = today or datetime.date.today()
+    end = today.replace(day=1) - datetime.timedelta(days=1)
+    start = end.replace(day=1)
+    for _ in range(months - 1):
+        start = (start - datetime.timedelta(days=1)).replace(day=1)
+    engine = ReportEngine(conn, max_workers=1)
+    try:
+        return engine.report(start, end, today)
+    finally:
+        engine.close()
+
+
+class ReportJob:
+    # A report in flight: cached partitions are already loaded, the rest are
+    # futures from the pool. Poll ready() from the UI, then ReportEngine.finish().
+    def __init__(self, start: str, end: str):
+        self.start = start
+        self.end = end
+        self.cached: List[dict] = []
+        # (partition, future, version to store under, or None when not cacheable)
+        self.pending: List[Tuple[Partition, Future, Optional[int]]] = []
+    
+    def ready(self) -> bool:
+        return all(future.done() for _, future, _ in self.pending)
+
+
+class ReportEngine:
+    # Splits a date range into months and aggregates them in worker processes,
+    # each with its own read-only connection. Whole months before the current
+    # one are stored in report_partitions, so a multi-year report only
+    # recomputes the current month and months whose orders changed since.
+    def __init__(self, conn, db_path: str = DB_PATH, max_workers: int = MAX_WORKERS,
+                 archive_dir: str = ARCHIVE_DIR):
+        self.conn = conn
+        self.db_path = db_path
+        self.max_workers = max_workers
+        self.archive_dir = archive_dir
+        self.pool: Optional[ProcessPoolExecutor] = None
+    
+    def _pool(self) -> ProcessPoolExecutor:
+        # Started on first use; spawn keeps the workers clear of the app's threads and Tk state
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.db_path,)
+            )
+        return self.pool
+    
+    def start(self, start: datetime.date, end: datetime.date, today: Optional[datetime.date] = None) -> ReportJob:
+        # start and end are inclusive days
+        if end < start:
+            raise ValueError("The end date is before the start date.")
+        current_month = (today or datetime.date.today()).strftime("%Y-%m")
+        partitions = month_partitions(start, end)
+        job = ReportJob(start.isoformat(), end.isoformat())
+        
+        closed = [p for p in partitions if p.month < current_month and is_whole_month(p)]
+        rows = {}
+        if closed:
+            placeholders = ",".join("?" * len(closed))
+            rows = {month: (version, data) for month, version, data in self.conn.execute(
+                f"SELECT month, version, data FROM report_partitions WHERE month IN ({placeholders})",
+                [p.month for p in closed]
+            )}
+            missing = [(p.month,) for p in closed if p.month not in rows]
+            if missing:
+                self.conn.executemany("INSERT OR IGNORE INTO report_partitions (month) VALUES (?)", missing)
+                self.conn.commit()
+                rows.update((month, (0, None)) for month, in missing)
+        
+        pool = None
+        for partition in partitions:
+            version, data = rows.get(partition.month, (None, None)) if partition in closed else (None, None)
+            part = json.loads(data) if data is not None else None
+            if part is not None and part.get("format") == PARTITION_FORMAT:
+                job.cached.append(part)
+                continue
+            pool = pool or self._pool()
+            job.pending.append((partition, pool.submit(compute_partition, partition, self.archive_dir), version))
+        return job
+    
+    def finish(self, job: ReportJob) -> Report:
+        # Call on the thread that owns conn once job.ready(); raises what a worker raised
+        parts = list(job.cached)
+        stored = False
+        for partition, future, version in job.pending:
+            part = future.result()
+            parts.append(part)
+            if version is not None:
+                # Only stored if no order in the month changed while it was computed
+                self.conn.execute(
+                    "UPDATE report_partitions SET data = ?, computed_at = ? WHERE month = ? AND version = ?",
+                    (json.dumps(part, separators=(",", ":")), datetime.datetime.now().isoformat(),
+                     partition.month, version)
+                )
+                stored = True
+        if stored:
+            self.conn.commit()
+        return merge_partitions(job.start, job.end, parts, len(job.pending), len(job.cached))
+    
+    def lead_times(self, start: datetime.date, end: datetime.date) -> Future:
+        # Stage durations for orders placed in [start, end]; never cached, since
+        # open orders keep moving through the stages
+        if end < start:
+            raise ValueError("The end date is before the start date.")
+        return self._pool().submit(lead_times_task, start.isoformat(), end.isoformat(), self.archive_dir)
+    
+    def report(self, start: datetime.date, end: datetime.date, today: Optional[datetime.date] = None) -> Report:
+        # Blocking form, for scripts and scheduled jobs
+        job = self.start(start, end, today)
+        for _, future, _ in job.pending:
+            future.result()
+        return self.finish(job)
+    
+    def close(self) -> None:
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
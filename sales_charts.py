@@ -0,0 +1,167 @@
+import base64
+import datetime
+import io
+import queue
+import tkinter as tk
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Tuple
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+# report id -> title shown in the analytics tab
+CHART_REPORTS = OrderedDict([
+    ("revenue", "Revenue Over Time"),
+    ("status", "Order Status Mix"),
+    ("top_cakes", "Top Cakes"),
+])
+
+# range label -> number of days, ending today
+CHART_RANGES = OrderedDict([
+    ("Last 7 days", 7),
+    ("Last 30 days", 30),
+    ("Last 90 days", 90),
+    ("Last 365 days", 365),
+])
+
+CHART_SIZE = (8, 4)   # inches at CHART_DPI
+CHART_DPI = 100
+MAX_CACHED_CHARTS = 24
+POLL_MS = 30
+
+STATUS_COLORS = {
+    "pending": "#feca57",
+    "preparing": "#54a0ff",
+    "ready": "#1dd1a1",
+    "completed": "#4ecdc4",
+    "cancelled": "#ff6b6b",
+}
+
+# (report, start day, end day, data version)
+ChartKey = Tuple[str, str, str, int]
+
+
+def _revenue_chart(figure: Figure, data: dict) -> None:
+    # Days without orders are drawn as zero so gaps are visible
+    by_day = {day: (orders, revenue) for day, orders, revenue in data["rows"]}
+    start = datetime.date.fromisoformat(data["start"])
+    end = datetime.date.fromisoformat(data["end"])
+    days = [start + datetime.timedelta(days=i) for i in range((end - start).days + 1)]
+    revenue = [by_day.get(day.isoformat(), (0, 0))[1] or 0 for day in days]
+    orders = [by_day.get(day.isoformat(), (0, 0))[0] for day in days]
+    
+    ax = figure.add_subplot(111)
+    ax.bar(days, orders, color="#dfe6e9", label="Orders")
+    ax.set_ylabel("Orders")
+    line_ax = ax.twinx()
+    line_ax.plot(days, revenue, color="#ff6b6b", marker="o" if len(days) <= 31 else None, label="Revenue")
+    line_ax.set_ylabel("Revenue ($)")
+    figure.autofmt_xdate()
+
+
+def _status_chart(figure: Figure, data: dict) -> None:
+    ax = figure.add_subplot(111)
+    rows = [(row[3], row[0]) for row in data["rows"] if row[0]]
+    if not rows:
+        ax.text(0.5, 0.5, "No orders in this range", ha="center", va="center")
+        ax.axis("off")
+        return
+    labels = [status.capitalize() for status, _ in rows]
+    counts = [count for _, count in rows]
+    colors = [STATUS_COLORS.get(status, "#c8d6e5") for status, _ in rows]
+    ax.pie(counts, labels=labels, colors=colors, autopct="%1.0f%%", startangle=90)
+    ax.axis("equal")
+
+
+def _top_cakes_chart(figure: Figure, data: dict) -> None:
+    ax = figure.add_subplot(111)
+    rows = list(reversed(data["rows"]))   # best seller on top
+    if not rows:
+        ax.text(0.5, 0.5, "No orders in this range", ha="center", va="center")
+        ax.axis("off")
+        return
+    ax.barh([row[0] for row in rows], [row[5] or 0 for row in rows], color="#667eea")
+    ax.set_xlabel("Revenue ($)")
+    for index, row in enumerate(rows):
+        ax.text(row[5] or 0, index, f"  {row[4]} sold", va="center", fontsize=8)
+    figure.subplots_adjust(left=0.3)   # room for cake names
+
+
+CHART_BUILDERS: Dict[str, Callable[[Figure, dict], None]] = {
+    "revenue": _revenue_chart,
+    "status": _status_chart,
+    "top_cakes": _top_cakes_chart,
+}
+
+
+def render_chart_png(report: str, data: dict, size: Tuple[int, int] = CHART_SIZE, dpi: int = CHART_DPI) -> bytes:
+    # Pure Agg, no pyplot state, so it is safe to run in a worker thread
+    figure = Figure(figsize=size, dpi=dpi)
+    FigureCanvasAgg(figure)
+    CHART_BUILDERS[report](figure, data)
+    figure.suptitle(f"{CHART_REPORTS[report]} ({data['start']} to {data['end']})", fontsize=11)
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format="png")
+    return buffer.getvalue()
+
+
+class ChartCache:
+    def __init__(self, root, max_entries: int = MAX_CACHED_CHARTS, workers: int = 1):
+        self.root = root
+        self.max_entries = max_entries
+        
+        # Finished charts as Tk images, most recently used last
+        self.images: "OrderedDict[ChartKey, tk.PhotoImage]" = OrderedDict()
+        self.pending: Dict[ChartKey, List[Callable]] = {}
+        self.results: "queue.Queue[Tuple[ChartKey, bytes]]" = queue.Queue()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="charts")
+        self.polling = False
+    
+    def request(self, key: ChartKey, load_data: Callable[[], dict],
+                callback: Callable[[tk.PhotoImage], None]) -> None:
+        # load_data runs here on the Tk thread (it uses the app's sqlite connection);
+        # only the drawing happens in the worker
+        image = self.images.get(key)
+        if image is not None:
+            self.images.move_to_end(key)
+            callback(image)
+            return
+        
+        if key in self.pending:
+            self.pending[key].append(callback)
+            return
+        self.pending[key] = [callback]
+        self.executor.submit(self._render, key, load_data())
+        if not self.polling:
+            self.polling = True
+            self.root.after(POLL_MS, self._poll)
+    
+    def _render(self, key: ChartKey, data: dict) -> None:
+        try:
+            png = render_chart_png(key[0], data)
+        except Exception as e:
+            print(f"Error rendering {key[0]} chart: {e}")
+            png = b""
+        self.results.put((key, png))
+    
+    def _poll(self) -> None:
+        while True:
+            try:
+                key, png = self.results.get_nowait()
+            except queue.Empty:
+                break
+            callbacks = self.pending.pop(key, [])
+            if not png:
+                continue
+            image = tk.PhotoImage(data=base64.b64encode(png))
+            self.images[key] = image
+            while len(self.images) > self.max_entries:
+                self.images.popitem(last=False)
+            for callback in callbacks:
+                callback(image)
+        
+        if self.pending:
+            self.root.after(POLL_MS, self._poll)
+        else:
+            self.polling = False
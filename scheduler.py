@@ -0,0 +1,213 @@
+import datetime
+import heapq
+import os
+import socket
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Set, Tuple
+
+DB_PATH = "bakery.db"
+MAX_RUNNING = 2           # jobs that may run at once; the timer thread itself never runs one
+LEASE_SECONDS = 3600      # a run claimed longer ago than this is taken to have died with its process
+OPTIMIZE_EVERY = datetime.timedelta(hours=6)
+
+# func gets a connection of its own on the worker thread and may return a short
+# result to store. Daily jobs set at; the rest run every `every`.
+Job = namedtuple("Job", "name func every at", defaults=(None, None))
+
+JobStats = namedtuple(
+    "JobStats",
+    "name next_run running_since last_started last_seconds last_status last_result runs failures skipped "
+    "avg_seconds max_seconds"
+)
+
+
+def create_scheduler_tables(cursor) -> None:
+    # One row per job: when it is next due, the claim of the process running it,
+    # and timing totals. Any app that opens bakery.db sees the same schedule.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS scheduled_jobs (
+            name TEXT PRIMARY KEY,
+            next_run TEXT NOT NULL,
+            running_since TEXT,
+            owner TEXT,
+            last_started TEXT,
+            last_seconds REAL,
+            last_status TEXT,
+            last_result TEXT,
+            runs INTEGER NOT NULL DEFAULT 0,
+            failures INTEGER NOT NULL DEFAULT 0,
+            skipped INTEGER NOT NULL DEFAULT 0,
+            total_seconds REAL NOT NULL DEFAULT 0,
+            max_seconds REAL NOT NULL DEFAULT 0
+        )
+    ''')
+
+
+def next_run(job: Job, after: datetime.datetime) -> datetime.datetime:
+    if job.at is None:
+        return after + job.every
+    run = datetime.datetime.combine(after.date(), job.at)
+    return run if run > after else run + datetime.timedelta(days=1)
+
+
+def optimize_database(conn) -> None:
+    # Lets SQLite refresh the statistics of tables whose queries would benefit
+    conn.execute("PRAGMA optimize")
+
+
+def job_stats(conn) -> List[JobStats]:
+    rows = conn.execute(
+        """SELECT name, next_run, running_since, last_started, last_seconds, last_status, last_result,
+            runs, failures, skipped, total_seconds / MAX(runs, 1), max_seconds
+        FROM scheduled_jobs
+        ORDER BY next_run"""
+    ).fetchall()
+    return [JobStats(*row) for row in rows]
+
+
+class Scheduler:
+    # Timer heap of (due, job name) served by one thread that sleeps until the
+    # earliest job is due and hands it to a small pool. A run first claims the
+    # job's row with a conditional UPDATE, so a job never overlaps itself, in
+    # this process or another one, and only while next_run is due, so a run
+    # another process has just finished is not repeated. Missed runs (the app
+    # was closed) happen once at startup rather than once per missed interval.
+    def __init__(self, jobs: List[Job], db_path: str = DB_PATH, max_running: int = MAX_RUNNING,
+                 lease_seconds: float = LEASE_SECONDS):
+        self.jobs: Dict[str, Job] = {job.name: job for job in jobs}
+        self.db_path = db_path
+        self.lease = datetime.timedelta(seconds=lease_seconds)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        
+        self.heap: List[Tuple[datetime.datetime, str]] = []
+        self.running: Set[str] = set()
+        # Jobs started from run_now, which run whether or not next_run is due
+        self.forced: Set[str] = set()
+        self.condition = threading.Condition()
+        self.stopping = False
+        self.pool = ThreadPoolExecutor(max_workers=max_running, thread_name_prefix="job")
+        self.thread = threading.Thread(target=self._run, name="scheduler", daemon=True)
+    
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+    
+    def start(self) -> None:
+        now = datetime.datetime.now()
+        conn = self._connect()
+        try:
+            conn.executemany(
+                "INSERT OR IGNORE INTO scheduled_jobs (name, next_run) VALUES (?, ?)",
+                [(job.name, next_run(job, now).isoformat()) for job in self.jobs.values()]
+            )
+            conn.commit()
+            placeholders = ",".join("?" * len(self.jobs))
+            for name, due in conn.execute(
+                f"SELECT name, next_run FROM scheduled_jobs WHERE name IN ({placeholders})", list(self.jobs)
+            ):
+                self.heap.append((datetime.datetime.fromisoformat(due), name))
+        finally:
+            conn.close()
+        heapq.heapify(self.heap)
+        self.thread.start()
+    
+    def stop(self) -> None:
+        # Running jobs finish on their own threads; ones not yet started are dropped
+        with self.condition:
+            self.stopping = True
+            self.condition.notify()
+        self.thread.join(timeout=5)
+        self.pool.shutdown(wait=False, cancel_futures=True)
+    
+    def run_now(self, name: str) -> None:
+        with self.condition:
+            self.forced.add(name)
+        self._push(datetime.datetime.now(), name)
+    
+    def _push(self, due: datetime.datetime, name: str) -> None:
+        with self.condition:
+            heapq.heappush(self.heap, (due, name))
+            self.condition.notify()
+    
+    def _run(self) -> None:
+        while True:
+            with self.condition:
+                while not self.stopping:
+                    if self.heap:
+                        wait = (self.heap[0][0] - datetime.datetime.now()).total_seconds()
+                        if wait <= 0:
+                            break
+                        # Re-check at least every minute so clock changes are noticed
+                        self.condition.wait(min(wait, 60))
+                    else:
+                        self.condition.wait()
+                if self.stopping:
+                    return
+                _, name = heapq.heappop(self.heap)
+                if name in self.running:
+                    continue   # the run in progress schedules the next one
+                # run_now leaves the regular entry behind; the run reschedules it anyway
+                if any(queued == name for _, queued in self.heap):
+                    self.heap = [entry for entry in self.heap if entry[1] != name]
+                    heapq.heapify(self.heap)
+                self.running.add(name)
+            self.pool.submit(self._execute, self.jobs[name])
+    
+    def _execute(self, job: Job) -> None:
+        with self.condition:
+            forced = job.name in self.forced
+            self.forced.discard(job.name)
+        conn = self._connect()
+        try:
+            started = datetime.datetime.now()
+            claimed = conn.execute(
+                """UPDATE scheduled_jobs SET running_since = ?, owner = ?, last_started = ?
+                WHERE name = ? AND (running_since IS NULL OR running_since < ?) AND (? OR next_run <= ?)""",
+                (started.isoformat(), self.owner, started.isoformat(), job.name, (started - self.lease).isoformat(),
+                 forced, started.isoformat())
+            ).rowcount
+            conn.commit()
+            if not claimed:
+                due, running_since = conn.execute(
+                    "SELECT next_run, running_since FROM scheduled_jobs WHERE name = ?", (job.name,)
+                ).fetchone()
+                if running_since is None:
+                    # Another process ran it since this one read next_run; follow its schedule
+                    self._push(datetime.datetime.fromisoformat(due), job.name)
+                    return
+                # Still running elsewhere; come back at its next slot
+                conn.execute("UPDATE scheduled_jobs SET skipped = skipped + 1 WHERE name = ?", (job.name,))
+                conn.commit()
+                self._push(next_run(job, started), job.name)
+                return
+            
+            clock = time.perf_counter()
+            status, result = "ok", None
+            try:
+                result = job.func(conn)
+            except Exception as e:
+                status, result = "failed", f"{type(e).__name__}: {e}"
+                conn.rollback()
+            seconds = time.perf_counter() - clock
+            
+            due = next_run(job, datetime.datetime.now())
+            conn.execute(
+                """UPDATE scheduled_jobs SET next_run = ?, running_since = NULL, owner = NULL,
+                    last_seconds = ?, last_status = ?, last_result = ?, runs = runs + 1,
+                    failures = failures + ?, total_seconds = total_seconds + ?, max_seconds = MAX(max_seconds, ?)
+                WHERE name = ?""",
+                (due.isoformat(), seconds, status, None if result is None else str(result)[:500],
+                 int(status == "failed"), seconds, seconds, job.name)
+            )
+            conn.commit()
+            self._push(due, job.name)
+        except sqlite3.Error as e:
+            print(f"Error running job {job.name}: {e}")
+            self._push(next_run(job, datetime.datetime.now()), job.name)
+        finally:
+            conn.close()
+            with self.condition:
+                self.running.discard(job.name)
@@ -0,0 +1,172 @@
+import datetime
+import heapq
+import tkinter as tk
+from collections import namedtuple
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from production_planner import parse_delivery_date, prep_time
+
+# Orders the kitchen has not finished yet; ready orders only wait for pickup or the driver
+WATCHED_STATUSES = ("pending", "preparing")
+AT_RISK = "at_risk"
+OVERDUE = "overdue"
+LEVELS = (AT_RISK, OVERDUE)
+# level -> (headline, wording for the staff alert email)
+LEVEL_MESSAGES = {
+    AT_RISK: ("At Risk", "may miss its delivery time"),
+    OVERDUE: ("Overdue", "is past its delivery time"),
+}
+# An order is at risk once less than its bake time plus this margin is left before it is due
+RISK_MARGIN = datetime.timedelta(minutes=30)
+# Longest sleep between wakeups; each wakeup only reads PRAGMA data_version to spot the other app's writes
+RESYNC_SECONDS = 300
+
+SlaAlert = namedtuple("SlaAlert", "order_id level due status customer_name")
+
+# (when, order id, level, stamp); stale once the order's stamp has moved on
+Crossing = Tuple[datetime.datetime, int, str, int]
+
+
+def create_sla_tables(cursor) -> None:
+    # One row per order and level, so each alert is emailed once even across restarts
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sla_alerts (
+            order_id INTEGER NOT NULL,
+            level TEXT NOT NULL,
+            raised_at TEXT NOT NULL,
+            PRIMARY KEY (order_id, level)
+        )
+    ''')
+
+
+def record_sla_alert(conn, alert: SlaAlert) -> bool:
+    # True the first time this order reaches this level
+    inserted = conn.execute(
+        "INSERT OR IGNORE INTO sla_alerts (order_id, level, raised_at) VALUES (?, ?, ?)",
+        (alert.order_id, alert.level, datetime.datetime.now().isoformat())
+    ).rowcount
+    conn.commit()
+    return inserted == 1
+
+
+class SlaWatchdog:
+    # Open orders' risk and due times in a heap, with one Tk timer set for the
+    # earliest of them, so nothing scans the orders table on a schedule. Order
+    # changes arrive as an order listener; the other app's commits are noticed
+    # through PRAGMA data_version when the timer fires and reseed the heap.
+    # on_alert(new alerts) runs on the Tk thread whenever the active alerts change.
+    def __init__(self, db, root: tk.Tk, on_alert: Callable[[List[SlaAlert]], None],
+                 margin: datetime.timedelta = RISK_MARGIN):
+        self.db = db
+        self.root = root
+        self.on_alert = on_alert
+        self.margin = margin
+        
+        self.heap: List[Crossing] = []
+        self.stamps: Dict[int, int] = {}
+        self.orders: Dict[int, tuple] = {}
+        self.alerts: Dict[int, SlaAlert] = {}
+        self.next_stamp = 0
+        self.timer: Optional[str] = None
+        self.timer_at: Optional[datetime.datetime] = None
+        self.seen_version: Optional[int] = None
+    
+    def _select(self, where: str, params: Iterable) -> List[tuple]:
+        placeholders = ",".join("?" * len(WATCHED_STATUSES))
+        cursor = self.db.conn.cursor()
+        cursor.execute(
+            f"""SELECT id, status, delivery_date, quantity, customer_name FROM orders
+            WHERE {where} AND status IN ({placeholders})""",
+            list(params) + list(WATCHED_STATUSES)
+        )
+        return cursor.fetchall()
+    
+    def load(self) -> None:
+        self.seen_version = self.db.conn.execute("PRAGMA data_version").fetchone()[0]
+        self.heap = []
+        self.stamps.clear()
+        self.orders.clear()
+        previous, self.alerts = self.alerts, {}
+        for row in self._select("1", []):
+            self._track(row)
+        self._fire(changed=previous != self.alerts)
+    
+    def _track(self, row: tuple) -> None:
+        order_id, _, delivery_date, quantity, _ = row
+        due = parse_delivery_date(delivery_date)
+        if due is None:
+            return
+        self.next_stamp += 1
+        self.stamps[order_id] = self.next_stamp
+        self.orders[order_id] = row
+        risk_at = due - prep_time(quantity) - self.margin
+        heapq.heappush(self.heap, (risk_at, order_id, AT_RISK, self.next_stamp))
+        heapq.heappush(self.heap, (due, order_id, OVERDUE, self.next_stamp))
+    
+    def on_orders_changed(self, order_ids: Iterable[int]) -> None:
+        order_ids = list(order_ids)
+        changed = False
+        for order_id in order_ids:
+            self.stamps.pop(order_id, None)
+            self.orders.pop(order_id, None)
+            changed |= self.alerts.pop(order_id, None) is not None
+        for start in range(0, len(order_ids), 500):
+            chunk = order_ids[start:start + 500]
+            for row in self._select(f"id IN ({','.join('?' * len(chunk))})", chunk):
+                self._track(row)
+        
+        # Stale crossings are dropped lazily; rebuild once they outnumber live ones
+        if len(self.heap) > 4 * len(self.stamps) + 64:
+            self.heap = [entry for entry in self.heap if self.stamps.get(entry[1]) == entry[3]]
+            heapq.heapify(self.heap)
+        self._fire(changed)
+    
+    def _fire(self, changed: bool = False) -> None:
+        # Raises every crossing that is due, then sets the timer for the next one
+        now = datetime.datetime.now()
+        # order_id -> alert; an order that crossed both levels is raised once, at the higher
+        raised: Dict[int, SlaAlert] = {}
+        while self.heap and self.heap[0][0] <= now:
+            when, order_id, level, stamp = heapq.heappop(self.heap)
+            if self.stamps.get(order_id) != stamp:
+                continue
+            current = self.alerts.get(order_id)
+            if current is not None and LEVELS.index(current.level) >= LEVELS.index(level):
+                continue
+            _, status, delivery_date, _, customer_name = self.orders[order_id]
+            alert = SlaAlert(order_id, level, parse_delivery_date(delivery_date), status, customer_name)
+            self.alerts[order_id] = alert
+            raised[order_id] = alert
+        if raised or changed:
+            self.on_alert(list(raised.values()))
+        self._arm(now)
+    
+    def _arm(self, now: datetime.datetime) -> None:
+        while self.heap and self.stamps.get(self.heap[0][1]) != self.heap[0][3]:
+            heapq.heappop(self.heap)
+        wake = now + datetime.timedelta(seconds=RESYNC_SECONDS)
+        if self.heap:
+            wake = min(wake, self.heap[0][0])
+        if self.timer is not None:
+            if self.timer_at == wake:
+                return
+            self.root.after_cancel(self.timer)
+        self.timer_at = wake
+        delay = max(int((wake - now).total_seconds() * 1000), 0) + 1
+        self.timer = self.root.after(delay, self._on_timer)
+    
+    def _on_timer(self) -> None:
+        self.timer = None
+        if self.db.conn.execute("PRAGMA data_version").fetchone()[0] != self.seen_version:
+            self.load()
+        else:
+            self._fire()
+    
+    def active(self) -> List[SlaAlert]:
+        # Overdue first, then by due time
+        return sorted(self.alerts.values(), key=lambda alert: (alert.level != OVERDUE, alert.due))
+    
+    def close(self) -> None:
+        if self.timer is not None:
+            self.root.after_cancel(self.timer)
+            self.timer = None
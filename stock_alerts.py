@@ -0,0 +1,123 @@
+from collections import namedtuple
+from typing import Callable, List, Optional
+
+CAKE_MIN_STOCK = 3      # default low-stock level for cakes, which had none before
+CAKE_UNIT = "pieces"
+
+# kind -> (table, quantity column, minimum column)
+SOURCES = {
+    "inventory": ("inventory", "quantity", "min_stock_level"),
+    "cake": ("cakes", "stock", "min_stock"),
+}
+
+StockAlert = namedtuple("StockAlert", "kind item_id name category quantity unit min_level since")
+
+_NOW = "strftime('%Y-%m-%dT%H:%M:%S', 'now', 'localtime')"
+
+
+def create_stock_alert_tables(cursor) -> None:
+    # stock_alerts holds a row per item currently at or below its minimum. The
+    # triggers below write it only when an item crosses that line, and bump
+    # stock_alert_version so screens can tell a crossing happened with one read.
+    existing = {row[1] for row in cursor.execute("PRAGMA table_info(cakes)").fetchall()}
+    if "min_stock" not in existing:
+        cursor.execute(f"ALTER TABLE cakes ADD COLUMN min_stock INTEGER NOT NULL DEFAULT {CAKE_MIN_STOCK}")
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stock_alerts (
+            kind TEXT NOT NULL,
+            item_id INTEGER NOT NULL,
+            since TEXT NOT NULL,
+            PRIMARY KEY (kind, item_id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stock_alert_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO stock_alert_version (id, version) VALUES (1, 0)")
+    
+    bump = "UPDATE stock_alert_version SET version = version + 1 WHERE id = 1;"
+    for kind, (table, quantity, minimum) in SOURCES.items():
+        low = f"{quantity} <= {minimum}"
+        # Only items under their minimum are indexed, so the resync below reads just those
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_low_stock ON {table} (id) WHERE {low}")
+        
+        raise_alert = (f"INSERT OR IGNORE INTO stock_alerts (kind, item_id, since) "
+                       f"VALUES ('{kind}', NEW.id, {_NOW}); {bump}")
+        clear_alert = f"DELETE FROM stock_alerts WHERE kind = '{kind}' AND item_id = {{0}}.id; {bump}"
+        new_low, old_low = f"NEW.{quantity} <= NEW.{minimum}", f"OLD.{quantity} <= OLD.{minimum}"
+        triggers = [
+            ("insert", f"AFTER INSERT ON {table} WHEN {new_low}", raise_alert),
+            ("low", f"AFTER UPDATE OF {quantity}, {minimum} ON {table} WHEN {new_low} AND NOT ({old_low})",
+             raise_alert),
+            ("restocked", f"AFTER UPDATE OF {quantity}, {minimum} ON {table} WHEN {old_low} AND NOT ({new_low})",
+             clear_alert.format("NEW")),
+            ("delete", f"AFTER DELETE ON {table} WHEN {old_low}", clear_alert.format("OLD")),
+        ]
+        for name, when, body in triggers:
+            cursor.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{table}_stock_alert_{name} {when} BEGIN {body} END")
+        
+        # Rows written before the triggers existed, or by a copy restored over this one
+        cursor.execute(
+            f"""DELETE FROM stock_alerts WHERE kind = ? AND item_id NOT IN (
+                SELECT id FROM {table} INDEXED BY idx_{table}_low_stock WHERE {low})""",
+            (kind,)
+        )
+        cursor.execute(
+            f"""INSERT OR IGNORE INTO stock_alerts (kind, item_id, since)
+            SELECT ?, id, {_NOW} FROM {table} INDEXED BY idx_{table}_low_stock WHERE {low}""",
+            (kind,)
+        )
+
+
+def stock_alert_version(conn) -> int:
+    return conn.execute("SELECT version FROM stock_alert_version WHERE id = 1").fetchone()[0]
+
+
+def get_stock_alerts(conn, kind: Optional[str] = None) -> List[StockAlert]:
+    # Current alerts, inventory before cakes, each joined to its item by primary key
+    cursor = conn.execute(
+        f"""SELECT a.kind, a.item_id, i.item_name, i.category, i.quantity, i.unit, i.min_stock_level, a.since
+        FROM stock_alerts a JOIN inventory i ON i.id = a.item_id
+        WHERE a.kind = 'inventory' AND ? IN ('inventory', '*')
+        UNION ALL
+        SELECT a.kind, a.item_id, c.name, c.category, c.stock, '{CAKE_UNIT}', c.min_stock, a.since
+        FROM stock_alerts a JOIN cakes c ON c.id = a.item_id
+        WHERE a.kind = 'cake' AND ? IN ('cake', '*')""",
+        (kind or "*", kind or "*")
+    )
+    return [StockAlert(*row) for row in cursor.fetchall()]
+
+
+def get_low_inventory(conn) -> List[tuple]:
+    # Full inventory rows for the items with an alert, in the order get_inventory uses
+    cursor = conn.execute(
+        """SELECT i.* FROM stock_alerts a JOIN inventory i ON i.id = a.item_id
+        WHERE a.kind = 'inventory'
+        ORDER BY i.category, i.item_name"""
+    )
+    return cursor.fetchall()
+
+
+class StockAlertWatch:
+    # Calls its listeners when an item has crossed its minimum since the last
+    # check. Writers call check() after changing stock; it costs one row read.
+    def __init__(self, conn):
+        self.conn = conn
+        self.version = stock_alert_version(conn)
+        self.listeners: List[Callable[[], None]] = []
+    
+    def add_listener(self, callback: Callable[[], None]) -> None:
+        self.listeners.append(callback)
+    
+    def check(self) -> bool:
+        version = stock_alert_version(self.conn)
+        if version == self.version:
+            return False
+        self.version = version
+        for callback in self.listeners:
+            callback()
+        return True
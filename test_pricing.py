@@ -0,0 +1,31 @@
+from money import ZERO, Money, to_cents
+from pricing import DELIVERY_FEE, LineQuote, Quote, quote_order_lines
+
+
+def make_quote(lines, loyalty_discount=ZERO, delivery_fee=ZERO):
+    line_quotes = [LineQuote(cake_id, quantity, total / quantity, total, None) for cake_id, quantity, total in lines]
+    subtotal = sum((line.total for line in line_quotes), ZERO)
+    return Quote(line_quotes, subtotal, ZERO, delivery_fee, 0, loyalty_discount,
+                 subtotal - loyalty_discount + delivery_fee)
+
+
+def stored_cents(lines):
+    # What reports add up: quantity times the stored unit_price_cents
+    return sum(line.quantity * to_cents(line.unit_price) for line in lines)
+
+
+def test_uneven_line_adds_up_to_order_total():
+    quote = make_quote([(1, 3, Money(1000))])
+    lines = quote_order_lines(quote)
+    assert stored_cents(lines) == quote.total.cents
+    assert sum(line.quantity for line in lines) == 3
+    assert all(round(line.unit_price * 100, 6).is_integer() for line in lines)
+
+
+def test_loyalty_discount_spread_adds_up_to_order_total():
+    quote = make_quote([(1, 3, Money(3500)), (2, 7, Money(2999))], loyalty_discount=Money(500),
+                       delivery_fee=DELIVERY_FEE)
+    lines = quote_order_lines(quote)
+    assert stored_cents(lines) == quote.total.cents - DELIVERY_FEE.cents
+    assert {line.cake_id for line in lines} == {1, 2}
+    assert sum(line.quantity for line in lines if line.cake_id == 2) == 7
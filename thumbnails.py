@@ -0,0 +1,143 @@
+import hashlib
+import os
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from PIL import Image, ImageTk
+
+IMAGE_DIR = "images"            # where cakes.image_path filenames live
+THUMBNAIL_DIR = "thumbnails"    # on-disk cache, one PNG per (file hash, size)
+CARD_THUMBNAIL_SIZE = (160, 120)
+MAX_CACHE_BYTES = 32 * 1024 * 1024   # decoded PhotoImage pixels kept in memory
+POLL_MS = 30
+
+# (resolved path, mtime_ns, size) - changes whenever the photo file is replaced
+StatKey = Tuple[str, int, int]
+
+
+def resolve_image_path(image_path: Optional[str]) -> Optional[str]:
+    if not image_path:
+        return None
+    for candidate in (image_path, os.path.join(IMAGE_DIR, image_path)):
+        if os.path.isfile(candidate):
+            return os.path.abspath(candidate)
+    return None
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def make_thumbnail(path: str, size: Tuple[int, int], cache_dir: str = THUMBNAIL_DIR,
+                   digest: Optional[str] = None) -> Image.Image:
+    # Returns a loaded thumbnail, building and persisting it on a cache miss
+    digest = digest or file_digest(path)
+    cached = os.path.join(cache_dir, f"{digest}-{size[0]}x{size[1]}.png")
+    if os.path.exists(cached):
+        with Image.open(cached) as thumb:
+            thumb.load()
+            return thumb
+    
+    with Image.open(path) as image:
+        # JPEGs decode straight at 1/2, 1/4 or 1/8 scale instead of full size
+        image.draft("RGB", size)
+        image = image.convert("RGB")
+        image.thumbnail(size, Image.LANCZOS)
+    
+    os.makedirs(cache_dir, exist_ok=True)
+    partial = f"{cached}.{threading.get_ident()}.tmp"
+    image.save(partial, "PNG")
+    os.replace(partial, cached)
+    return image
+
+
+class ThumbnailCache:
+    def __init__(self, root, size: Tuple[int, int] = CARD_THUMBNAIL_SIZE,
+                 max_bytes: int = MAX_CACHE_BYTES, cache_dir: str = THUMBNAIL_DIR, workers: int = 2):
+        self.root = root
+        self.size = size
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        
+        # LRU of PhotoImage objects; Tk objects are only touched on the main thread
+        self.photos: "OrderedDict[StatKey, ImageTk.PhotoImage]" = OrderedDict()
+        self.photo_bytes: Dict[StatKey, int] = {}
+        self.total_bytes = 0
+        
+        # Requests waiting on the workers, so one photo is decoded once
+        self.pending: Dict[StatKey, List[Callable]] = {}
+        self.results: "queue.Queue[Tuple[StatKey, Optional[Image.Image]]]" = queue.Queue()
+        self.digests: Dict[StatKey, str] = {}
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="thumbnails")
+        self.polling = False
+    
+    def request(self, image_path: Optional[str], callback: Callable[[ImageTk.PhotoImage], None]) -> None:
+        # Calls back on the main thread with a PhotoImage; never if the photo is missing or unreadable
+        path = resolve_image_path(image_path)
+        if path is None:
+            return
+        stat = os.stat(path)
+        key = (path, stat.st_mtime_ns, stat.st_size)
+        
+        photo = self.photos.get(key)
+        if photo is not None:
+            self.photos.move_to_end(key)
+            callback(photo)
+            return
+        
+        if key in self.pending:
+            self.pending[key].append(callback)
+            return
+        self.pending[key] = [callback]
+        self.executor.submit(self._build, key)
+        if not self.polling:
+            self.polling = True
+            self.root.after(POLL_MS, self._poll)
+    
+    def _build(self, key: StatKey) -> None:
+        # Worker thread: hashing, decoding and resizing only, no Tk calls
+        try:
+            digest = self.digests.get(key)
+            if digest is None:
+                digest = self.digests[key] = file_digest(key[0])
+            image = make_thumbnail(key[0], self.size, self.cache_dir, digest)
+        except Exception as e:
+            # Any failure still posts a result, so _poll drops the key from pending
+            print(f"Error loading thumbnail for {key[0]}: {e}")
+            image = None
+        self.results.put((key, image))
+    
+    def _poll(self) -> None:
+        while True:
+            try:
+                key, image = self.results.get_nowait()
+            except queue.Empty:
+                break
+            callbacks = self.pending.pop(key, [])
+            if image is None:
+                continue
+            photo = ImageTk.PhotoImage(image)
+            self._store(key, photo, image.width * image.height * 4)
+            for callback in callbacks:
+                callback(photo)
+        
+        if self.pending:
+            self.root.after(POLL_MS, self._poll)
+        else:
+            self.polling = False
+    
+    def _store(self, key: StatKey, photo: ImageTk.PhotoImage, size_bytes: int) -> None:
+        self.photos[key] = photo
+        self.photo_bytes[key] = size_bytes
+        self.total_bytes += size_bytes
+        # Evicted photos stay alive for as long as a widget still references them
+        while self.total_bytes > self.max_bytes and len(self.photos) > 1:
+            old_key, _ = self.photos.popitem(last=False)
+            self.total_bytes -= self.photo_bytes.pop(old_key)